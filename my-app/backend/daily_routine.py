@@ -6,23 +6,10 @@ from datetime import datetime
 
 # Forces le dossier de travail sur celui du script (backend/)
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.getcwd(), "src"))
 
-def run_step(script_path, description):
-    print(f"\n{'='*50}")
-    print(f"🚀 ÉTAPE : {description}")
-    print(f"{'='*50}")
-    
-    if not os.path.exists(script_path):
-        print(f"❌ ERREUR : Le fichier {script_path} est introuvable.")
-        return False
-
-    try:
-        subprocess.run([sys.executable, script_path], check=True)
-        print(f"✅ {description} terminé avec succès.")
-        return True
-    except subprocess.CalledProcessError:
-        print(f"❌ ERREUR CRITIQUE dans {script_path}.")
-        return False
+# Toutes les étapes tournent dans ce process (imports & CSV partagés)
+import pipeline
 
 def run_git_sync():
     print(f"\n{'='*50}")
@@ -48,28 +35,9 @@ print("\n" + "🏀" * 15)
 print("🏀 NBA AGENT: MASTER ROUTINE 🏀")
 print("🏀" * 15 + "\n")
 
-# 0. Synchronisation initiale (Récupération des votes web)
-run_step('src/pull_votes.py', "Récupération des Votes Cloud")
-
-# 1. Mise à jour des scores historiques
-run_step('src/data_nba.py', "Mise à jour des Scores Historiques")
-
-# 2. Injection des Features (Four Factors)
-run_step('src/features_nba.py', "Calcul des Features IA")
-
-# 3. Vérification des paris passés (Gagné/Perdu)
-run_step('src/verify_bets.py', "Vérification des Résultats Passés")
-
-# 4. GÉNÉRATION DES PRONOSTICS DU JOUR (LE CERVEAU)
-# Note: predict_today.py gère maintenant la mise à jour sans écraser les votes
-run_step('src/predict_today.py', "Génération des Pronos du Jour")
-
-# 5. SYNCHRONISATION CLOUD (SUPABASE)
-run_step('src/sync_supabase.py', "Synchro Paris -> Supabase")
-run_step('src/sync_nba_games.py', "Synchro Scores -> Supabase")
-run_step('src/sync_standings.py', "Synchro Classements -> Supabase")
-run_step('src/sync_players.py', "Synchro Joueurs & Stats")
-run_step('src/sync_team_intelligence.py', "Synchro Team Intelligence (V4)")
+# 0 -> 5. Votes Cloud, Scores, Features, Vérification, Pronos, Synchro Supabase
+# Note: predict_today gère la mise à jour sans écraser les votes
+pipeline.run_pipeline()
 
 # 6. SAUVEGARDE GITHUB
 # run_git_sync() # Désactivé par défaut pour éviter les conflits si l'user code en même temps
@@ -0,0 +1,26 @@
+-- BETS HISTORY: horodatage de dernière modification
+-- Permet à pull_votes.py de ne rapatrier que les lignes modifiées depuis sa dernière synchro
+-- (filtre updated_at=gte.<watermark> côté serveur).
+
+alter table bets_history
+    add column if not exists updated_at timestamp with time zone default timezone('utc'::text, now());
+
+update bets_history set updated_at = timezone('utc'::text, now()) where updated_at is null;
+
+create index if not exists bets_history_updated_at_idx on bets_history (updated_at);
+
+-- Mise à jour automatique à chaque INSERT / UPDATE (votes du site comme upserts du backend)
+-- clock_timestamp() et non now() (début de transaction): l'horodatage est celui de l'écriture de la ligne.
+-- Une transaction longue peut encore valider après coup: pull_votes relit une marge avant son watermark.
+create or replace function set_updated_at()
+returns trigger as $$
+begin
+    new.updated_at = timezone('utc'::text, clock_timestamp());
+    return new;
+end;
+$$ language plpgsql;
+
+drop trigger if exists bets_history_set_updated_at on bets_history;
+create trigger bets_history_set_updated_at
+before insert or update on bets_history
+for each row execute function set_updated_at();
@@ -0,0 +1,172 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.metrics import accuracy_score, log_loss, brier_score_loss
+import game_store
+import features_v13
+from train_model_v13 import load_model_params
+
+# Forces le dossier de travail sur celui du script (backend/)
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+os.chdir("..")
+
+# Backtest walk-forward du moteur V13:
+# pour chaque période (semaine / mois), un modèle est entraîné sur les matchs AVANT la période
+# (fenêtre croissante, ou glissante de `window` jours) puis évalué sur les matchs de la période.
+# La matrice de features est calculée une seule fois puis partagée avec les workers (initializer):
+# un fold ne fait qu'entraîner / prédire sur des tranches de lignes.
+# Usage: python src/backtest_v13.py [--step week|month] [--window 365] [--workers 4] [--start 2024-10-01]
+
+REPORT_FILE = "data/backtest_v13.csv"
+
+# Période de test -> fréquence pandas (début de période)
+STEPS = {'week': 'W-MON', 'month': 'MS'}
+MIN_TRAIN_GAMES = 1000  # Pas de fold tant que l'historique d'entraînement est plus court
+CALIBRATION_BINS = 10
+
+# Matrice partagée par les folds d'un même worker (remplie par init_worker)
+_X = None
+_y = None
+_NTHREAD = 1
+_PARAMS = None
+
+
+def load_matrix():
+    """Historique -> (dates, X, y), 1 ligne par match triée par date (features calculées une fois)."""
+    df = game_store.read_games(game_store.READY)
+    games = features_v13.build_game_features(df)
+    dates = pd.to_datetime(games['GAME_DATE_HOME']).to_numpy()
+    return dates, features_v13.to_matrix(games), games[features_v13.TARGET].to_numpy(dtype=int)
+
+def make_folds(dates, step='month', window=None, start=None, min_train=MIN_TRAIN_GAMES):
+    """Découpe walk-forward: liste de folds {fold, start, end, train: (début, fin), test: (début, fin)}.
+    Les bornes sont des positions dans `dates` (triées): chaque fold n'est qu'une paire de tranches."""
+    if step not in STEPS:
+        raise ValueError(f"step inconnu: {step} (attendu: {', '.join(STEPS)})")
+    if len(dates) <= min_train:
+        return []
+    first = pd.Timestamp(start) if start else pd.Timestamp(dates[min_train])
+    boundaries = pd.date_range(first, pd.Timestamp(dates[-1]), freq=STEPS[step], normalize=True)
+    if len(boundaries) == 0 or boundaries[0] > first:
+        boundaries = boundaries.insert(0, first.normalize())
+    boundaries = boundaries.append(pd.DatetimeIndex([pd.Timestamp(dates[-1]).normalize() + pd.Timedelta(days=1)]))
+
+    folds = []
+    for period_start, period_end in zip(boundaries[:-1], boundaries[1:]):
+        test_lo, test_hi = np.searchsorted(dates, [period_start.to_datetime64(), period_end.to_datetime64()])
+        train_lo = 0
+        if window:
+            train_lo = int(np.searchsorted(dates, (period_start - pd.Timedelta(days=window)).to_datetime64()))
+        if test_hi == test_lo or test_lo - train_lo < min_train:
+            continue
+        folds.append({
+            'fold': len(folds) + 1,
+            'start': period_start.strftime('%Y-%m-%d'),
+            'end': (period_end - pd.Timedelta(days=1)).strftime('%Y-%m-%d'),
+            'train': (train_lo, int(test_lo)),
+            'test': (int(test_lo), int(test_hi)),
+        })
+    return folds
+
+def init_worker(X, y, nthread, params):
+    """Initializer du pool: la matrice n'est transmise qu'une fois par process, pas à chaque fold."""
+    global _X, _y, _NTHREAD, _PARAMS
+    _X, _y, _NTHREAD, _PARAMS = X, y, nthread, params
+
+def calibration_table(y_true, proba, bins=CALIBRATION_BINS):
+    """Par tranche de probabilité prédite: (borne basse, nb matchs, proba moyenne, taux de victoire observé)."""
+    idx = np.minimum((proba * bins).astype(int), bins - 1)
+    table = []
+    for b in range(bins):
+        mask = idx == b
+        if mask.any():
+            table.append((b / bins, int(mask.sum()), float(proba[mask].mean()), float(y_true[mask].mean())))
+    return table
+
+def expected_calibration_error(y_true, proba, bins=CALIBRATION_BINS):
+    """Écart moyen |proba moyenne - taux observé| pondéré par le nombre de matchs de chaque tranche."""
+    table = calibration_table(y_true, proba, bins)
+    return sum(n * abs(p - o) for _, n, p, o in table) / len(proba)
+
+def run_fold(fold):
+    """Entraîne sur la tranche train et évalue sur la tranche test du fold (dans un worker)."""
+    t0 = time.time()
+    train_lo, train_hi = fold['train']
+    test_lo, test_hi = fold['test']
+    model = xgb.XGBClassifier(**_PARAMS, n_jobs=_NTHREAD)
+    model.fit(_X[train_lo:train_hi], _y[train_lo:train_hi], verbose=False)
+
+    y_test = _y[test_lo:test_hi]
+    proba = model.predict_proba(_X[test_lo:test_hi])[:, 1]
+    return dict(
+        fold=fold['fold'], start=fold['start'], end=fold['end'],
+        n_train=train_hi - train_lo, n_test=test_hi - test_lo,
+        accuracy=accuracy_score(y_test, proba >= 0.5),
+        log_loss=log_loss(y_test, proba, labels=[0, 1]),
+        brier=brier_score_loss(y_test, proba),
+        ece=expected_calibration_error(y_test, proba),
+        seconds=round(time.time() - t0, 1),
+        proba=proba,
+    )
+
+def run_backtest(step='month', window=None, start=None, workers=None):
+    """Backtest walk-forward (folds en parallèle). Retourne le DataFrame des métriques par fold."""
+    print(f"--- BACKTEST WALK-FORWARD V13 ({step}, fenêtre {'glissante ' + str(window) + ' j' if window else 'croissante'}) ---")
+    if not game_store.exists(game_store.READY):
+        print("❌ Data introuvable.")
+        return None
+
+    dates, X, y = load_matrix()
+    folds = make_folds(dates, step, window, start)
+    if not folds:
+        print(f"⚠️ Historique trop court pour un backtest ({len(dates)} matchs).")
+        return None
+
+    workers = min(workers or os.cpu_count() or 1, len(folds))
+    # Les cœurs sont répartis entre folds parallèles (pas de sur-souscription des threads XGBoost)
+    nthread = max(1, (os.cpu_count() or 1) // workers)
+    print(f"⚙️ {len(folds)} folds, {len(dates)} matchs, {workers} workers x {nthread} threads")
+
+    t0 = time.time()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(X, y, nthread, load_model_params())) as pool:
+        for r in pool.map(run_fold, folds):
+            print(f"   Fold {r['fold']:03d} {r['start']} -> {r['end']} ({r['n_test']} matchs): "
+                  f"acc {r['accuracy']:.1%} | logloss {r['log_loss']:.4f} | brier {r['brier']:.4f} | ECE {r['ece']:.3f}")
+            results.append(r)
+
+    # Calibration globale (toutes les prédictions hors échantillon)
+    test_idx = np.concatenate([np.arange(*f['test']) for f in folds])
+    proba = np.concatenate([r.pop('proba') for r in results])
+    y_all = y[test_idx]
+    report = pd.DataFrame(results)
+
+    print(f"\n📊 Global ({len(y_all)} matchs hors échantillon, {time.time() - t0:.0f}s):")
+    print(f"   Accuracy: {accuracy_score(y_all, proba >= 0.5):.2%} (écart-type par fold: {report['accuracy'].std():.2%})")
+    print(f"   Log Loss: {log_loss(y_all, proba, labels=[0, 1]):.4f}")
+    print(f"   Brier: {brier_score_loss(y_all, proba):.4f}")
+    print(f"   ECE: {expected_calibration_error(y_all, proba):.3f}")
+    print("\n🎯 Calibration (proba prédite -> victoire domicile observée):")
+    for low, n, p, o in calibration_table(y_all, proba):
+        print(f"   [{low:.1f}-{low + 1 / CALIBRATION_BINS:.1f}[ {n:5d} matchs: prédit {p:.1%} / observé {o:.1%}")
+
+    report.to_csv(REPORT_FILE, index=False)
+    print(f"\n💾 Rapport par fold: {REPORT_FILE}")
+    return report
+
+def arg_value(name, default=None):
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else default
+
+if __name__ == "__main__":
+    window = arg_value("--window")
+    workers = arg_value("--workers")
+    run_backtest(
+        step=arg_value("--step", "month"),
+        window=int(window) if window else None,
+        start=arg_value("--start"),
+        workers=int(workers) if workers else None,
+    )
@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+import hashlib
+import threading
+from datetime import datetime
+
+# Cache de build des étapes lourdes (features, entraînement).
+# L'empreinte d'une étape = hash des fichiers d'entrée + hash du code des modules concernés + paramètres.
+# Si l'empreinte est identique à celle du dernier build réussi et que ses sorties sont intactes
+# (mêmes hash), l'étape est sautée. Registre: data/build_cache.json
+#   {"stages": {étape: {fingerprint, outputs: {chemin: hash}, meta, built_at}},
+#    "files": {chemin: [mtime_ns, taille, hash]}}  <- évite de re-hasher un fichier inchangé
+# Forcer un rebuild: paramètre `force` des étapes (--force des scripts / du pipeline) ou BUILD_CACHE_FORCE=1.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_FILE = os.path.join(BASE_DIR, '..', 'data', 'build_cache.json')
+
+_lock = threading.Lock()
+
+
+def forced():
+    """Rebuild forcé pour tout le process (variable d'environnement)."""
+    return os.environ.get("BUILD_CACHE_FORCE") == "1"
+
+def load_cache():
+    try:
+        with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    cache.setdefault('stages', {})
+    cache.setdefault('files', {})
+    return cache
+
+def save_cache(cache):
+    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+    tmp = f"{CACHE_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp, CACHE_FILE)
+
+def file_hash(path, files=None, chunk_size=1 << 20):
+    """sha256 du fichier (None s'il n'existe pas). `files`: mémo {chemin: [mtime_ns, taille, hash]} mis à jour."""
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if files is not None:
+        memo = files.get(path)
+        if memo and memo[0] == stat.st_mtime_ns and memo[1] == stat.st_size:
+            return memo[2]
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
+    if files is not None:
+        files[path] = [stat.st_mtime_ns, stat.st_size, digest]
+    return digest
+
+def module_paths(*modules):
+    """Fichiers source de modules de src/ (par nom, ex. 'features_nba')."""
+    return [os.path.join(BASE_DIR, f"{m}.py") for m in modules]
+
+def fingerprint(inputs=(), code=(), params=None, cache=None):
+    """Empreinte d'une étape: fichiers d'entrée, fichiers de code, paramètres (JSON)."""
+    files = cache['files'] if cache is not None else None
+    payload = {
+        'inputs': {os.path.basename(p): file_hash(p, files) for p in inputs},
+        'code': {os.path.basename(p): file_hash(p, files) for p in code},
+        'params': params,
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def check(stage, inputs=(), code=(), params=None):
+    """(à jour ?, empreinte, meta du dernier build). À jour = même empreinte et sorties inchangées."""
+    with _lock:
+        cache = load_cache()
+        fp = fingerprint(inputs, code, params, cache)
+        entry = cache['stages'].get(stage)
+        fresh = bool(entry) and entry['fingerprint'] == fp and all(
+            file_hash(path, cache['files']) == digest for path, digest in entry['outputs'].items())
+        save_cache(cache)  # mémo des hash de fichiers
+    return fresh, fp, (entry or {}).get('meta', {})
+
+def record(stage, fp, outputs=(), meta=None):
+    """Mémorise un build réussi: empreinte des entrées et hash des sorties produites."""
+    with _lock:
+        cache = load_cache()
+        cache['stages'][stage] = {
+            'fingerprint': fp,
+            'outputs': {os.path.abspath(p): file_hash(p, cache['files']) for p in outputs if os.path.exists(p)},
+            'meta': meta or {},
+            'built_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        save_cache(cache)
+
+def invalidate(stage=None):
+    """Oublie une étape (ou toutes): le prochain lancement reconstruit."""
+    with _lock:
+        cache = load_cache()
+        if stage is None:
+            cache['stages'] = {}
+        else:
+            cache['stages'].pop(stage, None)
+        save_cache(cache)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        invalidate(sys.argv[2] if len(sys.argv) > 2 else None)
+        print("✅ Cache de build vidé.")
+    else:
+        for name, entry in sorted(load_cache()['stages'].items()):
+            print(f"{name:<20} {entry['built_at']}  {entry['fingerprint'][:12]}  sorties: {len(entry['outputs'])}")
@@ -0,0 +1,136 @@
+import pandas as pd
+import numpy as np
+import os
+import sys
+
+# Forces le dossier de travail sur celui du script (backend/)
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+os.chdir("..")
+
+import features_nba
+
+# Vérifie que le moteur vectorisé de features_nba.py produit exactement
+# les mêmes features que l'ancienne version (lambdas par groupe, boucle Python pour le streak),
+# et que le mode incrémental (état par équipe) retombe sur le calcul complet.
+# Usage: python src/check_features_regression.py [data/nba_games.csv]
+
+INPUT_FILE = "data/nba_games.csv"
+
+FEATURE_COLUMNS = [
+    'WIN', 'EFG_PCT', 'TOV_PCT', 'FT_RATE', 'ORB_RAW',
+    'EFG_PCT_LAST_5', 'TOV_PCT_LAST_5', 'FT_RATE_LAST_5', 'ORB_RAW_LAST_5', 'WIN_LAST_5',
+    'REST_DAYS', 'IS_B2B', 'LAST10_WINS', 'STREAK_CURRENT', 'IS_HOME', 'WIN_RATE_SPECIFIC',
+    'EFG_PCT_LAST_3', 'EFG_PCT_LAST_10', 'EFF_SHOCK', 'VOLATILITY', 'MARGIN_CRASH',
+]
+
+def legacy_compute_features(df):
+    """Implémentation de référence (Engine V13 avant vectorisation)."""
+    df = df.copy()
+    df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
+    df['WIN'] = df['WL'].apply(lambda x: 1 if x == 'W' else 0)
+    df = df.sort_values(by=['TEAM_ID', 'GAME_DATE'])
+
+    df['EFG_PCT'] = (df['FGM'] + 0.5 * df['FG3M']) / df['FGA'].replace(0, np.nan)
+    df['TOV_PCT'] = df['TOV'] / (df['FGA'] + 0.44 * df['FTA'] + df['TOV']).replace(0, np.nan)
+    df['FT_RATE'] = df['FTM'] / df['FGA'].replace(0, np.nan)
+    df['ORB_RAW'] = df['OREB']
+
+    factors = ['EFG_PCT', 'TOV_PCT', 'FT_RATE', 'ORB_RAW', 'WIN']
+    for factor in factors:
+        df[f"{factor}_LAST_5"] = df.groupby('TEAM_ID')[factor].transform(lambda x: x.shift(1).rolling(5).mean())
+
+    df['PREV_GAME_DATE'] = df.groupby('TEAM_ID')['GAME_DATE'].shift(1)
+    df['DAYS_DIFF'] = (df['GAME_DATE'] - df['PREV_GAME_DATE']).dt.days
+    df['REST_DAYS'] = df['DAYS_DIFF'] - 1
+    df['REST_DAYS'] = df['REST_DAYS'].fillna(3).clip(lower=0, upper=7)
+    df['IS_B2B'] = df['REST_DAYS'] == 0
+
+    df['LAST10_WINS'] = df.groupby('TEAM_ID')['WIN'].transform(lambda x: x.shift(1).rolling(10).sum().fillna(0))
+
+    def calculate_streak(series):
+        streaks = [0] * len(series)
+        current_streak = 0
+        for i, result in enumerate(series[:-1]):
+            if result == 1:
+                current_streak = current_streak + 1 if current_streak >= 0 else 1
+            else:
+                current_streak = current_streak - 1 if current_streak <= 0 else -1
+            streaks[i+1] = current_streak
+        return pd.Series(streaks, index=series.index)
+
+    df['STREAK_CURRENT'] = df.groupby('TEAM_ID')['WIN'].transform(calculate_streak)
+
+    df['IS_HOME'] = df['MATCHUP'].str.contains('vs.')
+    df['WIN_RATE_SPECIFIC'] = df.groupby(['TEAM_ID', 'IS_HOME'])['WIN'].transform(
+        lambda x: x.shift(1).expanding().mean().fillna(0.5)
+    )
+
+    df['EFG_PCT_LAST_3'] = df.groupby('TEAM_ID')['EFG_PCT'].transform(lambda x: x.shift(1).rolling(3).mean())
+    df['EFG_PCT_LAST_10'] = df.groupby('TEAM_ID')['EFG_PCT'].transform(lambda x: x.shift(1).rolling(10).mean())
+    df['EFF_SHOCK'] = (df['EFG_PCT_LAST_3'] - df['EFG_PCT_LAST_10']) * 100
+    df['VOLATILITY'] = df.groupby('TEAM_ID')['PLUS_MINUS'].transform(lambda x: x.shift(1).rolling(10).std())
+
+    def weighted_avg(x):
+        weights = np.arange(1, len(x) + 1)
+        return np.sum(weights * x) / np.sum(weights)
+
+    df['MARGIN_CRASH'] = df.groupby('TEAM_ID')['PLUS_MINUS'].transform(lambda x: x.shift(1).rolling(3).apply(weighted_avg, raw=True))
+    return df
+
+def compare_columns(expected, actual, rtol=1e-12):
+    ok = True
+    for col in FEATURE_COLUMNS:
+        exp, act = expected[col], actual[col]
+        if exp.dtype == bool or act.dtype == bool:
+            same = exp.astype(bool).equals(act.astype(bool))
+            max_diff = 0.0 if same else float('nan')
+        else:
+            exp_v, act_v = exp.to_numpy(dtype=float), act.to_numpy(dtype=float)
+            nan_match = np.array_equal(np.isnan(exp_v), np.isnan(act_v))
+            diffs = np.abs(exp_v - act_v)
+            max_diff = float(np.nanmax(diffs)) if nan_match and np.isfinite(diffs).any() else 0.0
+            same = nan_match and np.allclose(exp_v, act_v, rtol=rtol, atol=rtol, equal_nan=True)
+        status = "✅" if same else "❌"
+        print(f"{status} {col:<20} écart max: {max_diff:.2e}")
+        ok = ok and same
+    return ok
+
+def check_regression(df_raw):
+    """Compare ancien / nouveau moteur colonne par colonne. Retourne True si identiques."""
+    expected = legacy_compute_features(df_raw)
+    actual = features_nba.compute_features(df_raw)
+
+    if list(expected.index) != list(actual.index):
+        print("❌ Ordre des lignes différent.")
+        return False
+    return compare_columns(expected, actual)
+
+def check_incremental(df_raw, last_days=3):
+    """État construit sans les `last_days` derniers jours, puis mode incrémental: doit égaler le calcul complet."""
+    df_raw = df_raw.copy()
+    df_raw['GAME_DATE'] = pd.to_datetime(df_raw['GAME_DATE'])
+    days = sorted(df_raw['GAME_DATE'].unique())
+    if len(days) <= last_days:
+        print("⚠️ Historique trop court pour le test incrémental.")
+        return True
+    cutoff = days[-last_days - 1]
+
+    state = features_nba.build_state(features_nba.compute_features(df_raw[df_raw['GAME_DATE'] <= cutoff]))
+    incremental = features_nba.compute_incremental(df_raw, state)
+    full = features_nba.compute_features(df_raw).loc[incremental.index]
+    print(f"   {len(incremental)} matchs recalculés en incrémental.")
+    # Les sommes glissantes ne sont pas faites dans le même ordre: tolérance flottante
+    return compare_columns(full, incremental, rtol=1e-9)
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else INPUT_FILE
+    if not os.path.exists(path):
+        print(f"[ERREUR] {path} introuvable.")
+        sys.exit(1)
+    print(f"--- REGRESSION FEATURES: ancien moteur vs moteur vectorisé ({path}) ---")
+    df_raw = pd.read_csv(path)
+    ok = check_regression(df_raw)
+    print("\n--- INCRÉMENTAL vs COMPLET ---")
+    ok = check_incremental(df_raw) and ok
+    print("\n✅ Sorties identiques." if ok else "\n❌ Divergence détectée.")
+    sys.exit(0 if ok else 1)
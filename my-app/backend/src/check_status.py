@@ -3,6 +3,7 @@ import os
 from datetime import datetime, timedelta
 from nba_api.stats.endpoints import leaguegamefinder
 import pandas as pd
+import nba_cache
 
 # Forces le dossier de travail sur celui du script (backend/)
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -16,7 +17,7 @@ def check_nba_status():
     print(f"--- CONTROLE DES MATCHS DU {date_disp} ---")
 
     try:
-        gamefinder = leaguegamefinder.LeagueGameFinder(
+        gamefinder = nba_cache.fetch(leaguegamefinder.LeagueGameFinder,
             date_from_nullable=date_str,
             date_to_nullable=date_str,
             league_id_nullable='00'
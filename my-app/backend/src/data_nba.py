@@ -1,5 +1,7 @@
 import pandas as pd
 from nba_api.stats.endpoints import leaguegamefinder
+import nba_cache
+import game_store
 import os
 import sys
 
@@ -12,30 +14,96 @@ os.chdir("..")
 # --- CHEMINS ---
 DATA_DIR = "data"
 FILE_PATH = os.path.join(DATA_DIR, "nba_games.csv")
+START_DATE = '2023-01-01'
+KEY_COLS = ['GAME_ID', 'TEAM_ID']
+# État incrémental de features_nba: invalidé quand des lignes déjà traitées sont corrigées
+FEATURES_STATE_FILE = os.path.join(DATA_DIR, "features_state.json")
 
-def get_nba_data():
+def load_existing_games():
+    """Charge l'historique brut s'il existe (GAME_ID en texte, GAME_DATE en date)."""
+    try:
+        df = game_store.read_games(game_store.RAW)
+    except Exception as e:
+        print(f"[WARN] Lecture de l'historique impossible ({e}), re-téléchargement complet.")
+        return None
+    if df is None or df.empty or 'GAME_DATE' not in df.columns: return None
+    return df
+
+def changed_rows(existing, fresh):
+    """Lignes de `fresh` absentes de `existing` ou dont une valeur diffère (comparaison par clé)."""
+    cols = [c for c in fresh.columns if c in existing.columns]
+    stored = existing[cols].drop_duplicates(subset=KEY_COLS, keep='last')
+    merged = fresh[cols].merge(stored, on=KEY_COLS, how='left', suffixes=('', '_OLD'), indicator=True)
+    diff = merged['_merge'].eq('left_only')
+    for c in cols:
+        if c in KEY_COLS: continue
+        a, b = merged[c], merged[f'{c}_OLD']
+        diff |= ~((a == b) | (a.isna() & b.isna()))
+    return fresh[diff.to_numpy()]
+
+def get_nba_data(full=False):
+    """Met à jour nba_games.csv. Par défaut incrémental: seuls les jours depuis le dernier GAME_DATE stocké sont demandés."""
     print("--- Recuperation des donnees NBA ---")
-    
+
     # Création dossier data si inexistant
     if not os.path.exists(DATA_DIR): os.makedirs(DATA_DIR)
 
+    existing = None if full else load_existing_games()
+
+    params = {'league_id_nullable': '00', 'season_type_nullable': 'Regular Season', 'timeout': 60}
+    if existing is not None:
+        # On redemande le dernier jour stocké: il a pu être récupéré avant la fin de tous les matchs
+        last_date = existing['GAME_DATE'].max()
+        params['date_from_nullable'] = last_date.strftime('%m/%d/%Y')
+        print(f"Mode incrémental: matchs depuis le {last_date.strftime('%Y-%m-%d')}")
+    else:
+        print("Mode complet: historique depuis " + START_DATE)
+
     try:
-        gamefinder = leaguegamefinder.LeagueGameFinder(league_id_nullable='00', season_type_nullable='Regular Season', timeout=60)
+        gamefinder = nba_cache.fetch(leaguegamefinder.LeagueGameFinder, **params)
         games = gamefinder.get_data_frames()[0]
+        games['GAME_ID'] = games['GAME_ID'].astype(str).str.zfill(10)
         games['GAME_DATE'] = pd.to_datetime(games['GAME_DATE'])
-        games = games[games['GAME_DATE'] > '2023-01-01'].sort_values('GAME_DATE')
-        
-        print(f"Succes ! {len(games)} matchs.")
-        
-        # SAUVEGARDE LOCAL (Next.js)
-        games.to_csv(FILE_PATH, index=False)
-        print(f"Sauvegarde dans {FILE_PATH}")
+        games = games[games['GAME_DATE'] > START_DATE].sort_values('GAME_DATE')
+
+        if existing is None:
+            print(f"Succes ! {len(games)} matchs.")
+
+            # SAUVEGARDE LOCAL (Next.js)
+            game_store.write_games(games, game_store.RAW)
+            print(f"Sauvegarde dans {FILE_PATH}")
+            return games
+
+        # Fusion sur (GAME_ID, TEAM_ID): la réponse fraîche remplace les lignes stockées de la période
+        # redemandée (matchs récupérés en cours / incomplets), les lignes inconnues sont ajoutées
+        fresh = games.drop_duplicates(subset=KEY_COLS, keep='last').reindex(columns=existing.columns)
+        changed = changed_rows(existing, fresh)
+
+        if changed.empty:
+            print("Succes ! Aucun nouveau match.")
+            return existing
+
+        known = pd.MultiIndex.from_frame(existing[KEY_COLS])
+        is_update = pd.MultiIndex.from_frame(changed[KEY_COLS]).isin(known)
+        if not is_update.any():
+            # Que des nouvelles lignes: ajout simple
+            game_store.append_games(changed, game_store.RAW)
+            print(f"Succes ! {len(changed)} nouvelles lignes ajoutées à {FILE_PATH}")
+            return pd.concat([existing, changed], ignore_index=True).sort_values('GAME_DATE', kind='stable')
 
+        # Lignes corrigées: anciennes versions retirées puis dataset réécrit
+        replaced = pd.MultiIndex.from_frame(existing[KEY_COLS]).isin(pd.MultiIndex.from_frame(changed[KEY_COLS]))
+        merged = pd.concat([existing[~replaced], changed], ignore_index=True).sort_values('GAME_DATE', kind='stable')
+        merged = game_store.write_games(merged, game_store.RAW)
+        # Les features déjà calculées sur les anciennes versions seront recalculées (build complet)
+        if os.path.exists(FEATURES_STATE_FILE):
+            os.remove(FEATURES_STATE_FILE)
+        print(f"Succes ! {int(is_update.sum())} lignes mises à jour, {int((~is_update).sum())} ajoutées dans {FILE_PATH}")
+        return merged
 
-            
     except Exception as e:
         print(f"[ERREUR] {e}")
         exit(1)
 
 if __name__ == "__main__":
-    get_nba_data()
+    get_nba_data(full="--full" in sys.argv)
@@ -1,6 +1,7 @@
 import os
-import requests
 from dotenv import load_dotenv
+from itertools import islice
+import supabase_rest
 
 # Forces le dossier de travail sur celui du script (backend/)
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -22,22 +23,18 @@ if not URL or not KEY:
     print("❌ KEYS MISSING")
     exit()
 
-Headers = {
-    "apikey": KEY,
-    "Authorization": f"Bearer {KEY}",
-    "Content-Type": "application/json"
-}
+client = supabase_rest.SupabaseClient(URL, KEY)
 
 # 1. Fetch from team_intelligence to get the OFFICIAL team_name
-ENDPOINT_TI = f"{URL}/rest/v1/team_intelligence?select=team_name&team_id=eq.1610612745" # HOU
 print("Fetching Team Intelligence Name for ID 1610612745 (Houston)...")
-r = requests.get(ENDPOINT_TI, headers=Headers)
+r = client.send("GET", "team_intelligence", params={"select": "team_name", "team_id": "eq.1610612745"}) # HOU
 print(r.text)
 official_name = r.json()[0]['team_name'] if r.status_code == 200 and len(r.json()) > 0 else "Unknown"
 print(f"OFFICIAL NAME: '{official_name}'")
 
 # 2. Fetch from bets_history (Search for anything looking like Houston)
-ENDPOINT_BH = f"{URL}/rest/v1/bets_history?select=home_team,away_team,user_prediction&limit=10&or=(home_team.ilike.*Houston*,away_team.ilike.*Houston*)"
+# Lecture paginée en flux: seules les pages nécessaires aux 10 premières lignes sont demandées
+params = {"select": "id,home_team,away_team,user_prediction", "or": "(home_team.ilike.*Houston*,away_team.ilike.*Houston*)"}
 print("\nFetching Bets History matches for *Houston*...")
-r2 = requests.get(ENDPOINT_BH, headers=Headers)
-print(r2.text)
+for row in islice(client.iter_rows("bets_history", params, page_size=10), 10):
+    print(row)
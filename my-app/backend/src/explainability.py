@@ -223,3 +223,14 @@ def get_explanation_and_risk(feats, prob_home, home_name, away_name):
         "risk_level": risk_level,
         "badges": badges # List of strings [Badge1, Badge2]
     }
+
+def explain_batch(feats_df, probs, home_names, away_names):
+    """get_explanation_and_risk sur un lot de matchs (lignes de feats_df alignées avec probs / noms).
+    Retourne un DataFrame (explanation, risk_level, badges joints par '|') indexé comme feats_df."""
+    rows = [
+        get_explanation_and_risk(feats, prob, h, a)
+        for feats, prob, h, a in zip(feats_df.to_dict('records'), probs, home_names, away_names)
+    ]
+    out = pd.DataFrame(rows, index=feats_df.index, columns=['explanation', 'risk_level', 'badges'])
+    out['badges'] = out['badges'].map("|".join)
+    return out
@@ -1,6 +1,10 @@
 import pandas as pd
 import numpy as np
 import os
+import sys
+import json
+import game_store
+import build_cache
 
 # Forces le dossier de travail sur celui du script (backend/)
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -12,135 +16,314 @@ os.chdir("..")
 # --- CHEMINS ---
 INPUT_FILE = "data/nba_games.csv"
 OUTPUT_FILE = "data/nba_games_ready.csv"
+STATE_FILE = "data/features_state.json"
+STATE_VERSION = 2  # 2: fichier ready en ordre chronologique
 
-print("--- Calcul des FEATURES ENGINE V12 (Context Awareness) ---")
+FACTORS = ['EFG_PCT', 'TOV_PCT', 'FT_RATE', 'ORB_RAW', 'WIN']
 
-if not os.path.exists(INPUT_FILE):
-    print(f"[ERREUR] {INPUT_FILE} introuvable.")
-    exit(1)
+# MARGIN_CRASH: poids du plus ancien au plus récent des 3 derniers matchs
+MARGIN_WEIGHTS = [1, 2, 3]
 
-try:
-    df = pd.read_csv(INPUT_FILE)
-    df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
-    # Identify Win/Loss
-    df['WIN'] = df['WL'].apply(lambda x: 1 if x == 'W' else 0)
-    
-    # Sort for calculations
-    df = df.sort_values(by=['TEAM_ID', 'GAME_DATE'])
+# État glissant par équipe (mode incrémental): 10 dernières valeurs suffisent à toutes les fenêtres
+STATE_COLUMNS = ['EFG_PCT', 'TOV_PCT', 'FT_RATE', 'ORB_RAW', 'WIN', 'PLUS_MINUS']
+STATE_DEPTH = 10
 
-    # --- 1. FOUR FACTORS (Legacy V4) ---
+def shifted_rolling(df, col, window, how='mean'):
+    """Équivalent vectorisé de groupby('TEAM_ID')[col].transform(lambda x: x.shift(1).rolling(window).<how>())."""
+    teams = df['TEAM_ID']
+    shifted = df.groupby('TEAM_ID', sort=False)[col].shift(1)
+    rolled = getattr(shifted.groupby(teams, sort=False).rolling(window), how)()
+    return rolled.reset_index(level=0, drop=True)
+
+def entering_streak(df):
+    """Série en cours AVANT chaque match (+N victoires / -N défaites), sans boucle Python.
+    Chaque changement de résultat ouvre un nouveau 'run'; la longueur du run après le match
+    est son cumcount + 1, et le streak d'entrée est celui du match précédent."""
+    g = df.groupby('TEAM_ID', sort=False)['WIN']
+    run_id = df['WIN'].ne(g.shift(1)).cumsum()
+    run_len = df.groupby(run_id, sort=False).cumcount() + 1
+    streak_after = np.where(df['WIN'] == 1, run_len, -run_len)
+    streak_after = pd.Series(streak_after, index=df.index)
+    return streak_after.groupby(df['TEAM_ID'], sort=False).shift(1).fillna(0).astype(int)
+
+def weighted_margin(df):
+    """MARGIN_CRASH: moyenne pondérée (1, 2, 3) des 3 derniers PLUS_MINUS (convolution sur les décalages du groupe)."""
+    g = df.groupby('TEAM_ID', sort=False)['PLUS_MINUS']
+    n = len(MARGIN_WEIGHTS)
+    total = sum(w * g.shift(n - i) for i, w in enumerate(MARGIN_WEIGHTS))
+    return total / sum(MARGIN_WEIGHTS)
+
+def add_base_stats(df):
+    """Colonnes par match (sans historique): WIN, Four Factors, IS_HOME."""
+    df['WIN'] = (df['WL'] == 'W').astype(int)
     df['EFG_PCT'] = (df['FGM'] + 0.5 * df['FG3M']) / df['FGA'].replace(0, np.nan)
     df['TOV_PCT'] = df['TOV'] / (df['FGA'] + 0.44 * df['FTA'] + df['TOV']).replace(0, np.nan)
     df['FT_RATE'] = df['FTM'] / df['FGA'].replace(0, np.nan)
     df['ORB_RAW'] = df['OREB']
+    df['IS_HOME'] = df['MATCHUP'].str.contains('vs.')
+    return df
+
+def compute_features(df):
+    """Calcule toutes les features (Four Factors, V12 Context, V13 Injury Proxies) sur l'historique brut."""
+    df = df.copy()
+    df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
+
+    # Sort for calculations
+    df = df.sort_values(by=['TEAM_ID', 'GAME_DATE'])
+    g = df.groupby('TEAM_ID', sort=False)
 
-    factors = ['EFG_PCT', 'TOV_PCT', 'FT_RATE', 'ORB_RAW', 'WIN']
-    for factor in factors:
-        df[f"{factor}_LAST_5"] = df.groupby('TEAM_ID')[factor].transform(lambda x: x.shift(1).rolling(5).mean())
+    # --- 1. FOUR FACTORS (Legacy V4) ---
+    # (+ WIN et IS_HOME, cf. add_base_stats)
+    df = add_base_stats(df)
+
+    for factor in FACTORS:
+        df[f"{factor}_LAST_5"] = shifted_rolling(df, factor, 5)
 
     # --- 2. ENGINE V12: CONTEXT AWARENESS ---
-    
+
     # A. FATIGUE (Rest Days & B2B)
     # Shift dates to compare with previous game
-    df['PREV_GAME_DATE'] = df.groupby('TEAM_ID')['GAME_DATE'].shift(1)
-    # Calculate days diff (REST_DAYS = Date - PrevDate - 1 day? No, usually "Days Rest" means break. 
+    df['PREV_GAME_DATE'] = g['GAME_DATE'].shift(1)
     # If played yesterday (gap=1 day), Rest=0. If played 2 days ago (gap=2), Rest=1.
     # Standard NBA API "REST_DAYS" usually treats B2B as 0 rest days.
-    # Here: (Date - Prev).days.  B2B => 1.  Gap => 2.
-    # Let's align with common definition: Days since last game.
     df['DAYS_DIFF'] = (df['GAME_DATE'] - df['PREV_GAME_DATE']).dt.days
     df['REST_DAYS'] = df['DAYS_DIFF'] - 1 # B2B (1 day diff) = 0 Rest Days.
     df['REST_DAYS'] = df['REST_DAYS'].fillna(3).clip(lower=0, upper=7) # Default 3 days rest for first game
-    
+
     df['IS_B2B'] = df['REST_DAYS'] == 0
 
     # B. FORM (Last 10 Wins)
     # Wins in last 10 games (excluding current)
-    df['LAST10_WINS'] = df.groupby('TEAM_ID')['WIN'].transform(lambda x: x.shift(1).rolling(10).sum().fillna(0))
+    df['LAST10_WINS'] = shifted_rolling(df, 'WIN', 10, how='sum').fillna(0)
 
     # C. STREAK (Current Streak)
     # Positive for Win Streak, Negative for Loss Streak. Entering the game.
-    def calculate_streak(series):
-        streaks = [0] * len(series)
-        current_streak = 0
-        # Iterate through history
-        for i, result in enumerate(series[:-1]): # Look at result i to set streak for i+1
-            start_streak = current_streak
-            if result == 1: # Win
-                if current_streak >= 0:
-                    current_streak += 1
-                else:
-                    current_streak = 1
-            else: # Loss
-                if current_streak <= 0:
-                    current_streak -= 1
-                else:
-                    current_streak = -1
-            
-            # The streak ENTERING the next game (i+1) is calculated here
-            streaks[i+1] = current_streak
-        return pd.Series(streaks, index=series.index)
-
-    df['STREAK_CURRENT'] = df.groupby('TEAM_ID')['WIN'].transform(calculate_streak)
+    df['STREAK_CURRENT'] = entering_streak(df)
 
     # D. HOME / AWAY SPECIFIC WIN RATE
-    df['IS_HOME'] = df['MATCHUP'].str.contains('vs.')
-    
-    # Expanding Mean of Wins, grouped by Team AND Location
-    # We strip the current game from the expanding mean to avoid data leakage?
-    # shift(1) ensures we only know history.
-    df['WIN_RATE_SPECIFIC'] = df.groupby(['TEAM_ID', 'IS_HOME'])['WIN'].transform(
-        lambda x: x.shift(1).expanding().mean().fillna(0.5) 
-    )
-    
-    # Separate columns for clarity/mirroring (though logic handled by IS_HOME)
+    # Expanding Mean of Wins, grouped by Team AND Location, excluding current game:
+    # (victoires cumulées - match courant) / nb de matchs précédents au même endroit
+    g_loc = df.groupby(['TEAM_ID', 'IS_HOME'], sort=False)['WIN']
+    prior_wins = g_loc.cumsum() - df['WIN']
+    prior_games = g_loc.cumcount()
+    df['WIN_RATE_SPECIFIC'] = (prior_wins / prior_games.replace(0, np.nan)).fillna(0.5)
+
     # We will map this to home_win_rate in Sync if IS_HOME=True, else away_win_rate.
 
     # E. INJURY PROXIES (V13) - DETECTING "GHOST" INJURIES
-    
+
     # 1. EFF_SHOCK (Efficiency Drop: Last 3 vs Last 10)
     # Detects sudden offensive collapse (e.g. Star player out)
-    df['EFG_PCT_LAST_3'] = df.groupby('TEAM_ID')['EFG_PCT'].transform(lambda x: x.shift(1).rolling(3).mean())
-    df['EFG_PCT_LAST_10'] = df.groupby('TEAM_ID')['EFG_PCT'].transform(lambda x: x.shift(1).rolling(10).mean())
+    df['EFG_PCT_LAST_3'] = shifted_rolling(df, 'EFG_PCT', 3)
+    df['EFG_PCT_LAST_10'] = shifted_rolling(df, 'EFG_PCT', 10)
     # Scale by 100 for readability/importance
     df['EFF_SHOCK'] = (df['EFG_PCT_LAST_3'] - df['EFG_PCT_LAST_10']) * 100
-    
+
     # 2. VOLATILITY (Stability Check)
     # Standard deviation of Point Differential over Last 10 games
-    df['VOLATILITY'] = df.groupby('TEAM_ID')['PLUS_MINUS'].transform(lambda x: x.shift(1).rolling(10).std())
-    
+    df['VOLATILITY'] = shifted_rolling(df, 'PLUS_MINUS', 10, how='std')
+
     # 3. MARGIN_CRASH (Weighted Recent Failure)
     # Detects if team is getting blown out recently.
     # Weighted Avg of Last 3 Point Differentials (Weights: 1, 2, 3 for most recent)
-    def weighted_avg(x):
-        weights = np.arange(1, len(x) + 1) # [1, 2, 3]
-        return np.sum(weights * x) / np.sum(weights)
-
-    df['MARGIN_CRASH'] = df.groupby('TEAM_ID')['PLUS_MINUS'].transform(lambda x: x.shift(1).rolling(3).apply(weighted_avg, raw=True))
-
-    # --- 3. EXPORT ---
-    # We keep rows even with NaNs for sync purposes?? 
-    # Logic V4 filtered dropped rows. For V12 Sync we might want everything.
-    # But for Model Training we need valid features.
-    
-    # Let's keep `df_final` for the Model (Cleaned)
-    df_model = df.dropna(subset=[f"{f}_LAST_5" for f in factors])
-    
-    # For Sync, we might want the whole `df` enriched, but usually verify_bets/sync uses `nba_games.csv` (Raw)
-    # We will overwrite `nba_games_ready.csv` for the Model.
-    # Ideally we create `nba_games_enriched.csv` for the Sync? 
-    # Let's stick to `nba_games_ready.csv` fulfilling both roles if possible, or Sync reads Ready.
-    # Assuming Sync needs all historical games to be present.
-    # Dropna removes the first 5 games of any team. This is acceptable for history sync (old games).
-    
-    df_model.to_csv(OUTPUT_FILE, index=False)
-    print(f"[OK] Sauvegarde dans {OUTPUT_FILE} (lignes: {len(df_model)})")
-
-    # SAUVEGARDE MIROIR (V0 Project)
-
-
-except Exception as e:
-    print(f"[ERREUR] {e}")
-    import traceback
-    traceback.print_exc()
-    exit(1)
+    df['MARGIN_CRASH'] = weighted_margin(df)
+
+    return df
+
+# --- MODE INCRÉMENTAL (état par équipe) ---
+
+def build_state(df):
+    """État de chaque équipe APRÈS son dernier match, à partir de l'historique complet calculé par compute_features."""
+    teams = {}
+    for tid, t_df in df.groupby('TEAM_ID', sort=False):
+        last = t_df.iloc[-1]
+        # Streak après le dernier match = streak d'entrée + résultat du match
+        streak = int(last['STREAK_CURRENT'])
+        if last['WIN'] == 1:
+            streak = streak + 1 if streak >= 0 else 1
+        else:
+            streak = streak - 1 if streak <= 0 else -1
+        home = t_df[t_df['IS_HOME']]
+        away = t_df[~t_df['IS_HOME']]
+        teams[str(tid)] = {
+            "last_game_date": last['GAME_DATE'].strftime('%Y-%m-%d'),
+            "history": {c: [float(v) for v in t_df[c].tail(STATE_DEPTH)] for c in STATE_COLUMNS},
+            "streak": streak,
+            "home_wins": int(home['WIN'].sum()), "home_games": len(home),
+            "away_wins": int(away['WIN'].sum()), "away_games": len(away),
+        }
+    return {"version": STATE_VERSION, "teams": teams}
+
+def load_state():
+    if not os.path.exists(STATE_FILE): return None
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get("version") == STATE_VERSION else None
+
+def save_state(state):
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp, STATE_FILE)
+
+def history_frame(state, team_ids):
+    """Derniers matchs connus (STATE_COLUMNS) de chaque équipe, une ligne par match (ORDER < 0):
+    préfixe des fenêtres glissantes pour le mode incrémental."""
+    frames = []
+    for tid in team_ids:
+        h = state['teams'][str(tid)]['history']
+        n = len(h['WIN'])
+        frames.append(pd.DataFrame({'TEAM_ID': [tid] * n, 'ORDER': np.arange(-n, 0), **{c: h[c] for c in STATE_COLUMNS}}))
+    return pd.concat(frames, ignore_index=True)
+
+def compute_incremental(df_raw, state):
+    """Features des seuls matchs postérieurs à l'état de chaque équipe (état mis à jour en place).
+    Mêmes opérations vectorisées que compute_features, sur l'historique de l'état suivi des nouveaux matchs.
+    Retourne None si un recalcul complet est nécessaire."""
+    df_raw = df_raw.copy()
+    df_raw['GAME_DATE'] = pd.to_datetime(df_raw['GAME_DATE'])
+    teams = state['teams']
+
+    last_dates = {int(tid): pd.Timestamp(t['last_game_date']) for tid, t in teams.items()}
+    known = df_raw['TEAM_ID'].map(last_dates)
+    if known.isna().any():
+        print("[INFO] Nouvelle équipe inconnue de l'état: recalcul complet.")
+        return None
+
+    new_rows = df_raw[df_raw['GAME_DATE'] > known]
+    if new_rows.empty:
+        return new_rows
+
+    new_rows = add_base_stats(new_rows.sort_values(by=['TEAM_ID', 'GAME_DATE']).copy())
+    tid = new_rows['TEAM_ID']
+    keys = tid.astype(str)
+    g = new_rows.groupby('TEAM_ID', sort=False)
+
+    def from_state(field):
+        return keys.map({k: t[field] for k, t in teams.items()})
+
+    # Fenêtres glissantes: historique de l'état (ORDER < 0) + nouveaux matchs (ORDER >= 0), triés par équipe
+    recent = new_rows[['TEAM_ID'] + STATE_COLUMNS].assign(ORDER=g.cumcount())
+    combined = pd.concat([history_frame(state, tid.unique()), recent], ignore_index=True)
+    combined = combined.sort_values(by=['TEAM_ID', 'ORDER']).reset_index(drop=True)
+    for factor in FACTORS:
+        combined[f"{factor}_LAST_5"] = shifted_rolling(combined, factor, 5)
+    combined['LAST10_WINS'] = shifted_rolling(combined, 'WIN', 10, how='sum').fillna(0)
+    combined['EFG_PCT_LAST_3'] = shifted_rolling(combined, 'EFG_PCT', 3)
+    combined['EFG_PCT_LAST_10'] = shifted_rolling(combined, 'EFG_PCT', 10)
+    combined['VOLATILITY'] = shifted_rolling(combined, 'PLUS_MINUS', 10, how='std')
+    combined['MARGIN_CRASH'] = weighted_margin(combined)
+    rolled = [f"{f}_LAST_5" for f in FACTORS] + ['LAST10_WINS', 'EFG_PCT_LAST_3', 'EFG_PCT_LAST_10', 'VOLATILITY', 'MARGIN_CRASH']
+    # Même ordre (TEAM_ID puis ORDER) que new_rows
+    feats = combined.loc[combined['ORDER'] >= 0, rolled].set_index(new_rows.index)
+    feats['EFF_SHOCK'] = (feats['EFG_PCT_LAST_3'] - feats['EFG_PCT_LAST_10']) * 100
+
+    # Repos: le match précédent du premier nouveau match est celui de l'état
+    feats['PREV_GAME_DATE'] = g['GAME_DATE'].shift(1).fillna(pd.to_datetime(from_state('last_game_date')))
+    feats['DAYS_DIFF'] = (new_rows['GAME_DATE'] - feats['PREV_GAME_DATE']).dt.days
+    feats['REST_DAYS'] = (feats['DAYS_DIFF'] - 1).fillna(3).clip(lower=0, upper=7)
+    feats['IS_B2B'] = feats['REST_DAYS'] == 0
+
+    # Streak: comme entering_streak, le premier run prolonge la série de l'état si elle est de même signe
+    start = from_state('streak')
+    sign = pd.Series(np.where(new_rows['WIN'] == 1, 1, -1), index=new_rows.index)
+    prev_sign = sign.groupby(tid, sort=False).shift(1).fillna(np.sign(start))
+    run_id = sign.ne(prev_sign).groupby(tid, sort=False).cumsum()
+    run_len = new_rows.groupby([tid, run_id], sort=False).cumcount() + 1
+    streak_after = sign * (run_len + start.abs().where(run_id == 0, 0))
+    feats['STREAK_CURRENT'] = streak_after.groupby(tid, sort=False).shift(1).fillna(start).astype(int)
+
+    # Win rate domicile / extérieur: compteurs de l'état + victoires des nouveaux matchs précédents
+    is_home = new_rows['IS_HOME']
+    g_loc = new_rows.groupby([tid, is_home], sort=False)['WIN']
+    prior_wins = from_state('home_wins').where(is_home, from_state('away_wins')) + g_loc.cumsum() - new_rows['WIN']
+    prior_games = from_state('home_games').where(is_home, from_state('away_games')) + g_loc.cumcount()
+    feats['WIN_RATE_SPECIFIC'] = (prior_wins / prior_games.replace(0, np.nan)).fillna(0.5)
+
+    # Mise à jour de l'état (une fois par équipe)
+    last_streak = streak_after.groupby(tid, sort=False).last()
+    for team_id, t_df in g:
+        t = teams[str(team_id)]
+        for c in STATE_COLUMNS:
+            t['history'][c] = (t['history'][c] + [float(v) for v in t_df[c]])[-STATE_DEPTH:]
+        t['streak'] = int(last_streak[team_id])
+        home = t_df[t_df['IS_HOME']]
+        away = t_df[~t_df['IS_HOME']]
+        t['home_wins'] += int(home['WIN'].sum()); t['home_games'] += len(home)
+        t['away_wins'] += int(away['WIN'].sum()); t['away_games'] += len(away)
+        t['last_game_date'] = t_df['GAME_DATE'].iloc[-1].strftime('%Y-%m-%d')
+
+    return pd.concat([new_rows, feats], axis=1)
+
+def cache_inputs():
+    """Entrées / code / paramètres / sorties de l'étape pour build_cache."""
+    inputs = [game_store.parquet_path(game_store.RAW), game_store.csv_path(game_store.RAW)]
+    code = build_cache.module_paths('features_nba', 'game_store')
+    params = {'state_version': STATE_VERSION, 'factors': FACTORS, 'margin_weights': MARGIN_WEIGHTS, 'state_depth': STATE_DEPTH}
+    outputs = [game_store.parquet_path(game_store.READY), game_store.csv_path(game_store.READY), STATE_FILE]
+    return inputs, code, params, outputs
+
+def build_features(df=None, full=False, df_ready=None, force=False):
+    """Met à jour nba_games_ready.csv depuis nba_games.csv (ou `df` si déjà chargé).
+    Incrémental par défaut (état par équipe dans features_state.json): seules les nouvelles lignes sont ajoutées.
+    Complet (réécriture) si `full` / `force`, si l'état manque ou a été invalidé (lignes corrigées par data_nba).
+    Sautée (build_cache) si nba_games, le code et les paramètres n'ont pas changé depuis le dernier build, sauf `full` / `force`.
+    Le fichier ready est dans l'ordre chronologique (GAME_DATE, TEAM_ID): l'ajout en fin le conserve.
+    Retourne le DataFrame ready complet."""
+    print("--- Calcul des FEATURES ENGINE V12 (Context Awareness) ---")
+
+    if df is None and not game_store.exists(game_store.RAW):
+        print(f"[ERREUR] {INPUT_FILE} introuvable.")
+        exit(1)
+
+    inputs, code, params, outputs = cache_inputs()
+    fresh, fingerprint, _ = build_cache.check('features_nba', inputs, code, params)
+    if fresh and not (full or force or build_cache.forced()):
+        print(f"[CACHE] Entrées inchangées depuis le dernier build: {OUTPUT_FILE} réutilisé.")
+        return df_ready if df_ready is not None else game_store.read_games(game_store.READY)
+
+    try:
+        df = game_store.read_games(game_store.RAW) if df is None else df
+
+        state = None if full or force or not game_store.exists(game_store.READY) else load_state()
+        if state is not None:
+            new_rows = compute_incremental(df, state)
+            if new_rows is not None:
+                new_model = new_rows.dropna(subset=[f"{f}_LAST_5" for f in FACTORS])
+                new_model = new_model.sort_values(by=['GAME_DATE', 'TEAM_ID'], kind='stable')
+                df_ready = game_store.read_games(game_store.READY) if df_ready is None else df_ready
+                if not new_model.empty:
+                    # Nouveaux matchs postérieurs à l'état: ajout en fin (O(nouvelles lignes)), ordre chronologique conservé
+                    new_model = game_store.append_games(new_model, game_store.READY)
+                    df_ready = pd.concat([df_ready, new_model.reindex(columns=df_ready.columns)], ignore_index=True)
+                save_state(state)
+                build_cache.record('features_nba', fingerprint, outputs)
+                print(f"[OK] Incrémental: {len(new_rows)} nouveaux matchs, {len(new_model)} lignes ajoutées à {OUTPUT_FILE}")
+                return df_ready
+
+        df = compute_features(df)
+
+        # --- 3. EXPORT ---
+        # Model Training needs valid features: dropna removes the first 5 games of any team.
+        # This is acceptable for history sync (old games), Sync reads Ready as well.
+        df_model = df.dropna(subset=[f"{f}_LAST_5" for f in FACTORS])
+        df_model = df_model.sort_values(by=['GAME_DATE', 'TEAM_ID'], kind='stable')
+
+        df_model = game_store.write_games(df_model, game_store.READY)
+        save_state(build_state(df))
+        build_cache.record('features_nba', fingerprint, outputs)
+        print(f"[OK] Sauvegarde dans {OUTPUT_FILE} (lignes: {len(df_model)})")
+
+        return df_model
+
+    except Exception as e:
+        print(f"[ERREUR] {e}")
+        import traceback
+        traceback.print_exc()
+        exit(1)
+
+if __name__ == "__main__":
+    build_features(full="--full" in sys.argv, force="--force" in sys.argv)
@@ -0,0 +1,140 @@
+import pandas as pd
+import numpy as np
+
+import team_state
+
+# Assemblage unique du vecteur de features V13 (un match = une ligne, équipe domicile vs extérieur).
+# Utilisé par l'entraînement / l'analyse (historique nba_games_ready) et par l'inférence /
+# les recalculs (état des équipes, team_state) pour que les deux ne puissent plus diverger.
+
+FEATURE_VERSION = "v13"
+
+# Order must match Training exactly!
+FEATURE_ORDER = [
+    # Legacy
+    'EFG_PCT_LAST_5_HOME', 'EFG_PCT_LAST_5_AWAY',
+    'TOV_PCT_LAST_5_HOME', 'TOV_PCT_LAST_5_AWAY',
+    'ORB_RAW_LAST_5_HOME', 'ORB_RAW_LAST_5_AWAY',
+    'DIFF_EFG', 'DIFF_TOV', 'DIFF_ORB', 'DIFF_WIN',
+
+    # V12 Context
+    'REST_DAYS_HOME', 'REST_DAYS_AWAY', 'DIFF_REST',
+    'IS_B2B_HOME_INT', 'IS_B2B_AWAY_INT',
+    'STREAK_CURRENT_HOME', 'STREAK_CURRENT_AWAY', 'DIFF_STREAK',
+    'LAST10_WINS_HOME', 'LAST10_WINS_AWAY', 'DIFF_LAST10',
+    'WIN_RATE_SPECIFIC_HOME', 'WIN_RATE_SPECIFIC_AWAY', 'DIFF_SPECIFIC_WIN_RATE',
+
+    # V13 Injury Proxies
+    'EFF_SHOCK_HOME', 'EFF_SHOCK_AWAY', 'DIFF_EFF_SHOCK',
+    'VOLATILITY_HOME', 'VOLATILITY_AWAY', 'DIFF_VOLATILITY',
+    'MARGIN_CRASH_HOME', 'MARGIN_CRASH_AWAY', 'DIFF_MARGIN_CRASH'
+]
+
+V13_FEATURES = [
+    'DIFF_EFF_SHOCK', 'DIFF_VOLATILITY', 'DIFF_MARGIN_CRASH',
+    'EFF_SHOCK_HOME', 'EFF_SHOCK_AWAY', 'VOLATILITY_HOME', 'VOLATILITY_AWAY',
+    'MARGIN_CRASH_HOME', 'MARGIN_CRASH_AWAY',
+]
+
+TARGET = 'WIN_HOME'
+
+# DIFF_* = colonne _HOME - colonne _AWAY
+DIFF_FEATURES = {
+    'DIFF_EFG': 'EFG_PCT_LAST_5',
+    'DIFF_TOV': 'TOV_PCT_LAST_5',
+    'DIFF_ORB': 'ORB_RAW_LAST_5',
+    'DIFF_WIN': 'WIN_LAST_5',
+    'DIFF_REST': 'REST_DAYS',
+    'DIFF_STREAK': 'STREAK_CURRENT',
+    'DIFF_LAST10': 'LAST10_WINS',
+    'DIFF_SPECIFIC_WIN_RATE': 'WIN_RATE_SPECIFIC',
+    'DIFF_EFF_SHOCK': 'EFF_SHOCK',
+    'DIFF_VOLATILITY': 'VOLATILITY',
+    'DIFF_MARGIN_CRASH': 'MARGIN_CRASH',
+}
+
+# Colonnes d'état reprises telles quelles pour chaque côté
+SIDE_COLUMNS = [
+    'EFG_PCT_LAST_5', 'TOV_PCT_LAST_5', 'ORB_RAW_LAST_5', 'WIN_LAST_5',
+    'LAST10_WINS', 'STREAK_CURRENT', 'EFF_SHOCK', 'VOLATILITY', 'MARGIN_CRASH',
+]
+
+
+class FeatureSchemaError(RuntimeError):
+    """Le modèle n'a pas été entraîné sur le vecteur de features courant."""
+
+
+def add_diffs(df):
+    for diff, base in DIFF_FEATURES.items():
+        df[diff] = df[f'{base}_HOME'] - df[f'{base}_AWAY']
+    return df
+
+def build_game_features(df):
+    """Historique nba_games_ready (2 lignes par match) -> 1 ligne par match avec FEATURE_ORDER et WIN_HOME,
+    triée par date: un split sans mélange (train / analyse / tuning / backtest) garde les matchs les plus récents en validation.
+    Les features de chaque ligne sont celles d'AVANT le match (calculées par features_nba)."""
+    # MATCHUP contains "vs." for Home and "@" for Away.
+    is_home = df['MATCHUP'].str.contains('vs.')
+    df_home = df[is_home].add_suffix('_HOME').rename(columns={'GAME_ID_HOME': 'GAME_ID'})
+    df_away = df[~is_home].add_suffix('_AWAY').rename(columns={'GAME_ID_AWAY': 'GAME_ID'})
+    df_final = pd.merge(df_home, df_away, on='GAME_ID')
+    # Ordre chronologique (GAME_ID départage les matchs d'un même jour, ordre stable d'un run à l'autre)
+    df_final = df_final.sort_values(['GAME_DATE_HOME', 'GAME_ID'], kind='stable', ignore_index=True)
+
+    # B2B (Booleans to Int)
+    df_final['IS_B2B_HOME_INT'] = df_final['IS_B2B_HOME'].astype(int)
+    df_final['IS_B2B_AWAY_INT'] = df_final['IS_B2B_AWAY'].astype(int)
+    return add_diffs(df_final)
+
+def build_features_from_states(home, away, game_dates):
+    """Features de matchs depuis l'état des deux équipes AVANT le match (colonnes team_state.STATE_COLUMNS).
+    `home`, `away` et `game_dates` sont alignés sur le même index, qui est conservé."""
+    game_dates = pd.to_datetime(game_dates)
+    out = pd.DataFrame(index=game_dates.index)
+    for suffix, side in [('_HOME', home), ('_AWAY', away)]:
+        for col in SIDE_COLUMNS:
+            out[f'{col}{suffix}'] = side[col]
+        # Days since last game RELATIVE TO TARGET DATE
+        out[f'REST_DAYS{suffix}'] = team_state.rest_days(side['LAST_GAME_DATE'], game_dates)
+        out[f'IS_B2B{suffix}_INT'] = (out[f'REST_DAYS{suffix}'] == 0).astype(int)
+
+    # Specific Win Rate (Home at Home vs Away at Away)
+    out['WIN_RATE_SPECIFIC_HOME'] = home['HOME_WIN_RATE']
+    out['WIN_RATE_SPECIFIC_AWAY'] = away['AWAY_WIN_RATE']
+    return add_diffs(out)
+
+def build_matchup_features(snapshot, home_ids, away_ids, game_dates):
+    """Features de matchs à venir depuis le dernier état des équipes (team_state.build_team_snapshot).
+    Entrées alignées (Series ou listes); retourne un DataFrame indexé comme `home_ids`,
+    sans les matchs dont une équipe est absente du snapshot."""
+    home_ids = pd.Series(home_ids)
+    away_ids = pd.Series(away_ids, index=home_ids.index)
+    game_dates = pd.Series(game_dates, index=home_ids.index)
+
+    known = home_ids.isin(snapshot.index) & away_ids.isin(snapshot.index)
+    home_ids, away_ids, game_dates = home_ids[known], away_ids[known], game_dates[known]
+
+    home = snapshot.loc[home_ids.values].set_axis(home_ids.index)
+    away = snapshot.loc[away_ids.values].set_axis(away_ids.index)
+    return build_features_from_states(home, away, game_dates)
+
+def to_matrix(df):
+    """Matrice NumPy dans l'ordre exact de l'entraînement."""
+    return df[FEATURE_ORDER].to_numpy(dtype=float)
+
+def tag_model(model):
+    """Inscrit la version du vecteur de features dans le modèle (sauvegardée avec save_model)."""
+    model.get_booster().set_attr(feature_version=FEATURE_VERSION)
+
+def check_model(model):
+    """Vérifie que le modèle attend FEATURE_ORDER (noms et ordre) et FEATURE_VERSION. Lève FeatureSchemaError sinon."""
+    booster = model.get_booster()
+    names = booster.feature_names
+    if names is not None and list(names) != FEATURE_ORDER:
+        missing = sorted(set(FEATURE_ORDER) - set(names))
+        extra = sorted(set(names) - set(FEATURE_ORDER))
+        raise FeatureSchemaError(f"Features du modèle incompatibles (manquantes: {missing}, en trop: {extra}, ordre différent: {not missing and not extra}).")
+    version = booster.attr('feature_version')
+    # Modèles entraînés avant le versioning: seuls les noms peuvent être vérifiés
+    if version is not None and version != FEATURE_VERSION:
+        raise FeatureSchemaError(f"Modèle entraîné en features {version}, attendu {FEATURE_VERSION}.")
@@ -0,0 +1,100 @@
+import os
+import pandas as pd
+
+# Stockage typé de l'historique des matchs (nba_games / nba_games_ready).
+# Format principal: Parquet (pyarrow) -> dates et IDs natifs, lecture colonne par colonne,
+# filtres de dates poussés au lecteur. Le CSV reste exporté pour compatibilité
+# (Next.js, anciens scripts) et sert de repli si pyarrow n'est pas installé.
+
+try:
+    import pyarrow.parquet as pq
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, '..', 'data')
+
+RAW = "nba_games"
+READY = "nba_games_ready"
+
+DATE_COLUMNS = ['GAME_DATE', 'PREV_GAME_DATE']
+
+def csv_path(name):
+    return os.path.join(DATA_DIR, f"{name}.csv")
+
+def parquet_path(name):
+    return os.path.join(DATA_DIR, f"{name}.parquet")
+
+def exists(name=READY):
+    return (HAS_ARROW and os.path.exists(parquet_path(name))) or os.path.exists(csv_path(name))
+
+def normalize_types(df):
+    """Types canoniques: dates en datetime64, TEAM_ID entier, GAME_ID texte sur 10 caractères."""
+    df = df.copy()
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    if 'TEAM_ID' in df.columns:
+        df['TEAM_ID'] = df['TEAM_ID'].astype('int64')
+    if 'GAME_ID' in df.columns:
+        df['GAME_ID'] = df['GAME_ID'].astype(str).str.zfill(10)
+    return df
+
+def read_games(name=READY, columns=None, date_from=None, date_to=None, team_ids=None):
+    """Lit l'historique. `columns` limite les colonnes lues, `date_from` / `date_to` (inclus)
+    et `team_ids` filtrent les lignes (poussés au lecteur Parquet). Retourne None si absent."""
+    if columns is not None:
+        columns = list(dict.fromkeys(columns))
+    date_from = pd.Timestamp(date_from) if date_from is not None else None
+    date_to = pd.Timestamp(date_to) if date_to is not None else None
+
+    if HAS_ARROW and os.path.exists(parquet_path(name)):
+        filters = []
+        if date_from is not None: filters.append(('GAME_DATE', '>=', date_from))
+        if date_to is not None: filters.append(('GAME_DATE', '<=', date_to))
+        if team_ids is not None: filters.append(('TEAM_ID', 'in', [int(t) for t in team_ids]))
+        table = pq.read_table(parquet_path(name), columns=columns, filters=filters or None)
+        return table.to_pandas()
+
+    if not os.path.exists(csv_path(name)):
+        return None
+    # Repli CSV: même interface, filtres appliqués après parsing
+    df = pd.read_csv(csv_path(name), usecols=columns, dtype={'GAME_ID': str})
+    df = normalize_types(df)
+    if date_from is not None: df = df[df['GAME_DATE'] >= date_from]
+    if date_to is not None: df = df[df['GAME_DATE'] <= date_to]
+    if team_ids is not None: df = df[df['TEAM_ID'].isin([int(t) for t in team_ids])]
+    return df
+
+def write_parquet(df, name):
+    # Écriture atomique: un lecteur ne voit jamais un fichier à moitié écrit
+    path = parquet_path(name)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+def write_games(df, name=READY, csv_export=True):
+    """Réécrit complètement le dataset (Parquet + export CSV)."""
+    df = normalize_types(df)
+    if HAS_ARROW:
+        write_parquet(df, name)
+    if csv_export or not HAS_ARROW:
+        df.to_csv(csv_path(name), index=False)
+    return df
+
+def append_games(df_new, name=READY, csv_export=True):
+    """Ajoute des lignes au dataset. Le CSV est complété en place (O(nouvelles lignes)),
+    le Parquet (fichier unique) est réécrit, ce qui reste rapide en binaire."""
+    if not exists(name):
+        return write_games(df_new, name, csv_export)
+
+    df_new = normalize_types(df_new)
+    if HAS_ARROW:
+        current = read_games(name)
+        df_new = df_new.reindex(columns=current.columns)
+        write_parquet(pd.concat([current, df_new], ignore_index=True), name)
+    if (csv_export or not HAS_ARROW) and os.path.exists(csv_path(name)):
+        header = pd.read_csv(csv_path(name), nrows=0).columns
+        df_new.reindex(columns=header).to_csv(csv_path(name), mode='a', header=False, index=False)
+    return df_new
@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import threading
+from datetime import datetime
+import xgboost as xgb
+import features_v13
+import game_store
+
+# Registre local des modèles V13.
+# Chaque entraînement est enregistré sous models/registry/<id>.json (id = hash du contenu du modèle)
+# avec ses métadonnées: features, empreinte des données d'entraînement, métriques, paramètres, date.
+# Le pointeur "current" (models/registry/index.json) désigne le modèle servi: le changer suffit
+# pour un rollback. Le modèle courant est aussi exporté vers models/nba_predictor_v13.json
+# (chemin historique, lu par les outils qui ne passent pas par le registre).
+# Usage: python src/model_registry.py [list | rollback [id] | use <id>]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(BASE_DIR, '..', 'models')
+REGISTRY_DIR = os.path.join(MODELS_DIR, 'registry')
+INDEX_FILE = os.path.join(REGISTRY_DIR, 'index.json')
+LEGACY_MODEL = os.path.join(MODELS_DIR, 'nba_predictor_v13.json')
+
+# Boosters déjà chargés dans ce process: {id: modèle} (un run du pipeline ne relit pas le JSON)
+_cache = {}
+_lock = threading.Lock()
+
+
+class RegistryError(RuntimeError):
+    """Modèle introuvable dans le registre."""
+
+
+def file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def dataset_fingerprint(name=game_store.READY):
+    """Empreinte des données d'entraînement (hash du fichier Parquet, sinon CSV)."""
+    for path in (game_store.parquet_path(name), game_store.csv_path(name)):
+        if os.path.exists(path) and (path.endswith('.csv') or game_store.HAS_ARROW):
+            return f"{os.path.basename(path)}:{file_hash(path)[:16]}"
+    return None
+
+def model_path(model_id):
+    return os.path.join(REGISTRY_DIR, f"{model_id}.json")
+
+def load_index():
+    try:
+        with open(INDEX_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'current': None, 'models': {}}
+
+def save_index(index):
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    tmp = INDEX_FILE + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp, INDEX_FILE)
+
+def export_legacy(model_id):
+    """Copie le modèle vers le chemin historique (remplacement atomique)."""
+    tmp = LEGACY_MODEL + ".tmp"
+    shutil.copyfile(model_path(model_id), tmp)
+    os.replace(tmp, LEGACY_MODEL)
+
+def register(model, metrics=None, params=None, data_fingerprint=None, make_current=True):
+    """Enregistre un modèle entraîné et (par défaut) en fait le modèle courant. Retourne son id."""
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    tmp = os.path.join(REGISTRY_DIR, f"incoming-{os.getpid()}.json")
+    model.save_model(tmp)
+    model_id = f"{features_v13.FEATURE_VERSION}-{file_hash(tmp)[:12]}"
+    os.replace(tmp, model_path(model_id))
+
+    index = load_index()
+    index['models'][model_id] = {
+        'id': model_id,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'feature_version': features_v13.FEATURE_VERSION,
+        'features': list(features_v13.FEATURE_ORDER),
+        'data_fingerprint': data_fingerprint,
+        'metrics': metrics or {},
+        'params': params or {},
+    }
+    if make_current:
+        index['current'] = model_id
+    save_index(index)
+    if make_current:
+        export_legacy(model_id)
+    return model_id
+
+def current_id():
+    return load_index().get('current')
+
+def set_current(model_id):
+    """Bascule le pointeur "current" (rollback / promotion instantanés: aucun réentraînement)."""
+    index = load_index()
+    if model_id not in index['models'] or not os.path.exists(model_path(model_id)):
+        raise RegistryError(f"Modèle {model_id} absent du registre.")
+    index['current'] = model_id
+    save_index(index)
+    export_legacy(model_id)
+    return model_id
+
+def previous_id(index=None):
+    """Modèle enregistré juste avant le courant (ordre de création)."""
+    index = index or load_index()
+    ordered = sorted(index['models'].values(), key=lambda m: m['created_at'])
+    ids = [m['id'] for m in ordered]
+    if index.get('current') not in ids:
+        return ids[-1] if ids else None
+    pos = ids.index(index['current'])
+    return ids[pos - 1] if pos > 0 else None
+
+def rollback(model_id=None):
+    """Revient au modèle `model_id` (par défaut: celui enregistré avant le courant)."""
+    model_id = model_id or previous_id()
+    if model_id is None:
+        raise RegistryError("Aucun modèle précédent dans le registre.")
+    return set_current(model_id)
+
+def resolve(model_id=None):
+    """(id, chemin) du modèle demandé, du courant, ou du fichier historique (modèles antérieurs au registre)."""
+    model_id = model_id or current_id()
+    if model_id:
+        path = model_path(model_id)
+        if not os.path.exists(path):
+            raise RegistryError(f"Fichier du modèle {model_id} introuvable ({path}).")
+        return model_id, path
+    if os.path.exists(LEGACY_MODEL):
+        # Clé de cache liée au contenu: un fichier remplacé est rechargé
+        stat = os.stat(LEGACY_MODEL)
+        return f"legacy-{stat.st_mtime_ns}-{stat.st_size}", LEGACY_MODEL
+    raise RegistryError(f"Aucun modèle courant ni {LEGACY_MODEL}.")
+
+def load_model(model_id=None):
+    """XGBClassifier du modèle demandé (courant par défaut), mis en cache dans le process.
+    Lève RegistryError si introuvable, features_v13.FeatureSchemaError s'il n'attend pas le vecteur courant."""
+    model_id, path = resolve(model_id)
+    with _lock:
+        model = _cache.get(model_id)
+        if model is None:
+            model = xgb.XGBClassifier()
+            model.load_model(path)
+            features_v13.check_model(model)
+            _cache[model_id] = model
+    return model
+
+def list_models():
+    index = load_index()
+    for m in sorted(index['models'].values(), key=lambda m: m['created_at']):
+        flag = "➡️" if m['id'] == index.get('current') else "  "
+        metrics = ", ".join(f"{k}={v:.4f}" if isinstance(v, float) else f"{k}={v}" for k, v in m['metrics'].items())
+        print(f"{flag} {m['id']}  {m['created_at']}  data={m['data_fingerprint']}  {metrics}")
+    if not index['models']:
+        print("(registre vide)")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    try:
+        if command == "rollback":
+            print(f"✅ Modèle courant: {rollback(sys.argv[2] if len(sys.argv) > 2 else None)}")
+        elif command == "use" and len(sys.argv) > 2:
+            print(f"✅ Modèle courant: {set_current(sys.argv[2])}")
+        else:
+            list_models()
+    except RegistryError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
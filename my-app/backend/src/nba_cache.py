@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timedelta
+
+from nba_api.stats.library.http import NBAStatsResponse
+
+# Cache disque partagé des réponses stats.nba.com (nba_api).
+# Usage: nba_cache.fetch(leaguegamefinder.LeagueGameFinder, date_from_nullable=..., ...)
+# renvoie l'endpoint chargé, comme si on l'avait instancié directement.
+#
+# Modes (variable NBA_CACHE_MODE):
+#   on      (défaut) lecture du cache si encore valide, sinon appel API + enregistrement
+#   off     aucun cache, comportement historique
+#   record  appel API systématique + enregistrement (rafraîchit les réponses)
+#   replay  hors-ligne: uniquement les réponses enregistrées, jamais d'appel réseau
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, '..', 'data', 'cache', 'nba_api')
+MODE = os.environ.get("NBA_CACHE_MODE", "on").lower()
+
+# TTL par endpoint en secondes (None = jamais expiré)
+TTL = {
+    'LeagueGameFinder': 15 * 60,
+    'ScoreboardV2': 10,             # Scoreboard du jour = live
+    'LeagueStandingsV3': 15 * 60,
+    'LeagueDashPlayerStats': 60 * 60,
+}
+DEFAULT_TTL = 5 * 60
+FUTURE_TTL = 10 * 60                # Programme des jours suivants (horaires peuvent bouger)
+FINAL_AFTER_DAYS = 2                # Réponse finale si récupérée au moins 2 jours après la journée demandée
+
+# Paramètres qui ne changent pas la réponse
+IGNORED_PARAMS = {'timeout', 'proxy', 'headers', 'get_request'}
+
+# Paramètre "date de fin" de chaque endpoint (sert à détecter les requêtes sur des matchs finis)
+DATE_PARAMS = {
+    'LeagueGameFinder': 'date_to_nullable',
+    'ScoreboardV2': 'game_date',
+}
+
+
+class CacheMissError(RuntimeError):
+    """Réponse absente du cache en mode replay."""
+
+
+def normalize_params(params):
+    clean = {}
+    for k, v in params.items():
+        if k in IGNORED_PARAMS or v is None: continue
+        clean[k] = v.strip() if isinstance(v, str) else v
+    return dict(sorted(clean.items()))
+
+def cache_key(name, params):
+    raw = json.dumps([name, normalize_params(params)], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def parse_day(val):
+    for fmt in ('%Y-%m-%d', '%m/%d/%Y'):
+        try: return datetime.strptime(str(val).strip(), fmt).date()
+        except ValueError: continue
+    return None
+
+def query_day(name, params):
+    """Journée (date de fin) demandée par la requête, ou None."""
+    date_param = DATE_PARAMS.get(name)
+    return parse_day(params[date_param]) if date_param and params.get(date_param) else None
+
+def ttl_for(name, params, fetched_at=None):
+    """TTL d'une réponse récupérée à `fetched_at` (timestamp): infini si elle a été récupérée une fois
+    la journée terminée, court sinon (une réponse prise pendant les matchs ne devient jamais définitive)."""
+    day = query_day(name, params)
+    if day is not None:
+        if fetched_at is not None and datetime.fromtimestamp(fetched_at).date() >= day + timedelta(days=FINAL_AFTER_DAYS):
+            return None
+        if day > datetime.now().date():
+            return FUTURE_TTL
+    return TTL.get(name, DEFAULT_TTL)
+
+def cache_path(name, key):
+    return os.path.join(CACHE_DIR, name, f"{key}.json")
+
+def load_entry(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_entry(path, entry):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Écriture atomique: plusieurs étapes du pipeline tournent en parallèle
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(entry, f)
+    os.replace(tmp, path)
+
+def from_entry(endpoint_cls, params, entry):
+    endpoint = endpoint_cls(**params, get_request=False)
+    endpoint.nba_response = NBAStatsResponse(response=entry['response'], status_code=200, url=entry.get('url'))
+    endpoint.load_response()
+    endpoint.from_cache = True
+    return endpoint
+
+def fetch(endpoint_cls, ttl=False, **params):
+    """Instancie `endpoint_cls(**params)` en passant par le cache. `ttl` force un TTL (secondes, None = infini)."""
+    name = endpoint_cls.__name__
+    path = cache_path(name, cache_key(name, params))
+
+    if MODE in ('on', 'replay'):
+        entry = load_entry(path)
+        if entry is not None:
+            max_age = ttl_for(name, params, entry['fetched_at']) if ttl is False else ttl
+            if MODE == 'replay' or max_age is None or time.time() - entry['fetched_at'] < max_age:
+                return from_entry(endpoint_cls, params, entry)
+        if MODE == 'replay':
+            raise CacheMissError(f"{name} {normalize_params(params)} absent du cache (mode replay).")
+
+    endpoint = endpoint_cls(**params)
+    endpoint.from_cache = False
+
+    if MODE != 'off':
+        response = endpoint.nba_response
+        day = query_day(name, params)
+        save_entry(path, {
+            'endpoint': name,
+            'params': normalize_params(params),
+            'day': day.isoformat() if day else None,
+            'url': response.get_url() if hasattr(response, 'get_url') else None,
+            'fetched_at': time.time(),
+            'response': response.get_response(),
+        })
+    return endpoint
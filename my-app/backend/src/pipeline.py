@@ -0,0 +1,308 @@
+import os
+import sys
+import time
+import threading
+import traceback
+import importlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+# Forces le dossier de travail sur celui du script (backend/)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BASE_DIR)
+sys.path.insert(0, BASE_DIR)
+os.chdir(BACKEND_DIR)
+
+import game_store
+
+# --- DATASETS PARTAGÉS ---
+# Historique des matchs: store typé (game_store). Autres: nom logique -> (chemin, colonne date à parser)
+# Chemins absolus: les étapes tournent en parallèle et certains modules font os.chdir à l'import
+GAME_DATASETS = {game_store.RAW, game_store.READY}
+DATASETS = {
+    "bets_history": (os.path.join(BACKEND_DIR, "data", "bets_history.csv"), None),
+}
+
+
+class PipelineContext:
+    """Cache en mémoire des datasets partagés entre les étapes (1 seule lecture disque par fichier)."""
+
+    def __init__(self, force=False):
+        self.frames = {}
+        self.lock = threading.Lock()
+        # Ignore le cache de build (build_cache) des étapes lourdes
+        self.force = force
+
+    def get(self, name):
+        """Retourne une copie du DataFrame `name` (lu sur disque au premier accès), ou None s'il n'existe pas."""
+        with self.lock:
+            if name not in self.frames:
+                if name in GAME_DATASETS:
+                    df = game_store.read_games(name)
+                    if df is None:
+                        return None
+                else:
+                    path, date_col = DATASETS[name]
+                    if not os.path.exists(path):
+                        return None
+                    df = pd.read_csv(path)
+                    if date_col and date_col in df.columns:
+                        df[date_col] = pd.to_datetime(df[date_col])
+                self.frames[name] = df
+            # Copie: une étape qui plante à mi-chemin ne pollue pas les suivantes
+            return self.frames[name].copy()
+
+    def set(self, name, df):
+        """Remplace la version partagée après qu'une étape a réécrit le fichier sur disque."""
+        if df is not None:
+            with self.lock:
+                self.frames[name] = df
+
+
+class Step:
+    """Étape du pipeline: `inputs` / `outputs` sont des noms de ressources (datasets locaux ou tables cloud)."""
+
+    def __init__(self, name, description, func, module, inputs=(), outputs=()):
+        self.name = name
+        self.description = description
+        self.func = func
+        self.module = module
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+
+
+# --- ÉTAPES ---
+# Chaque module charge son .env / ses clés à l'import: ils sont importés une fois
+# par run_pipeline (import_step_module) avant le lancement des threads.
+
+def step_pull_votes(ctx):
+    import pull_votes
+    ctx.set("bets_history", pull_votes.pull_votes_from_cloud(ctx.get("bets_history")))
+
+def step_data_nba(ctx):
+    import data_nba
+    ctx.set("nba_games", data_nba.get_nba_data())
+
+def step_features_nba(ctx):
+    import features_nba
+    ctx.set("nba_games_ready", features_nba.build_features(ctx.get("nba_games"), df_ready=ctx.get("nba_games_ready"),
+                                                           force=ctx.force))
+
+def step_verify_bets(ctx):
+    import verify_bets
+    ctx.set("bets_history", verify_bets.verify(ctx.get("bets_history")))
+
+def step_predict_today(ctx):
+    import predict_today
+    bets_history = predict_today.predict_today(ctx.get("nba_games_ready"), ctx.get("bets_history"))
+    if bets_history is None:
+        # predict_today affiche l'erreur et retourne None: l'étape doit échouer (et bloquer la synchro)
+        raise RuntimeError("Génération des pronostics en échec.")
+    ctx.set("bets_history", bets_history)
+
+def step_sync_supabase(ctx):
+    import sync_supabase
+    sync_supabase.sync_csv_to_supabase(ctx.get("bets_history"))
+
+def step_sync_nba_games(ctx):
+    import sync_nba_games
+    sync_nba_games.sync_games(ctx.get("nba_games_ready"))
+
+def step_sync_standings(ctx):
+    import sync_standings
+    sync_standings.sync_standings()
+
+def step_sync_players(ctx):
+    import sync_players
+    sync_players.sync_players()
+
+def step_sync_team_intelligence(ctx):
+    import sync_team_intelligence
+    sync_team_intelligence.sync_team_intelligence(ctx.get("nba_games_ready"), ctx.get("bets_history"))
+
+def step_train_model(ctx):
+    import train_model_v13
+    ok, message, _ = train_model_v13.train_model(force=ctx.force)
+    if not ok:
+        raise RuntimeError(message)
+
+
+# Ordre de référence de la routine quotidienne.
+# Les dépendances sont déduites des inputs/outputs (cf. build_dependencies).
+DAILY_STEPS = [
+    Step("pull_votes", "Récupération des Votes Cloud", step_pull_votes, "pull_votes",
+         inputs=["bets_history", "cloud:bets_history"], outputs=["bets_history"]),
+    Step("data_nba", "Mise à jour des Scores Historiques", step_data_nba, "data_nba",
+         outputs=["nba_games"]),
+    Step("features_nba", "Calcul des Features IA", step_features_nba, "features_nba",
+         inputs=["nba_games"], outputs=["nba_games_ready"]),
+    Step("verify_bets", "Vérification des Résultats Passés", step_verify_bets, "verify_bets",
+         inputs=["bets_history"], outputs=["bets_history"]),
+    Step("predict_today", "Génération des Pronos du Jour", step_predict_today, "predict_today",
+         inputs=["nba_games_ready", "bets_history", "model"], outputs=["bets_history"]),
+    Step("sync_supabase", "Synchro Paris -> Supabase", step_sync_supabase, "sync_supabase",
+         inputs=["bets_history"], outputs=["cloud:bets_history"]),
+    Step("sync_nba_games", "Synchro Scores -> Supabase", step_sync_nba_games, "sync_nba_games",
+         inputs=["nba_games_ready"], outputs=["cloud:nba_games"]),
+    Step("sync_standings", "Synchro Classements -> Supabase", step_sync_standings, "sync_standings",
+         outputs=["cloud:nba_standings"]),
+    Step("sync_players", "Synchro Joueurs & Stats", step_sync_players, "sync_players",
+         outputs=["cloud:players"]),
+    Step("sync_team_intelligence", "Synchro Team Intelligence (V4)", step_sync_team_intelligence, "sync_team_intelligence",
+         inputs=["nba_games_ready", "bets_history"], outputs=["cloud:team_intelligence"]),
+]
+
+# Réentraînement (optionnel, --train): sauté par build_cache si nba_games_ready n'a pas changé.
+# Placé avant predict_today pour que les pronos du jour utilisent le nouveau modèle.
+TRAIN_STEP = Step("train_model_v13", "Entraînement Modèle V13", step_train_model, "train_model_v13",
+                  inputs=["nba_games_ready"], outputs=["model"])
+
+def with_training(steps):
+    """Ordre de référence avec l'entraînement inséré juste après features_nba."""
+    steps = list(steps)
+    pos = next((i + 1 for i, s in enumerate(steps) if s.name == "features_nba"), len(steps))
+    return steps[:pos] + [TRAIN_STEP] + steps[pos:]
+
+
+def build_dependencies(steps):
+    """Déduit le DAG depuis l'ordre de référence: lecture après écriture, écriture après lecture/écriture."""
+    deps = {}
+    last_writer = {}
+    readers = {}  # ressource -> lecteurs depuis la dernière écriture
+    for s in steps:
+        d = set()
+        for r in s.inputs:
+            if r in last_writer: d.add(last_writer[r])
+        for r in s.outputs:
+            if r in last_writer: d.add(last_writer[r])
+            d.update(readers.get(r, []))
+        d.discard(s.name)
+        deps[s.name] = d
+
+        for r in s.inputs:
+            readers.setdefault(r, []).append(s.name)
+        for r in s.outputs:
+            last_writer[r] = s.name
+            readers[r] = []
+    return deps
+
+
+def import_step_module(step):
+    """Importe le module de l'étape dans le thread principal (os.chdir / exit() à l'import ne doivent pas courir en parallèle)."""
+    start = time.perf_counter()
+    try:
+        importlib.import_module(step.module)
+        ok = True
+    except SystemExit:
+        # Module interrompu à l'import (clés manquantes...): l'étape ne peut pas tourner
+        ok = False
+    except Exception as e:
+        print(f"❌ Import impossible pour {step.name}: {e}")
+        ok = False
+    if not ok:
+        print(f"❌ {step.name}: échec au chargement du module {step.module}.")
+    return ok, time.perf_counter() - start
+
+
+def run_step(ctx, step):
+    """Exécute une étape dans le process courant. Retourne (succès, durée en secondes)."""
+    name, description = step.name, step.description
+    print(f"\n{'='*50}")
+    print(f"🚀 ÉTAPE : {description}")
+    print(f"{'='*50}")
+
+    start = time.perf_counter()
+    try:
+        step.func(ctx)
+        ok = True
+    except SystemExit as e:
+        # Les scripts historiques font exit(1) en cas d'erreur, exit() sinon
+        ok = e.code in (None, 0)
+    except Exception as e:
+        print(f"❌ ERREUR CRITIQUE dans {name}: {e}")
+        traceback.print_exc()
+        ok = False
+    elapsed = time.perf_counter() - start
+
+    if ok:
+        print(f"✅ {description} terminé avec succès ({elapsed:.1f}s).")
+    else:
+        print(f"❌ ERREUR CRITIQUE dans {name} ({elapsed:.1f}s).")
+    return ok, elapsed
+
+
+def print_timings(report, wall_clock=None):
+    print(f"\n{'='*50}")
+    print("⏱️ TEMPS PAR ÉTAPE")
+    print(f"{'='*50}")
+    total = sum(r["seconds"] for r in report)
+    icons = {"ok": "✅", "failed": "❌", "skipped": "⏭️"}
+    for r in report:
+        share = (r["seconds"] / total * 100) if total else 0
+        print(f"{icons[r['status']]} {r['name']:<24} {r['seconds']:>7.1f}s  {share:>5.1f}%")
+    print(f"   {'TOTAL (somme)':<24} {total:>7.1f}s")
+    if wall_clock is not None:
+        print(f"   {'TEMPS RÉEL':<24} {wall_clock:>7.1f}s")
+
+
+def run_pipeline(steps=None, ctx=None, max_workers=4):
+    """Exécute le DAG dans un seul interpréteur: les étapes indépendantes tournent en parallèle
+    sur un pool de threads, un échec n'annule que les étapes qui en dépendent. Retourne le rapport."""
+    steps = steps or DAILY_STEPS
+    ctx = ctx or PipelineContext()
+    deps = build_dependencies(steps)
+    wall_start = time.perf_counter()
+
+    status = {}
+    results = {}
+
+    # 1. Imports (séquentiels, thread principal)
+    import_time = {}
+    for step in steps:
+        ok, elapsed = import_step_module(step)
+        import_time[step.name] = elapsed
+        if not ok:
+            status[step.name] = "failed"
+            results[step.name] = elapsed
+
+    # 2. Ordonnancement
+    pending = [s for s in steps if s.name not in status]
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            # `steps` est dans un ordre topologique: une seule passe propage les annulations
+            for step in list(pending):
+                parents = deps[step.name]
+                if any(status.get(p) in ("failed", "skipped") for p in parents):
+                    failed_parents = [p for p in parents if status.get(p) in ("failed", "skipped")]
+                    print(f"⏭️ {step.name} annulé (dépend de: {', '.join(sorted(failed_parents))}).")
+                    status[step.name] = "skipped"
+                    results[step.name] = 0.0
+                    pending.remove(step)
+                elif all(status.get(p) == "ok" for p in parents):
+                    running[pool.submit(run_step, ctx, step)] = step
+                    pending.remove(step)
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                ok, elapsed = future.result()
+                status[step.name] = "ok" if ok else "failed"
+                results[step.name] = elapsed + import_time[step.name]
+
+    report = [{"name": s.name, "status": status[s.name], "ok": status[s.name] == "ok", "seconds": results[s.name]}
+              for s in steps]
+    print_timings(report, time.perf_counter() - wall_start)
+    return report
+
+
+if __name__ == "__main__":
+    workers = 4
+    if "--workers" in sys.argv:
+        workers = int(sys.argv[sys.argv.index("--workers") + 1])
+    steps = with_training(DAILY_STEPS) if "--train" in sys.argv else DAILY_STEPS
+    run_pipeline(steps, PipelineContext(force="--force" in sys.argv), max_workers=workers)
@@ -1,204 +1,73 @@
 import pandas as pd
-import numpy as np # Added for V13
-import xgboost as xgb
 from datetime import datetime
 import os
 import sys
 from nba_api.stats.endpoints import scoreboardv2
 from nba_api.stats.static import teams
 import explainability # V13 Explainability Logic
+import nba_cache
+import game_store
+import team_state
+import features_v13
+import model_registry
 
 # Forces le dossier de travail sur celui du script (backend/)
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 os.chdir("..")
 
 
-print("--- GÉNÉRATION AUTOMATIQUE DES PRONOSTICS (ENGINE V13) ---")
+GAMES_FILE = 'data/nba_games_ready.csv'
+HISTORY_FILE = 'data/bets_history.csv'
 
-# 1. Chargement des ressources
-try:
-    # On cherche le modèle dans models/
-    MODEL_PATH = "models/nba_predictor_v13.json" # UPDATED V13
-    if os.path.exists(MODEL_PATH):
-        model = xgb.XGBClassifier()
-        model.load_model(MODEL_PATH)
-    else:
-        print(f"❌ Erreur : {MODEL_PATH} introuvable.")
-        exit()
-
-    if os.path.exists('data/nba_games_ready.csv'):
-        df_history = pd.read_csv('data/nba_games_ready.csv')
-        df_history['GAME_DATE'] = pd.to_datetime(df_history['GAME_DATE'])
-    else:
-        print("❌ Erreur : data/nba_games_ready.csv introuvable.")
-        exit()
-        
-    nba_teams = teams.get_teams()
-    id_to_name = {t['id']: t['full_name'] for t in nba_teams}
-
-except Exception as e:
-    print(f"❌ Erreur chargement : {e}")
-    exit()
-
-# 2. Fonction de Prédiction V12 & V13
-def get_prediction_logic(home_id, away_id, target_date=None):
-    home_games = df_history[df_history['TEAM_ID'] == home_id].sort_values('GAME_DATE')
-    away_games = df_history[df_history['TEAM_ID'] == away_id].sort_values('GAME_DATE')
-    
-    if home_games.empty or away_games.empty: return None
-
-    # RE-CALCULATION ON THE FLY FOR PRECISION (Engine V12 Requirement)
-    def get_rolling_avg(games_df, col, n=5):
-        return games_df[col].tail(n).mean()
-        
-    factors = ['EFG_PCT', 'TOV_PCT', 'FT_RATE', 'ORB_RAW', 'WIN'] # WIN needed for WIN_LAST_5
-    
-    # --- FEATURES CALCULATION ---
-    feats = {}
-    
-    # Legacy factors (Recalculated to be fresh)
-    for t_type, t_df, suffix in [('HOME', home_games, '_HOME'), ('AWAY', away_games, '_AWAY')]:
-        feats[f'EFG_PCT_LAST_5{suffix}'] = t_df['EFG_PCT'].tail(5).mean()
-        feats[f'TOV_PCT_LAST_5{suffix}'] = t_df['TOV_PCT'].tail(5).mean()
-        feats[f'ORB_RAW_LAST_5{suffix}'] = t_df['ORB_RAW'].tail(5).mean()
-        feats[f'WIN_LAST_5{suffix}'] = t_df['WIN'].tail(5).mean() # For Diff Win
-
-    feats['DIFF_EFG'] = feats['EFG_PCT_LAST_5_HOME'] - feats['EFG_PCT_LAST_5_AWAY']
-    feats['DIFF_TOV'] = feats['TOV_PCT_LAST_5_HOME'] - feats['TOV_PCT_LAST_5_AWAY']
-    feats['DIFF_ORB'] = feats['ORB_RAW_LAST_5_HOME'] - feats['ORB_RAW_LAST_5_AWAY']
-    feats['DIFF_WIN'] = feats['WIN_LAST_5_HOME'] - feats['WIN_LAST_5_AWAY']
-
-    # --- ENGINE V12 CONTEXT FEATURES ---
-    
-    if target_date is None:
-        today = pd.to_datetime(datetime.now().strftime('%Y-%m-%d'))
-    else:
-        today = pd.to_datetime(target_date)
-    
-    # 1. Fatigue (Rest Days & B2B)
-    date_home = home_games.iloc[-1]['GAME_DATE']
-    date_away = away_games.iloc[-1]['GAME_DATE']
-    
-    # Days since last game RELATIVE TO TARGET DATE
-    diff_home = (today - date_home).days
-    rest_home = max(0, diff_home - 1)
-    rest_home = min(7, rest_home) # Clip at 7
-    
-    diff_away = (today - date_away).days
-    rest_away = max(0, diff_away - 1)
-    rest_away = min(7, rest_away)
-
-    feats['REST_DAYS_HOME'] = rest_home
-    feats['REST_DAYS_AWAY'] = rest_away
-    feats['DIFF_REST'] = rest_home - rest_away
-    
-    feats['IS_B2B_HOME_INT'] = 1 if rest_home == 0 else 0
-    feats['IS_B2B_AWAY_INT'] = 1 if rest_away == 0 else 0
-
-    # 2. Form (Last 10 Wins)
-    feats['LAST10_WINS_HOME'] = home_games['WIN'].tail(10).sum()
-    feats['LAST10_WINS_AWAY'] = away_games['WIN'].tail(10).sum()
-    feats['DIFF_LAST10'] = feats['LAST10_WINS_HOME'] - feats['LAST10_WINS_AWAY']
-
-    # 3. Streak (Current)
-    def get_current_streak(df):
-        # We need to iterate backwards from the end until the result changes
-        wins = df['WIN'].values
-        if len(wins) == 0: return 0
-        last_res = wins[-1]
-        streak = 0
-        for i in range(len(wins)-1, -1, -1):
-            if wins[i] == last_res:
-                streak += 1
-            else:
-                break
-        return streak if last_res == 1 else -streak
-
-    feats['STREAK_CURRENT_HOME'] = get_current_streak(home_games)
-    feats['STREAK_CURRENT_AWAY'] = get_current_streak(away_games)
-    feats['DIFF_STREAK'] = feats['STREAK_CURRENT_HOME'] - feats['STREAK_CURRENT_AWAY']
-
-    # 4. Specific Win Rate (Home at Home vs Away at Away)
-    home_at_home = home_games[home_games['MATCHUP'].str.contains('vs.')]
-    rate_home = home_at_home['WIN'].mean() if len(home_at_home) > 0 else 0.5
-    
-    away_at_away = away_games[~away_games['MATCHUP'].str.contains('vs.')] # @ symbol usually
-    rate_away = away_at_away['WIN'].mean() if len(away_at_away) > 0 else 0.5
-    
-    feats['WIN_RATE_SPECIFIC_HOME'] = rate_home
-    feats['WIN_RATE_SPECIFIC_AWAY'] = rate_away
-    feats['DIFF_SPECIFIC_WIN_RATE'] = rate_home - rate_away
-
-    # --- ENGINE V13 INJURY PROXIES ---
-    
-    # 5. EFF_SHOCK (Last 3 EFG - Last 10 EFG)
-    for t_type, t_df, suffix in [('HOME', home_games, '_HOME'), ('AWAY', away_games, '_AWAY')]:
-        efg3 = t_df['EFG_PCT'].tail(3).mean()
-        efg10 = t_df['EFG_PCT'].tail(10).mean()
-        feats[f'EFF_SHOCK{suffix}'] = (efg3 - efg10) * 100
-        
-    feats['DIFF_EFF_SHOCK'] = feats['EFF_SHOCK_HOME'] - feats['EFF_SHOCK_AWAY']
+# Colonnes de l'historique utilisées par get_prediction_logic (lecture projetée)
+HISTORY_COLUMNS = ['TEAM_ID', 'GAME_DATE', 'MATCHUP', 'EFG_PCT', 'TOV_PCT', 'ORB_RAW', 'WIN', 'PLUS_MINUS']
 
-    # 6. VOLATILITY (Std Dev of Point Differential)
-    # Assuming 'PLUS_MINUS' is in df_history (it should be if standard nba_games.csv)
-    # If not, we might need a fallback.
-    for t_type, t_df, suffix in [('HOME', home_games, '_HOME'), ('AWAY', away_games, '_AWAY')]:
-        if 'PLUS_MINUS' in t_df.columns:
-            feats[f'VOLATILITY{suffix}'] = t_df['PLUS_MINUS'].tail(10).std()
-        else:
-             # Fallback if PLUS_MINUS missing (should not happen with regular sync)
-             feats[f'VOLATILITY{suffix}'] = 0 
-             
-    feats['DIFF_VOLATILITY'] = feats['VOLATILITY_HOME'] - feats['VOLATILITY_AWAY']
-    
-    # 7. MARGIN_CRASH (Weighted Recent Failure)
-    def calc_margin_crash(df, n=3):
-        if 'PLUS_MINUS' not in df.columns: return 0
-        recent = df['PLUS_MINUS'].tail(n).values
-        if len(recent) == 0: return 0
-        weights = np.arange(1, len(recent) + 1)
-        return np.sum(recent * weights) / np.sum(weights)
+nba_teams = teams.get_teams()
+id_to_name = {t['id']: t['full_name'] for t in nba_teams}
 
-    feats['MARGIN_CRASH_HOME'] = calc_margin_crash(home_games)
-    feats['MARGIN_CRASH_AWAY'] = calc_margin_crash(away_games)
-    feats['DIFF_MARGIN_CRASH'] = feats['MARGIN_CRASH_HOME'] - feats['MARGIN_CRASH_AWAY']
+# 1. Chargement des ressources
+def load_model():
+    # Modèle courant du registre (models/registry), déjà chargé si le pipeline l'a utilisé
+    try:
+        return model_registry.load_model()
+    except (model_registry.RegistryError, features_v13.FeatureSchemaError) as e:
+        print(f"❌ Erreur : {e}")
+        return None
 
-    # Order must match Training exactly!
-    feature_order = [
-        'EFG_PCT_LAST_5_HOME', 'EFG_PCT_LAST_5_AWAY', 
-        'TOV_PCT_LAST_5_HOME', 'TOV_PCT_LAST_5_AWAY',
-        'ORB_RAW_LAST_5_HOME', 'ORB_RAW_LAST_5_AWAY', 
-        'DIFF_EFG', 'DIFF_TOV', 'DIFF_ORB', 'DIFF_WIN', 
-        'REST_DAYS_HOME', 'REST_DAYS_AWAY', 'DIFF_REST',
-        'IS_B2B_HOME_INT', 'IS_B2B_AWAY_INT',
-        'STREAK_CURRENT_HOME', 'STREAK_CURRENT_AWAY', 'DIFF_STREAK',
-        'LAST10_WINS_HOME', 'LAST10_WINS_AWAY', 'DIFF_LAST10',
-        'WIN_RATE_SPECIFIC_HOME', 'WIN_RATE_SPECIFIC_AWAY', 'DIFF_SPECIFIC_WIN_RATE',
-        
-        # V13
-        'EFF_SHOCK_HOME', 'EFF_SHOCK_AWAY', 'DIFF_EFF_SHOCK',
-        'VOLATILITY_HOME', 'VOLATILITY_AWAY', 'DIFF_VOLATILITY',
-        'MARGIN_CRASH_HOME', 'MARGIN_CRASH_AWAY', 'DIFF_MARGIN_CRASH'
-    ]
+def load_history():
+    if not game_store.exists(game_store.READY):
+        print(f"❌ Erreur : {GAMES_FILE} introuvable.")
+        return None
+    return game_store.read_games(game_store.READY, columns=HISTORY_COLUMNS)
 
-    input_data = pd.DataFrame([feats])[feature_order]
-    probs = model.predict_proba(input_data)[0]
-    return probs[1], feats # Return feats for UI Display persistence
+# 2. Fonction de Prédiction V12 & V13
+def predict_slate(games, snapshot, model):
+    """Score tous les matchs du programme en un seul appel predict_proba.
+    `snapshot`: état des équipes (team_state.build_team_snapshot), features assemblées par features_v13.
+    Retourne {index du match dans `games`: (prob_home, feats)}; les matchs sans historique sont absents."""
+    # REST relatif à la date de CHAQUE match (support multi-jours)
+    feats_df = features_v13.build_matchup_features(
+        snapshot, games['HOME_TEAM_ID'], games['VISITOR_TEAM_ID'], games['TARGET_DATE'])
+    if feats_df.empty: return {}
+
+    probs = model.predict_proba(features_v13.to_matrix(feats_df))[:, 1]
+    # feats gardés pour l'explicabilité et la persistance UI
+    records = feats_df.to_dict('records')
+    return {idx: (prob, feats) for idx, prob, feats in zip(feats_df.index, probs, records)}
 
 # 3. Récupération des matchs (Logique "Next Game Day")
-try:
+def fetch_upcoming_games(days=3):
     current_date = datetime.now()
-    found_games = False
     games = pd.DataFrame()
     
     # Loop to find next available games (limit 3 days ahead as requested)
-    for i in range(3):
+    for i in range(days):
         check_date = current_date + pd.Timedelta(days=i)
         check_str = check_date.strftime('%Y-%m-%d')
         print(f"📅 Recherche des matchs pour le {check_str}...")
         
         try:
-            board = scoreboardv2.ScoreboardV2(game_date=check_str)
+            board = nba_cache.fetch(scoreboardv2.ScoreboardV2, game_date=check_str)
             games_raw = board.game_header.get_data_frame()
             if games_raw is not None and not games_raw.empty:
                 daily_games = games_raw.dropna(subset=['HOME_TEAM_ID', 'VISITOR_TEAM_ID'])
@@ -207,127 +76,147 @@ try:
                     # Add DATE column to the dataframe for processing
                     daily_games['TARGET_DATE'] = check_str
                     games = pd.concat([games, daily_games], ignore_index=True)
-                    found_games = True
         except Exception as e:
             print(f"⚠️ Erreur API pour {check_str}: {e}")
-            
-    if games.empty:
-        print("⚠️ Aucun match trouvé dans les 3 prochains jours.")
-        exit()
-    
-    # 4. Boucle de prédiction et sauvegarde
-    HISTORY_FILE = 'data/bets_history.csv'
-    if not os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, 'w') as f:
-            f.write("Date,Home,Away,Predicted_Winner,Confidence,Type,Result,Real_Winner,User_Prediction,User_Result,User_Reason,User_Confidence,Home_Rest,Away_Rest,Home_B2B,Away_B2B,AI_Explanation,Risk_Level,Badges\n")
-            
+    return games
+
+def predict_today(df_history=None, current_hist=None):
+    """Génère / met à jour les pronostics des 3 prochains jours. Retourne bets_history à jour,
+    None en cas d'erreur (modèle, historique, API, écriture)."""
+    print("--- GÉNÉRATION AUTOMATIQUE DES PRONOSTICS (ENGINE V13) ---")
+
     try:
-        current_hist = pd.read_csv(HISTORY_FILE)
-    except:
-        current_hist = pd.DataFrame()
+        model = load_model()
+        if model is None: return None
+        if df_history is None:
+            df_history = load_history()
+            if df_history is None: return None
+        # État des équipes calculé une seule fois pour tout le programme
+        snapshot = team_state.build_team_snapshot(df_history)
+    except Exception as e:
+        print(f"❌ Erreur chargement : {e}")
+        return None
 
-    new_bets = 0
-    for _, game in games.iterrows():
-        h_id, a_id = game['HOME_TEAM_ID'], game['VISITOR_TEAM_ID']
-        h_name = id_to_name.get(h_id, str(h_id))
-        a_name = id_to_name.get(a_id, str(a_id))
-        
-        # Get target date for THIS game (Multi-day support)
-        target_date_str = game['TARGET_DATE']
-        
-        # Prepare valid datetime object for engine features
-        target_game_date = pd.to_datetime(target_date_str)
+    try:
+        games = fetch_upcoming_games()
+        # 4. Boucle de prédiction et sauvegarde
+        if current_hist is None:
+            if not os.path.exists(HISTORY_FILE):
+                with open(HISTORY_FILE, 'w') as f:
+                    f.write("Date,Home,Away,Predicted_Winner,Confidence,Type,Result,Real_Winner,User_Prediction,User_Result,User_Reason,User_Confidence,Home_Rest,Away_Rest,Home_B2B,Away_B2B,AI_Explanation,Risk_Level,Badges\n")
+                    
+            try:
+                current_hist = pd.read_csv(HISTORY_FILE)
+            except:
+                current_hist = pd.DataFrame()
+        else:
+            current_hist = current_hist.copy()
+
+        if games.empty:
+            # Pas une erreur: l'historique reste inchangé
+            print("⚠️ Aucun match trouvé dans les 3 prochains jours.")
+            return current_hist
 
-        should_process = True
-        existing_index = None
-        already_exists = False 
+        predictions = predict_slate(games, snapshot, model)
 
-        if not current_hist.empty:
-            match_exists = current_hist[
-                (current_hist['Date'] == target_date_str) & 
-                (current_hist['Home'] == h_name) & 
-                (current_hist['Away'] == a_name)
-            ]
-            if not match_exists.empty:
-                already_exists = True
-                existing_index = match_exists.index[0]
+        new_bets = 0
+        for idx, game in games.iterrows():
+            h_id, a_id = game['HOME_TEAM_ID'], game['VISITOR_TEAM_ID']
+            h_name = id_to_name.get(h_id, str(h_id))
+            a_name = id_to_name.get(a_id, str(a_id))
         
-        # Pass the date to logic if needed (Currently engine uses global 'today' or history)
-        # We need to ensure 'get_prediction_logic' uses the correct relative date for features like REST
-        # Modifying get_prediction_logic signature to accept game_date
+            # Get target date for THIS game (Multi-day support)
+            target_date_str = game['TARGET_DATE']
         
-        result = get_prediction_logic(h_id, a_id, target_game_date) 
+            existing_index = None
+            already_exists = False 
+
+            if not current_hist.empty:
+                match_exists = current_hist[
+                    (current_hist['Date'] == target_date_str) & 
+                    (current_hist['Home'] == h_name) & 
+                    (current_hist['Away'] == a_name)
+                ]
+                if not match_exists.empty:
+                    already_exists = True
+                    existing_index = match_exists.index[0]
         
-        if result is not None:
-            prob_home, feats = result
+            # Features (REST relatif à la date du match) et proba calculées en lot par predict_slate
+            result = predictions.get(idx)
+        
+            if result is not None:
+                prob_home, feats = result
             
-            if prob_home > 0.5:
-                winner, conf = h_name, prob_home * 100
-            else:
-                winner, conf = a_name, (1 - prob_home) * 100
+                if prob_home > 0.5:
+                    winner, conf = h_name, prob_home * 100
+                else:
+                    winner, conf = a_name, (1 - prob_home) * 100
             
-            h_b2b = "TRUE" if feats['IS_B2B_HOME_INT'] == 1 else "FALSE"
-            a_b2b = "TRUE" if feats['IS_B2B_AWAY_INT'] == 1 else "FALSE"
+                h_b2b = "TRUE" if feats['IS_B2B_HOME_INT'] == 1 else "FALSE"
+                a_b2b = "TRUE" if feats['IS_B2B_AWAY_INT'] == 1 else "FALSE"
             
-            # V13 EXPLAINABILITY
-            ux_data = explainability.get_explanation_and_risk(feats, prob_home, h_name, a_name)
+                # V13 EXPLAINABILITY
+                ux_data = explainability.get_explanation_and_risk(feats, prob_home, h_name, a_name)
             
-            # DATA PREPARATION
-            new_row = {
-                'Date': target_date_str,
-                'Home': h_name,
-                'Away': a_name,
-                'Predicted_Winner': winner,
-                'Confidence': f"{conf:.1f}%",
-                'Type': 'Auto',
-                'Result': '', # AI Result (Unknown yet)
-                'Real_Winner': '',
-                # USER COLUMNS (To be preserved or Init)
-                'User_Prediction': '',
-                'User_Result': '',
-                'User_Reason': '',
-                'User_Confidence': '',
-                # FATIGUE
-                'Home_Rest': feats['REST_DAYS_HOME'],
-                'Away_Rest': feats['REST_DAYS_AWAY'],
-                'Home_B2B': h_b2b,
-                'Away_B2B': a_b2b,
-                # V13
-                'AI_Explanation': ux_data['explanation'],
-                'Risk_Level': ux_data['risk_level'],
-                'Badges': "|".join(ux_data['badges'])
-            }
-
-            if already_exists and existing_index is not None:
-                # UPDATE MODE: We preserve User columns from the existing row
-                old_row = current_hist.loc[existing_index]
+                # DATA PREPARATION
+                new_row = {
+                    'Date': target_date_str,
+                    'Home': h_name,
+                    'Away': a_name,
+                    'Predicted_Winner': winner,
+                    'Confidence': f"{conf:.1f}%",
+                    'Type': 'Auto',
+                    'Result': '', # AI Result (Unknown yet)
+                    'Real_Winner': '',
+                    # USER COLUMNS (To be preserved or Init)
+                    'User_Prediction': '',
+                    'User_Result': '',
+                    'User_Reason': '',
+                    'User_Confidence': '',
+                    # FATIGUE
+                    'Home_Rest': feats['REST_DAYS_HOME'],
+                    'Away_Rest': feats['REST_DAYS_AWAY'],
+                    'Home_B2B': h_b2b,
+                    'Away_B2B': a_b2b,
+                    # V13
+                    'AI_Explanation': ux_data['explanation'],
+                    'Risk_Level': ux_data['risk_level'],
+                    'Badges': "|".join(ux_data['badges'])
+                }
+
+                if already_exists and existing_index is not None:
+                    # UPDATE MODE: We preserve User columns from the existing row
+                    old_row = current_hist.loc[existing_index]
                 
-                # Copy back user fields if they exist
-                for key in ['User_Prediction', 'User_Result', 'User_Reason', 'User_Confidence']:
-                    if key in old_row and pd.notna(old_row[key]):
-                         new_row[key] = old_row[key]
+                    # Copy back user fields if they exist
+                    for key in ['User_Prediction', 'User_Result', 'User_Reason', 'User_Confidence']:
+                        if key in old_row and pd.notna(old_row[key]):
+                             new_row[key] = old_row[key]
                 
-                # Update the dataframe in memory
-                for col, val in new_row.items():
-                    current_hist.at[existing_index, col] = val
+                    # Update the dataframe in memory
+                    for col, val in new_row.items():
+                        current_hist.at[existing_index, col] = val
                     
-                print(f"   -> {h_name} vs {a_name} : Mis à jour (Vote gardé).")
-            else:
-                # INSERT MODE
-                new_df = pd.DataFrame([new_row])
-                current_hist = pd.concat([current_hist, new_df], ignore_index=True)
-                print(f"   -> {h_name} vs {a_name} : Nouveau.")
-                new_bets += 1
+                    print(f"   -> {h_name} vs {a_name} : Mis à jour (Vote gardé).")
+                else:
+                    # INSERT MODE
+                    new_df = pd.DataFrame([new_row])
+                    current_hist = pd.concat([current_hist, new_df], ignore_index=True)
+                    print(f"   -> {h_name} vs {a_name} : Nouveau.")
+                    new_bets += 1
 
-    # SAVE GLOBAL (Once after loop)
-    # Much safer than appending line by line which causes duplicates and encoding issues
-    current_hist.to_csv(HISTORY_FILE, index=False, encoding='utf-8')
-    
+        # SAVE GLOBAL (Once after loop)
+        # Much safer than appending line by line which causes duplicates and encoding issues
+        current_hist.to_csv(HISTORY_FILE, index=False, encoding='utf-8')
 
+        print(f"\nTerminé ! {new_bets} nouveaux pronostics ajoutés / Les autres mis à jour.")
 
-    print(f"\nTerminé ! {new_bets} nouveaux pronostics ajoutés / Les autres mis à jour.")
+        return current_hist
 
-    print(f"\nTerminé ! {new_bets} nouveaux pronostics ajoutés.")
+    except Exception as e:
+        print(f"❌ Erreur globale : {e}")
+        return None
 
-except Exception as e:
-    print(f"❌ Erreur globale : {e}")
+if __name__ == "__main__":
+    if predict_today() is None:
+        sys.exit(1)
@@ -1,9 +1,10 @@
 import pandas as pd
-import requests
 import os
 import numpy as np
 import sys
+import json
 from dotenv import load_dotenv
+import supabase_rest
 
 # Forces le dossier de travail sur celui du script (backend/)
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -23,6 +24,15 @@ load_dotenv(dotenv_path=env_path)
 SUPABASE_URL = os.getenv("NEXT_PUBLIC_SUPABASE_URL") or os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("NEXT_PUBLIC_SUPABASE_ANON_KEY") or os.getenv("SUPABASE_KEY")
 CSV_PATH = "data/bets_history.csv"
+TABLE = "bets_history"
+
+# Synchro incrémentale: dernier updated_at cloud déjà intégré (cf. sql/add_bets_history_updated_at.sql)
+WATERMARK_FILE = "data/pull_votes_state.json"
+# Relecture d'une marge avant le watermark: une transaction longue peut valider une ligne
+# dont l'updated_at est antérieur au watermark déjà enregistré (réconciliation idempotente)
+WATERMARK_OVERLAP = pd.Timedelta(minutes=10)
+# Colonnes utiles à la mise à jour des votes (id: clé de pagination) (les matchs inconnus en local sont relus en entier)
+DELTA_COLUMNS = "id,game_date,home_team,user_prediction,user_reason,user_confidence,updated_at"
 
 def normalize_date(val):
     if pd.isna(val): return ""
@@ -32,90 +42,156 @@ def normalize_str(val):
     if pd.isna(val): return ""
     return str(val).strip()
 
-def pull_votes_from_cloud():
+KEYS = ['match_date_clean', 'match_home_clean']
+VOTE_COLUMNS = ['User_Prediction', 'User_Reason', 'User_Confidence']
+
+# Colonne cloud -> colonne locale (import des matchs absents en local), avec valeur par défaut
+CLOUD_TO_LOCAL = {
+    'game_date': ('Date', None),
+    'home_team': ('Home', None),
+    'away_team': ('Away', None),
+    'predicted_winner': ('Predicted_Winner', None),
+    'confidence': ('Confidence', None),
+    'type': ('Type', 'Auto'),
+    'result_ia': ('Result', None),
+    'real_winner': ('Real_Winner', None),
+    'user_prediction': ('User_Prediction', None),
+    'user_result': ('User_Result', None),
+    'user_reason': ('User_Reason', None),
+    'user_confidence': ('User_Confidence', 2),
+}
+
+def is_set(s):
+    """Équivalent vectorisé de `if valeur:` (None / NaN / '' / 0 -> False)."""
+    return s.notna() & s.astype(bool)
+
+def reconcile(df_local, cloud_data):
+    """Fusion des lignes cloud dans df_local par jointure sur (date, équipe domicile).
+    Le cloud gagne quand il porte un vote / une raison / une confiance différents (mise à jour en place de df_local).
+    Retourne (nombre de mises à jour, DataFrame des matchs cloud absents en local)."""
+    cloud = pd.DataFrame(cloud_data, dtype=object)
+    for col, (_, default) in CLOUD_TO_LOCAL.items():
+        if col not in cloud.columns: cloud[col] = default
+    if cloud.empty:
+        return 0, pd.DataFrame()
+
+    cloud['match_date_clean'] = cloud['game_date'].map(normalize_date)
+    cloud['match_home_clean'] = cloud['home_team'].map(normalize_str)
+
+    # Index local de chaque clé (première occurrence, comme avant)
+    local_keys = pd.DataFrame({
+        'match_date_clean': df_local['Date'].map(normalize_date),
+        'match_home_clean': df_local['Home'].map(normalize_str),
+        'local_index': df_local.index,
+    }).drop_duplicates(subset=KEYS, keep='first')
+    merged = cloud.merge(local_keys, on=KEYS, how='left')
+
+    # --- NOUVEAUX MATCHS ---
+    new = merged[merged['local_index'].isna()]
+    for _, r in new.iterrows():
+        print(f"   [NOUVEAU] Import du match : {r['match_home_clean']} vs {r['away_team']} ({r['match_date_clean']})")
+    new_rows = pd.DataFrame({local: new[col].to_numpy() for col, (local, _) in CLOUD_TO_LOCAL.items()})
+
+    # --- VOTES MODIFIÉS ---
+    matched = merged[merged['local_index'].notna()].copy()
+    if matched.empty:
+        return 0, new_rows
+    idx = matched['local_index'].astype(df_local.index.dtype).to_numpy()
+    if 'User_Confidence' not in df_local.columns:
+        df_local['User_Confidence'] = None
+    local = df_local.loc[idx, VOTE_COLUMNS].set_axis(matched.index)
+
+    c_vote, c_reason, c_conf = matched['user_prediction'], matched['user_reason'], matched['user_confidence']
+    changed_vote = is_set(c_vote) & (local['User_Prediction'].isna() | (local['User_Prediction'] != c_vote))
+    changed_reason = is_set(c_reason) & (local['User_Reason'].isna() | (local['User_Reason'] != c_reason))
+    changed_conf = is_set(c_conf) & (local['User_Confidence'] != c_conf)
+
+    # Plusieurs lignes cloud sur le même match: la dernière modifiée l'emporte
+    updates = matched[changed_vote | changed_reason | changed_conf].drop_duplicates(subset='local_index', keep='last')
+    for _, r in updates.iterrows():
+        print(f"   [MAJ] Vote récupéré : {r['match_home_clean']} ({r['match_date_clean']})")
+
+    if updates.empty:
+        return 0, new_rows
+    upd_idx = updates['local_index'].astype(df_local.index.dtype).to_numpy()
+    for col, cloud_col in zip(VOTE_COLUMNS, ['user_prediction', 'user_reason', 'user_confidence']):
+        df_local[col] = df_local[col].astype(object)
+        df_local.loc[upd_idx, col] = updates[cloud_col].to_numpy()
+    return len(updates), new_rows
+
+def load_watermark():
+    try:
+        with open(WATERMARK_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get('updated_at')
+    except (OSError, ValueError):
+        return None
+
+def save_watermark(value):
+    tmp = WATERMARK_FILE + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'updated_at': value}, f)
+    os.replace(tmp, WATERMARK_FILE)
+
+def fetch_cloud_rows(df_local, client, watermark):
+    """Lignes cloud modifiées depuis `watermark` (toutes si None).
+    Retourne (lignes, nouveau watermark). Lève une exception si le cloud ne répond pas."""
+    if watermark is None:
+        rows = list(client.iter_rows(TABLE, {"select": "*"}))
+        stamps = [r['updated_at'] for r in rows if r.get('updated_at')]
+        return rows, max(stamps) if stamps else None
+
+    # gte + marge: les lignes validées en retard par rapport au watermark ne sont pas perdues
+    since = (pd.Timestamp(watermark) - WATERMARK_OVERLAP).isoformat()
+    rows = list(client.iter_rows(TABLE, {"select": DELTA_COLUMNS, "updated_at": f"gte.{since}"}))
+    new_watermark = max([watermark] + [r['updated_at'] for r in rows if r.get('updated_at')])
+
+    # Matchs absents en local: on relit la ligne complète pour pouvoir l'importer
+    local_keys = set(zip(df_local['Date'].map(normalize_date), df_local['Home'].map(normalize_str)))
+    unknown = [r['id'] for r in rows if (normalize_date(r.get('game_date')), normalize_str(r.get('home_team'))) not in local_keys]
+    if unknown:
+        full = {r['id']: r for r in client.iter_rows(TABLE, {"select": "*", "id": f"in.({','.join(map(str, unknown))})"})}
+        rows = [full.get(r['id'], r) for r in rows]
+    return rows, new_watermark
+
+def pull_votes_from_cloud(df_local=None, full=False):
+    """Rapatrie les votes du cloud dans bets_history. Incrémental (updated_at > dernier watermark) sauf `full`.
+    Retourne le DataFrame local (à jour) ou None si échec."""
     print("--- RÉCUPÉRATION (UPDATE & INSERT) CLOUD -> LOCAL ---")
     
-    if not os.path.exists(CSV_PATH):
-        print("[ERREUR] Pas de CSV local.")
-        return
-    
-    df_local = pd.read_csv(CSV_PATH)
+    if df_local is None:
+        if not os.path.exists(CSV_PATH):
+            print("[ERREUR] Pas de CSV local.")
+            return
+        df_local = pd.read_csv(CSV_PATH)
+    else:
+        df_local = df_local.copy()
     print(f"[LOCAL] {len(df_local)} lignes.")
 
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json"
-    }
-    url = f"{SUPABASE_URL}/rest/v1/bets_history?select=*"
-    
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        print("[ERREUR CLOUD] Variables Supabase manquantes.")
+        return
+    client = supabase_rest.SupabaseClient(SUPABASE_URL, SUPABASE_KEY)
+    watermark = None if full else load_watermark()
+    if watermark:
+        print(f"[CLOUD] Mode incrémental: lignes modifiées depuis {watermark}")
+
     try:
-        r = requests.get(url, headers=headers)
-        if r.status_code != 200:
-            print(f"[ERREUR CLOUD] {r.text}")
-            return
-        cloud_data = r.json()
+        try:
+            cloud_data, new_watermark = fetch_cloud_rows(df_local, client, watermark)
+        except supabase_rest.SupabaseError as e:
+            if watermark is None or 'updated_at' not in str(e): raise
+            # Colonne updated_at absente côté Supabase (migration non appliquée): pull complet
+            print("[WARN] Colonne updated_at indisponible, récupération complète.")
+            cloud_data, new_watermark = fetch_cloud_rows(df_local, client, None)
         print(f"[CLOUD] {len(cloud_data)} lignes récupérées.")
     except Exception as e:
-        print(f"[CRASH] {e}")
+        print(f"[ERREUR CLOUD] {e}")
         return
 
-    df_local['match_date_clean'] = df_local['Date'].apply(normalize_date)
-    df_local['match_home_clean'] = df_local['Home'].apply(normalize_str)
+    updates_count, new_rows = reconcile(df_local, cloud_data)
 
-    updates_count = 0
-    new_rows = []
-    
-    for row_cloud in cloud_data:
-        c_date = normalize_date(row_cloud.get('game_date'))
-        c_home = normalize_str(row_cloud.get('home_team'))
-        
-        mask = (df_local['match_date_clean'] == c_date) & (df_local['match_home_clean'] == c_home)
-        
-        if mask.any():
-            idx = df_local[mask].index[0]
-            c_vote = row_cloud.get('user_prediction')
-            c_reason = row_cloud.get('user_reason')
-            l_vote = df_local.at[idx, 'User_Prediction']
-            l_reason = df_local.at[idx, 'User_Reason']
-            l_confidence = df_local.at[idx, 'User_Confidence'] if 'User_Confidence' in df_local.columns else None
-            
-            # Check for changes in Vote, Reason, or Confidence
-            needs_update = False
-            if c_vote and (pd.isna(l_vote) or l_vote != c_vote): needs_update = True
-            if c_reason and (pd.isna(l_reason) or l_reason != c_reason): needs_update = True
-            if row_cloud.get('user_confidence') and l_confidence != row_cloud.get('user_confidence'): needs_update = True
-            
-            if needs_update:
-                df_local.at[idx, 'User_Prediction'] = c_vote
-                df_local.at[idx, 'User_Reason'] = c_reason
-                df_local.at[idx, 'User_Confidence'] = row_cloud.get('user_confidence', 2)
-                updates_count += 1
-                print(f"   [MAJ] Vote récupéré : {c_home} ({c_date})")
-                
-        else:
-            print(f"   [NOUVEAU] Import du match : {c_home} vs {row_cloud.get('away_team')} ({c_date})")
-            new_row = {
-                "Date": row_cloud.get('game_date'),
-                "Home": row_cloud.get('home_team'),
-                "Away": row_cloud.get('away_team'),
-                "Predicted_Winner": row_cloud.get('predicted_winner'),
-                "Confidence": row_cloud.get('confidence'),
-                "Type": row_cloud.get('type', 'Auto'),
-                "Result": row_cloud.get('result_ia'),
-                "Real_Winner": row_cloud.get('real_winner'),
-                "User_Prediction": row_cloud.get('user_prediction'),
-                "User_Result": row_cloud.get('user_result'),
-                "User_Reason": row_cloud.get('user_reason'),
-                "User_Confidence": row_cloud.get('user_confidence', 2)
-            }
-            new_rows.append(new_row)
-
-    df_local = df_local.drop(columns=['match_date_clean', 'match_home_clean'])
-    
-    if new_rows:
-        df_new = pd.DataFrame(new_rows)
-        df_local = pd.concat([df_local, df_new], ignore_index=True)
+    if len(new_rows) > 0:
+        df_local = pd.concat([df_local, new_rows], ignore_index=True)
         df_local['Date'] = pd.to_datetime(df_local['Date'])
         df_local = df_local.sort_values('Date')
         df_local['Date'] = df_local['Date'].dt.strftime('%Y-%m-%d')
@@ -129,5 +205,11 @@ def pull_votes_from_cloud():
     else:
         print("\n[INFO] Tout est déjà synchro.")
 
+    # Watermark avancé seulement une fois les changements intégrés (et sauvegardés)
+    if new_watermark:
+        save_watermark(new_watermark)
+
+    return df_local
+
 if __name__ == "__main__":
-    pull_votes_from_cloud()
+    pull_votes_from_cloud(full="--full" in sys.argv)
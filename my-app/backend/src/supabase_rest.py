@@ -0,0 +1,253 @@
+import asyncio
+import gzip
+import json
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# Client PostgREST (Supabase) partagé par les scripts de synchro.
+# - Session HTTP poolée: connexions TLS réutilisées (keep-alive) entre requêtes et batchs.
+# - Retries avec backoff exponentiel sur 429 / 5xx / erreurs réseau (Retry-After respecté).
+# - Corps de requête gzip au-delà de GZIP_MIN_BYTES (désactivé pour la session si le serveur le refuse).
+# - Lecture paginée par clé (keyset): chaque page demande `<key> > dernière valeur vue`, triée sur la clé.
+#   Contrairement à limit/offset, le coût d'une page ne dépend pas de sa position
+#   et une ligne insérée pendant la lecture ne décale pas les suivantes.
+# - Upsert par batchs dimensionnés en octets (et non en nombre de lignes), envoyés en parallèle
+#   (asyncio, concurrence bornée) avec un rapport de progression dans l'ordre des batchs et une échéance globale.
+# L'URL de base est un paramètre: un serveur PostgREST local / factice (http://127.0.0.1:...) convient pour les essais.
+# Usage:
+#   client = supabase_rest.SupabaseClient(URL, KEY)
+#   for row in client.iter_rows("bets_history", {"select": "id,game_date"}): ...
+#   client.upsert("nba_games", records)
+
+PAGE_SIZE = 1000
+TIMEOUT = 60  # secondes par requête
+POOL_SIZE = 8
+
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5  # 0.5s, 1s, 2s, 4s
+BACKOFF_MAX = 30
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+GZIP_MIN_BYTES = 1024
+# Taille cible d'un batch d'upsert (JSON non compressé) et plafond de lignes
+MAX_BATCH_BYTES = 1_000_000
+MAX_BATCH_ROWS = 1000
+
+# Upsert parallèle: batchs en vol simultanément, nouvelles tentatives d'un batch après échec réseau, échéance (s)
+CONCURRENCY = 4
+BATCH_RETRIES = 1
+UPSERT_DEADLINE = 900
+
+OK_STATUS = {200, 201, 204}
+
+
+class SupabaseError(RuntimeError):
+    """Réponse PostgREST en erreur (ou serveur injoignable après retries)."""
+
+
+def encode_records(records):
+    """JSON de chaque enregistrement (sérialisé une seule fois, réutilisé pour le découpage et l'envoi)."""
+    return [json.dumps(r, default=str, ensure_ascii=False).encode('utf-8') for r in records]
+
+def join_encoded(parts):
+    return b"[" + b",".join(parts) + b"]"
+
+def split_batches(parts, max_bytes=MAX_BATCH_BYTES, max_rows=MAX_BATCH_ROWS):
+    """Découpe des enregistrements encodés en plages (début, fin) de moins de `max_bytes` et `max_rows`.
+    Un enregistrement plus gros que `max_bytes` forme un batch à lui seul."""
+    batches = []
+    start, size = 0, 2
+    for i, part in enumerate(parts):
+        extra = len(part) + 1
+        if i > start and (size + extra > max_bytes or i - start >= max_rows):
+            batches.append((start, i))
+            start, size = i, 2
+        size += extra
+    if start < len(parts):
+        batches.append((start, len(parts)))
+    return batches
+
+def retry_delay(response, attempt):
+    """Délai avant la tentative suivante: Retry-After si fourni, sinon backoff exponentiel."""
+    if response is not None:
+        try:
+            return min(float(response.headers.get('Retry-After')), BACKOFF_MAX)
+        except (TypeError, ValueError):
+            pass
+    return min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX)
+
+
+def encoding_refused(response):
+    """Le serveur refuse le corps compressé: 415, ou 400 dont le message parle de l'encodage (pas une ligne invalide)."""
+    if response.status_code == 415:
+        return True
+    text = response.text.lower()
+    return response.status_code == 400 and ('gzip' in text or 'encoding' in text)
+
+
+def past_deadline(deadline, delay=0):
+    return deadline is not None and time.monotonic() + delay >= deadline
+
+
+class SupabaseClient:
+    def __init__(self, url, key, gzip_bodies=True, pool_size=POOL_SIZE, timeout=TIMEOUT):
+        self.base_url = f"{url.rstrip('/')}/rest/v1"
+        self.gzip_bodies = gzip_bodies
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Content-Type": "application/json",
+        })
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def endpoint(self, table):
+        return f"{self.base_url}/{table}"
+
+    def send(self, method, table, params=None, body=None, headers=None, deadline=None):
+        """Requête brute avec retries. `body`: bytes JSON (compressé ici si utile).
+        `deadline` (time.monotonic()): pas de nouvelle tentative qui dépasserait l'échéance, et le timeout
+        de chaque requête est borné par le temps restant (une requête en cours ne prolonge pas l'échéance).
+        Retourne la dernière réponse (éventuellement en erreur); lève SupabaseError si le serveur reste injoignable."""
+        url = self.endpoint(table)
+        attempt = 0
+        plain_retry = False
+        while True:
+            req_headers = dict(headers or {})
+            data = body
+            compressed = body is not None and self.gzip_bodies and not plain_retry and len(body) >= GZIP_MIN_BYTES
+            if compressed:
+                data = gzip.compress(body, compresslevel=5)
+                req_headers["Content-Encoding"] = "gzip"
+            timeout = self.timeout
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise SupabaseError(f"{method} {table}: échéance dépassée")
+                timeout = min(timeout, remaining)
+            try:
+                r = self.session.request(method, url, params=params, data=data, headers=req_headers, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = retry_delay(None, attempt)
+                if attempt >= MAX_RETRIES or past_deadline(deadline, delay):
+                    raise SupabaseError(f"{method} {table}: {e}") from e
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            if compressed and encoding_refused(r):
+                # Corps gzip illisible pour le serveur / proxy: nouvel essai en clair
+                # (un autre 400, ligne invalide ou contrainte violée, est retourné tel quel)
+                plain_retry = True
+                continue
+            if r.status_code in RETRY_STATUS and attempt < MAX_RETRIES and not past_deadline(deadline, retry_delay(r, attempt)):
+                time.sleep(retry_delay(r, attempt))
+                attempt += 1
+                continue
+            if plain_retry and self.gzip_bodies and r.status_code in OK_STATUS:
+                # Passé en clair seulement: gzip désactivé pour le reste de la session
+                print("   [Supabase] Corps gzip refusé par le serveur, envoi non compressé.")
+                self.gzip_bodies = False
+            return r
+
+    def get(self, table, params=None):
+        """GET JSON. Lève SupabaseError si la réponse n'est pas 200."""
+        r = self.send("GET", table, params=params)
+        if r.status_code != 200:
+            raise SupabaseError(f"{r.status_code} {r.text[:200]}")
+        return r.json()
+
+    def iter_pages(self, table, params=None, key='id', page_size=PAGE_SIZE):
+        """Génère les pages (listes de lignes) d'une requête, triées sur `key` (qui doit être sélectionnée)."""
+        params = dict(params or {})
+        last = None
+        while True:
+            page_params = dict(params, order=f"{key}.asc", limit=str(page_size))
+            if last is not None:
+                # `and=` plutôt que `<key>=gt.` pour ne pas écraser un filtre existant sur la clé
+                page_params['and'] = f"({key}.gt.{last})"
+            page = self.get(table, page_params)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            last = page[-1][key]
+
+    def iter_rows(self, table, params=None, key='id', page_size=PAGE_SIZE):
+        """Génère les lignes une à une (mémoire bornée à une page)."""
+        for page in self.iter_pages(table, params, key, page_size):
+            yield from page
+
+    def post_batch(self, table, parts, on_conflict=None, deadline=None):
+        """Upsert d'un batch d'enregistrements encodés. Un batch refusé pour sa taille (413) est coupé en deux.
+        Retourne (succès, message d'erreur)."""
+        params = {"on_conflict": on_conflict} if on_conflict else None
+        headers = {"Prefer": "resolution=merge-duplicates,return=minimal"}
+        r = self.send("POST", table, params=params, body=join_encoded(parts), headers=headers, deadline=deadline)
+        if r.status_code in OK_STATUS:
+            return True, None
+        if r.status_code == 413 and len(parts) > 1:
+            mid = len(parts) // 2
+            ok_left, err_left = self.post_batch(table, parts[:mid], on_conflict, deadline)
+            ok_right, err_right = self.post_batch(table, parts[mid:], on_conflict, deadline)
+            return ok_left and ok_right, err_left or err_right
+        return False, f"{r.status_code} - {r.text[:200]}"
+
+    async def upsert_async(self, table, records, on_conflict=None, max_bytes=MAX_BATCH_BYTES, max_rows=MAX_BATCH_ROWS,
+                           on_batch=None, label=None, concurrency=CONCURRENCY, deadline=UPSERT_DEADLINE):
+        """Upsert (merge-duplicates) de `records` par batchs de moins de `max_bytes` octets de JSON,
+        au plus `concurrency` batchs en vol (requêtes bloquantes de la session poolée dans des threads).
+        Progression et `on_batch(batch)` (batchs acceptés) dans l'ordre des batchs.
+        Après `deadline` secondes, aucun batch n'est plus envoyé et ceux en cours sont abandonnés (comptés en échec):
+        le timeout des requêtes est borné par l'échéance, les threads encore actifs se terminent avec elle.
+        Retourne True si tous les batchs sont passés."""
+        records = list(records)
+        if not records:
+            return True
+        label = label or table
+        parts = encode_records(records)
+        batches = split_batches(parts, max_bytes, max_rows)
+        end_time = time.monotonic() + deadline if deadline else None
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def send_batch(start, end):
+            async with semaphore:
+                error = None
+                for _ in range(BATCH_RETRIES + 1):
+                    if past_deadline(end_time):
+                        return False, "échéance dépassée"
+                    try:
+                        return await asyncio.to_thread(self.post_batch, table, parts[start:end], on_conflict, end_time)
+                    except SupabaseError as e:
+                        error = str(e)
+                return False, error
+
+        tasks = [asyncio.create_task(send_batch(start, end)) for start, end in batches]
+        success = True
+        try:
+            for n, ((start, end), task) in enumerate(zip(batches, tasks), 1):
+                # Attente dans l'ordre: les batchs suivants continuent en parallèle
+                try:
+                    timeout = None if end_time is None else max(0.0, end_time - time.monotonic())
+                    ok, error = await asyncio.wait_for(asyncio.shield(task), timeout)
+                except asyncio.TimeoutError:
+                    ok, error = False, "échéance dépassée"
+                if ok:
+                    print(f"   {label} {start}-{end} / {len(records)} (batch {n}/{len(batches)}) : ✅ Succès")
+                    if on_batch:
+                        on_batch(records[start:end])
+                else:
+                    print(f"   {label} {start}-{end} : ⚠️ Erreur {error}")
+                    success = False
+        finally:
+            for task in tasks:
+                task.cancel()
+        return success
+
+    def upsert(self, table, records, **kwargs):
+        """Version bloquante de upsert_async (scripts de synchro, threads du pipeline)."""
+        return asyncio.run(self.upsert_async(table, records, **kwargs))
@@ -0,0 +1,42 @@
+import os
+import json
+import hashlib
+
+# Manifeste local des envois Supabase: clé d'enregistrement -> hash du dernier payload accepté par le cloud.
+# Permet de n'envoyer que les lignes nouvelles ou modifiées depuis la dernière synchro réussie.
+# Un fichier par table: data/sync_manifest/<table>.json
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_DIR = os.path.join(BASE_DIR, '..', 'data', 'sync_manifest')
+
+def record_hash(record):
+    """Hash stable du payload (ordre des clés indifférent)."""
+    raw = json.dumps(record, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def manifest_path(name):
+    return os.path.join(MANIFEST_DIR, f"{name}.json")
+
+def load_manifest(name):
+    try:
+        with open(manifest_path(name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(name, hashes):
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    path = manifest_path(name)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(hashes, f, sort_keys=True)
+    os.replace(tmp, path)
+
+def changed_records(records, manifest):
+    """`records`: {clé: payload}. Retourne {clé: (payload, hash)} des payloads absents du manifeste ou modifiés."""
+    changed = {}
+    for key, record in records.items():
+        h = record_hash(record)
+        if manifest.get(key) != h:
+            changed[key] = (record, h)
+    return changed
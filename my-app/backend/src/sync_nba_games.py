@@ -1,11 +1,13 @@
 
 import os
+import sys
 import pandas as pd
-import requests
-import json
 import time
 from dotenv import load_dotenv
 from nba_api.stats.static import teams
+import game_store
+import supabase_rest
+import sync_manifest
 
 # Forces le dossier de travail sur celui du script (backend/)
 # Si le script est dans backend/src/, on remonte à backend/
@@ -44,12 +46,7 @@ if not URL or not KEY:
     print("   Attendu: SUPABASE_SERVICE_ROLE_KEY ou NEXT_PUBLIC_SUPABASE_ANON_KEY")
     exit(1)
 
-Headers = {
-    "apikey": KEY,
-    "Authorization": f"Bearer {KEY}",
-    "Content-Type": "application/json",
-    "Prefer": "resolution=merge-duplicates"
-}
+client = supabase_rest.SupabaseClient(URL, KEY)
 
 
 # 2. SOURCE
@@ -73,28 +70,126 @@ def find_csv_path():
     
     return None
 
-ENDPOINT = f"{URL}/rest/v1/nba_games"
+TABLE = "nba_games"
+MANIFEST_NAME = "nba_games"
+
+def load_games():
+    """Historique des matchs: store typé (ready, puis brut), sinon anciens emplacements CSV."""
+    for name in (game_store.READY, game_store.RAW):
+        if game_store.exists(name):
+            print(f"📖 Lecture du dataset de stats: {name}...")
+            return game_store.read_games(name)
 
-def sync_games():
     csv_path = find_csv_path()
     if not csv_path:
-        print(f"⚠️ Fichier 'nba_games_ready.csv' ou 'nba_games.csv' introuvable.")
-        return
-
+        return None
     print(f"📖 Lecture du fichier de stats: {csv_path}...")
+    return pd.read_csv(csv_path)
+
+# Stats Object (JSONB): clé -> (colonne, type, valeur si manquante)
+STAT_FIELDS = {
+    "pts": ('PTS', int, 0),
+    "fg_pct": ('FG_PCT', float, 0.0),
+    "fg3_pct": ('FG3_PCT', float, 0.0),
+    "ft_pct": ('FT_PCT', float, 0.0),
+    "reb": ('REB', int, 0),
+    "ast": ('AST', int, 0),
+    "tov": ('TOV', int, 0),
+    "stl": ('STL', int, 0),
+    "blk": ('BLK', int, 0),
+    "plus_minus": ('PLUS_MINUS', float, 0.0),
+    "wl": ('WL', None, None),
+}
+
+# V12 Features par côté: colonne -> (colonne Supabase, type, valeur si manquante)
+# (les colonnes peuvent manquer si on lit le fichier brut)
+SIDE_FEATURES = {
+    'REST_DAYS': ('rest_days_{side}', int, None),
+    'IS_B2B': ('is_b2b_{side}', bool, False),
+    'STREAK_CURRENT': ('streak_current_{side}', int, 0),
+    'LAST10_WINS': ('last10_{side}_wins', int, 0),
+    'WIN_RATE_SPECIFIC': ('{side}_win_rate_specific', float, 0.0),
+}
+
+def column_values(df, col, kind, default):
+    """Colonne -> liste de valeurs Python (sérialisables en JSON), `default` si manquante ou colonne absente."""
+    if col not in df.columns:
+        return [default] * len(df)
+    s = df[col]
+    missing = s.isna().tolist()
+    values = s.tolist() if kind is None else s.fillna(kind()).astype(kind).tolist()
+    return [default if m else v for v, m in zip(values, missing)]
+
+def home_rows_mask(df):
+    """DÉTECTION ROBUSTE HOME/AWAY (vectorisée).
+    Cas standard: "Home vs. Away" (Home row) / "Away @ Home" (Away row)
+    Cas Londres/Neutre : Parfois "Away @ Home" pour les deux lignes ! -> on compare l'équipe au côté domicile."""
+    matchup = df['MATCHUP'].astype(str)
+    upper = matchup.str.upper()
+    has_vs = upper.str.contains(" VS. ", regex=False)
+    has_at = upper.str.contains(" @ ", regex=False)
+    # "TEAM_A vs. TEAM_B" -> TEAM_A est Home ; "TEAM_A @ TEAM_B" -> TEAM_B est Home
+    home_side = upper.str.split(" VS. ").str[0].where(has_vs, upper.str.split(" @ ").str[1])
+    is_home = df['TEAM_ABBREVIATION'] == home_side
+    # Fallback (Ne devrait pas arriver)
+    fallback = matchup.str.contains("vs.", regex=False)
+    return is_home.where(has_vs | has_at, fallback).astype(bool)
+
+def side_columns(rows, side):
+    """Lignes d'un côté (une par match, indexées par GAME_ID) -> colonnes nba_games de ce côté."""
+    stats = pd.DataFrame(
+        {key: column_values(rows, col, kind, default) for key, (col, kind, default) in STAT_FIELDS.items()},
+        dtype=object,
+    ).to_dict('records')
+    out = pd.DataFrame({
+        f'{side}_team': rows['FULL_NAME'].tolist(),
+        f'{side}_score': [st['pts'] for st in stats],
+        f'{side}_stats': stats,
+    }, index=rows.index, dtype=object)
+    for col, (template, kind, default) in SIDE_FEATURES.items():
+        out[template.format(side=side)] = pd.Series(column_values(rows, col, kind, default), index=rows.index, dtype=object)
+    return out
+
+def build_game_records(df):
+    """Historique (2 lignes par match) -> {GAME_ID: enregistrement nba_games}.
+    Seuls les matchs dont les deux équipes sont présentes sont retournés."""
+    # Le fichier contient 2 lignes par match (Home / Away)
+    # Nous devons les fusionner en 1 seule ligne DB
+    print("⚙️ Traitement et fusion des données (Home/Away)...")
+
+    # ID sometimes treated as int, ensure format '002...'
+    game_id = df['GAME_ID'].astype(str)
+    game_id = game_id.mask(game_id.str.startswith('2') & (game_id.str.len() < 10), '00' + game_id)
+    rows = df.assign(
+        GAME_KEY=game_id,
+        IS_HOME=home_rows_mask(df),
+        FULL_NAME=df['TEAM_ID'].astype(str).map(id_to_name).fillna(df['TEAM_ABBREVIATION']),
+    )
+
+    # Base info should be same for both rows (Date, ID): première ligne du match
+    base = rows.drop_duplicates('GAME_KEY', keep='first').set_index('GAME_KEY')
+    games = pd.DataFrame({
+        'game_date': pd.to_datetime(base['GAME_DATE']).dt.strftime('%Y-%m-%d').tolist(),
+        'id': base.index.tolist(),
+        'status': base['WL'].notna().map({True: 'Final', False: 'Scheduled'}).tolist(),
+    }, index=base.index, dtype=object)
+
+    # Pivot: une ligne par match, colonnes home_* / away_* (en cas de doublon, la dernière ligne l'emporte)
+    # Validation: On a besoin des deux équipes pour une ligne valide (jointure interne)
+    for side, mask in [('home', rows['IS_HOME']), ('away', ~rows['IS_HOME'])]:
+        side_rows = rows[mask].drop_duplicates('GAME_KEY', keep='last').set_index('GAME_KEY')
+        games = games.join(side_columns(side_rows, side), how='inner')
+
+    return dict(zip(games.index, games.to_dict('records')))
+
+def sync_games(df=None, full=False):
+    """Envoie les matchs vers Supabase. Tout l'historique est recalculé, mais seuls les matchs
+    nouveaux ou modifiés depuis le dernier envoi réussi (manifeste GAME_ID -> hash) partent, sauf `full`."""
     try:
-        df = pd.read_csv(csv_path)
-        
-        # FIX: Ensure proper sort by DATE before slicing delta, 
-        # otherwise TEAM_ID sort (from features_nba.py) breaks Game Pairings!
-        if 'GAME_DATE' in df.columns:
-            df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
-            df = df.sort_values('GAME_DATE')
-
-        # DELTA OPTIMIZATION: Only sync the last 200 rows
-        if len(df) > 200:
-            print(f"⚡ Delta Sync: Traitement des 200 dernières lignes uniquement.")
-            df = df.tail(200)
+        df = load_games() if df is None else df.copy()
+        if df is None:
+            print(f"⚠️ Fichier 'nba_games_ready.csv' ou 'nba_games.csv' introuvable.")
+            return
     except Exception as e:
         print(f"❌ Erreur lecture CSV: {e}")
         return
@@ -103,124 +198,37 @@ def sync_games():
         print("⚠️ CSV vide.")
         return
 
-    # Nettoyage et Aggregation par GAME_ID
-    # Le fichier contient 2 lignes par match (Home / Away)
-    # Nous devons les fusionner en 1 seule ligne DB
-    
-    print("⚙️ Traitement et fusion des données (Home/Away)...")
-    
-    games_map = {}
-    
-    for _, row in df.iterrows():
-        game_id = str(row['GAME_ID'])
-        if game_id.startswith('2'): # ID sometimes treated as int, ensure format '002...' if needed or just use str
-             game_id = f"00{game_id}" if len(game_id) < 10 else game_id
-
-        if game_id not in games_map:
-            games_map[game_id] = {}
-        
-        team_id = str(row['TEAM_ID'])
-        full_name = id_to_name.get(team_id, row['TEAM_ABBREVIATION'])
-        team_abbr = row['TEAM_ABBREVIATION']
-
-        # Stats Object (JSONB)
-        stats = {
-            "pts": int(row['PTS']) if pd.notna(row['PTS']) else 0,
-            "fg_pct": float(row['FG_PCT']) if pd.notna(row['FG_PCT']) else 0.0,
-            "fg3_pct": float(row['FG3_PCT']) if pd.notna(row['FG3_PCT']) else 0.0,
-            "ft_pct": float(row['FT_PCT']) if pd.notna(row['FT_PCT']) else 0.0,
-            "reb": int(row['REB']) if pd.notna(row['REB']) else 0,
-            "ast": int(row['AST']) if pd.notna(row['AST']) else 0,
-            "tov": int(row['TOV']) if pd.notna(row['TOV']) else 0,
-            "stl": int(row['STL']) if pd.notna(row['STL']) else 0,
-            "blk": int(row['BLK']) if pd.notna(row['BLK']) else 0,
-            "plus_minus": float(row['PLUS_MINUS']) if pd.notna(row['PLUS_MINUS']) else 0.0,
-            "wl": row['WL'] if pd.notna(row['WL']) else None
-        }
-
-        # DÉTECTION ROBUSTE HOME/AWAY
-        # Cas standard: "Home vs. Away" (Home row) / "Away @ Home" (Away row)
-        # Cas Londres/Neutre : Parfois "Away @ Home" pour les deux lignes !
-        matchup = str(row['MATCHUP']).upper() 
-        
-        if " VS. " in matchup:
-            # Format: "TEAM_A vs. TEAM_B" -> TEAM_A est Home
-            home_side = matchup.split(" VS. ")[0]
-            is_home_row = (team_abbr == home_side)
-        elif " @ " in matchup:
-            # Format: "TEAM_A @ TEAM_B" -> TEAM_B est Home
-            home_side = matchup.split(" @ ")[1]
-            is_home_row = (team_abbr == home_side)
-        else:
-            # Fallback (Ne devrait pas arriver)
-            is_home_row = "vs." in str(row['MATCHUP'])
-        
-        # V12 FEATURES EXTRACTION
-        # Check if column exists (it might not if using raw file fallback)
-        rest_days = int(row['REST_DAYS']) if 'REST_DAYS' in row and pd.notna(row['REST_DAYS']) else None
-        is_b2b = bool(row['IS_B2B']) if 'IS_B2B' in row and pd.notna(row['IS_B2B']) else False
-        streak = int(row['STREAK_CURRENT']) if 'STREAK_CURRENT' in row and pd.notna(row['STREAK_CURRENT']) else 0
-        last10 = int(row['LAST10_WINS']) if 'LAST10_WINS' in row and pd.notna(row['LAST10_WINS']) else 0
-        win_rate_specific = float(row['WIN_RATE_SPECIFIC']) if 'WIN_RATE_SPECIFIC' in row and pd.notna(row['WIN_RATE_SPECIFIC']) else 0.0
-        
-        # Populate Game Record
-        # Base info should be same for both rows (Date, ID)
-        if 'game_date' not in games_map[game_id]:
-            games_map[game_id]['game_date'] = pd.to_datetime(row['GAME_DATE']).strftime('%Y-%m-%d')
-            games_map[game_id]['id'] = game_id
-            games_map[game_id]['status'] = 'Final' if pd.notna(row['WL']) else 'Scheduled'
-
-        if is_home_row:
-            games_map[game_id]['home_team'] = full_name
-            games_map[game_id]['home_score'] = stats['pts']
-            games_map[game_id]['home_stats'] = stats
-            # V12 Home Features
-            games_map[game_id]['rest_days_home'] = rest_days
-            games_map[game_id]['is_b2b_home'] = is_b2b
-            games_map[game_id]['streak_current_home'] = streak
-            games_map[game_id]['last10_home_wins'] = last10
-            games_map[game_id]['home_win_rate_specific'] = win_rate_specific
-        else:
-            games_map[game_id]['away_team'] = full_name
-            games_map[game_id]['away_score'] = stats['pts']
-            games_map[game_id]['away_stats'] = stats
-             # V12 Away Features
-            games_map[game_id]['rest_days_away'] = rest_days
-            games_map[game_id]['is_b2b_away'] = is_b2b
-            games_map[game_id]['streak_current_away'] = streak
-            games_map[game_id]['last10_away_wins'] = last10
-            games_map[game_id]['away_win_rate_specific'] = win_rate_specific
-
-    # Preparation Payload Supabase
-    records_to_upsert = []
-    
-    for gid, gdata in games_map.items():
-        # Validation: On a besoin des deux équipes pour une ligne valide
-        if 'home_team' in gdata and 'away_team' in gdata:
-            records_to_upsert.append(gdata)
-            
-    if not records_to_upsert:
+    games = build_game_records(df)
+    if not games:
         print("⚠️ Aucune donnée match complète trouvée.")
         return
 
-    print(f"🚀 Synchronisation de {len(records_to_upsert)} matchs officiels avec V12 Features...")
-    
-    # Batch Upload
-    batch_size = 500
-    total = len(records_to_upsert)
-    
-    for i in range(0, total, batch_size):
-        batch = records_to_upsert[i:i+batch_size]
-        try:
-            r = requests.post(ENDPOINT, headers=Headers, data=json.dumps(batch))
-            if r.status_code in [200, 201, 204]:
-                print(f"   Matches {i} à {min(i+batch_size, total)} : ✅ Succès")
-            else:
-                print(f"   Matches {i}: ⚠️ Erreur {r.status_code} - {r.text[:100]}")
-        except Exception as e:
-            print(f"❌ Erreur réseau: {e}")
+    # Change detection: matchs absents du manifeste ou dont le payload a changé
+    # (nouveaux scores, features recalculées par features_nba sur d'anciens matchs...)
+    manifest = {} if full else sync_manifest.load_manifest(MANIFEST_NAME)
+    changed = sync_manifest.changed_records(games, manifest)
+    print(f"🔍 {len(changed)} / {len(games)} matchs nouveaux ou modifiés depuis la dernière synchro.")
+    if not changed:
+        print("✅ Rien à envoyer.")
+        return
+
+    print(f"🚀 Synchronisation de {len(changed)} matchs officiels avec V12 Features...")
+    acknowledged = dict(manifest)
+
+    def acknowledge(batch):
+        # Batch accepté: hash mémorisé
+        for record in batch:
+            acknowledged[record['id']] = changed[record['id']][1]
+
+    # Batch Upload (batchs dimensionnés en octets, cf. supabase_rest)
+    ok = client.upsert(TABLE, [record for record, _ in changed.values()], on_batch=acknowledge, label="Matches")
+    # Manifeste sauvegardé même en échec: les batchs acceptés ne seront pas renvoyés
+    sync_manifest.save_manifest(MANIFEST_NAME, acknowledged)
+    if not ok:
+        print("❌ Sync Matches incomplète: au moins un batch a échoué.")
+        sys.exit(1)
 
     print("✅ Terminé.")
 
 if __name__ == "__main__":
-    sync_games()
+    sync_games(full="--full" in sys.argv)
@@ -1,10 +1,11 @@
 
 import os
-import requests
-import json
+import sys
 import pandas as pd
 from nba_api.stats.endpoints import leaguedashplayerstats, commonallplayers
 from dotenv import load_dotenv
+import nba_cache
+import supabase_rest
 
 # Setup Environment
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -26,14 +27,9 @@ if not URL or not KEY:
     print("❌ Error: Missing Supabase credentials.")
     exit()
 
-Headers = {
-    "apikey": KEY,
-    "Authorization": f"Bearer {KEY}",
-    "Content-Type": "application/json",
-    "Prefer": "resolution=merge-duplicates"
-}
+client = supabase_rest.SupabaseClient(URL, KEY)
 
-ENDPOINT = f"{URL}/rest/v1/players"
+TABLE = "players"
 
 def sync_players():
     print("🏀 Syncing Active Players & Stats (2024-25)...")
@@ -41,11 +37,11 @@ def sync_players():
     try:
         # 1. Fetch Season Stats (Base list of active players with stats)
         print("   -> Fetching Season Stats...")
-        season_stats = leaguedashplayerstats.LeagueDashPlayerStats(season='2024-25', per_mode_detailed='PerGame').get_data_frames()[0]
+        season_stats = nba_cache.fetch(leaguedashplayerstats.LeagueDashPlayerStats, season='2024-25', per_mode_detailed='PerGame').get_data_frames()[0]
         
         # 2. Fetch Last 10 Games Stats
         print("   -> Fetching Last 10 Games Stats...")
-        l10_stats = leaguedashplayerstats.LeagueDashPlayerStats(season='2024-25', last_n_games=10, per_mode_detailed='PerGame').get_data_frames()[0]
+        l10_stats = nba_cache.fetch(leaguedashplayerstats.LeagueDashPlayerStats, season='2024-25', last_n_games=10, per_mode_detailed='PerGame').get_data_frames()[0]
         
         # 3. Merge
         # Rename L10 columns to avoid collision
@@ -85,17 +81,9 @@ def sync_players():
         records.append(record)
         
     # 5. Upsert
-    batch_size = 100
-    for i in range(0, len(records), batch_size):
-        batch = records[i:i+batch_size]
-        try:
-            r = requests.post(ENDPOINT, headers=Headers, data=json.dumps(batch))
-            if r.status_code in [200, 201, 204]:
-                print(f"   -> Upserted batch {i}-{i+len(batch)}")
-            else:
-                print(f"❌ Error {r.status_code}: {r.text}")
-        except Exception as e:
-            print(f"❌ Upsert Error: {e}")
+    if not client.upsert(TABLE, records, label="Players"):
+        print("❌ Sync Players incomplète: au moins un batch a échoué.")
+        sys.exit(1)
 
     print("✅ Sync Players & Stats Completed.")
 
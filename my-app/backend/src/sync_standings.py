@@ -1,10 +1,11 @@
 import os
-import requests
-import json
+import sys
 import time
 from dotenv import load_dotenv
 from nba_api.stats.endpoints import leaguestandingsv3
 from nba_api.stats.static import teams
+import nba_cache
+import supabase_rest
 
 # 1. CONFIG
 # Try loading from local .env or frontend .env.local
@@ -28,14 +29,9 @@ if not URL or not KEY:
     print("❌ ERREUR: Variables d'environnement manquantes (URL / SERVICE KEY).")
     exit(1)
 
-Headers = {
-    "apikey": KEY,
-    "Authorization": f"Bearer {KEY}",
-    "Content-Type": "application/json",
-    "Prefer": "resolution=merge-duplicates"
-}
+client = supabase_rest.SupabaseClient(URL, KEY)
 
-ENDPOINT = f"{URL}/rest/v1/nba_standings"
+TABLE = "nba_standings"
 
 def sync_standings():
     print("🏀 Récupération des classements NBA via nba_api...")
@@ -45,7 +41,7 @@ def sync_standings():
     team_map = {t['id']: t['full_name'] for t in nba_teams}
     
     try:
-        standings = leaguestandingsv3.LeagueStandingsV3()
+        standings = nba_cache.fetch(leaguestandingsv3.LeagueStandingsV3)
         df = standings.standings.get_data_frame()
     except Exception as e:
         print(f"❌ Erreur nba_api: {e}")
@@ -91,14 +87,10 @@ def sync_standings():
 
     print(f"🚀 Envoi de {len(records_to_upsert)} lignes vers Supabase...")
     
-    try:
-        r = requests.post(ENDPOINT, headers=Headers, data=json.dumps(records_to_upsert))
-        if r.status_code in [200, 201, 204]:
-            print("✅ Succès !")
-        else:
-            print(f"⚠️ Erreur {r.status_code} - {r.text}")
-    except Exception as e:
-        print(f"❌ Erreur réseau: {e}")
+    if not client.upsert(TABLE, records_to_upsert, label="Classements"):
+        print("❌ Sync Classements incomplète: au moins un batch a échoué.")
+        sys.exit(1)
+    print("✅ Succès !")
 
 if __name__ == "__main__":
     sync_standings()
@@ -1,9 +1,9 @@
 
 import os
 import pandas as pd
-import requests
-import json
 from dotenv import load_dotenv
+import supabase_rest
+import sync_manifest
 
 # Load env variables from frontend (avoid duplication)
 env_path = os.path.join(os.path.dirname(__file__), '../../frontend/.env.local')
@@ -20,39 +20,27 @@ if not URL or not KEY:
     print("❌ ERREUR: URL ou KEY manquant dans .env.local")
     exit(1)
 
-# Supabase REST API Config
-Headers = {
-    "apikey": KEY,
-    "Authorization": f"Bearer {KEY}",
-    "Content-Type": "application/json",
-    "Prefer": "resolution=merge-duplicates" # Important for Upsert with ID
-}
+# Supabase REST API Config (session poolée, retries, upsert merge-duplicates)
+client = supabase_rest.SupabaseClient(URL, KEY)
 
 # Resolve paths relative to script location
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Expected loc: backend/data/bets_history.csv (relative to backend/src/sync_supabase.py -> ../data/)
 CSV_PATH = os.path.join(BASE_DIR, '..', 'data', 'bets_history.csv')
-ENDPOINT = f"{URL}/rest/v1/bets_history"
+TABLE = "bets_history"
+MANIFEST_NAME = "bets_history"
 
 def get_existing_map():
-    """Fetches all existing matches to map (date, home_team) -> id"""
+    """Fetches all existing matches to map (date, home_team) -> id. Returns None on error
+    (an incomplete map would turn updates into duplicate inserts)."""
     print("🔄 Chargement de la base de données existante...")
-    # Fetch needed columns only to be light
-    # Assuming less than 10000 rows. If more, pagination needed.
-    # Default limit is usually 1000. Let's ask for more just in case.
-    params = {
-        "select": "id,game_date,home_team",
-        "limit": "5000" 
-    }
-    
+    # Fetch needed columns only to be light, page by page (keyset on id)
+    params = {"select": "id,game_date,home_team"}
+
     try:
-        r = requests.get(ENDPOINT, headers=Headers, params=params)
-        r.raise_for_status()
-        data = r.json()
-        
         # Build map: Key = "YYYY-MM-DD|HomeTeam" -> Value = ID
         mapping = {}
-        for row in data:
+        for row in client.iter_rows(TABLE, params):
             key = f"{row['game_date']}|{row['home_team']}"
             mapping[key] = row['id']
             
@@ -60,27 +48,27 @@ def get_existing_map():
         return mapping
     except Exception as e:
         print(f"❌ Erreur récupération données: {e}")
-        return {}
+        return None
 
-def sync_csv_to_supabase():
-    if not os.path.exists(CSV_PATH):
-        print(f"⚠️ Fichier {CSV_PATH} introuvable ici: {os.getcwd()}")
-        return
+def sync_csv_to_supabase(df=None, full=False):
+    """Envoie bets_history vers Supabase. Seules les lignes modifiées depuis le dernier envoi réussi
+    (manifeste de hash local) sont envoyées, sauf `full`."""
+    if df is None:
+        if not os.path.exists(CSV_PATH):
+            print(f"⚠️ Fichier {CSV_PATH} introuvable ici: {os.getcwd()}")
+            return
 
-    print(f"📖 Lecture de {CSV_PATH}...")
-    try:
-        df = pd.read_csv(CSV_PATH)
-    except Exception as e:
-        print(f"❌ Erreur lecture CSV: {e}")
-        return
+        print(f"📖 Lecture de {CSV_PATH}...")
+        try:
+            df = pd.read_csv(CSV_PATH)
+        except Exception as e:
+            print(f"❌ Erreur lecture CSV: {e}")
+            return
     
     if df.empty:
         print("⚠️ CSV vide.")
         return
 
-    # 1. Get Existing IDs (1 Request)
-    id_map = get_existing_map()
-    
     records_to_insert = []
     records_to_update = []
     
@@ -126,8 +114,25 @@ def sync_csv_to_supabase():
         
         unique_records[key] = record
 
+    # 1. Change detection: only records whose payload hash differs from the last acknowledged upload
+    manifest = {} if full else sync_manifest.load_manifest(MANIFEST_NAME)
+    changed = sync_manifest.changed_records(unique_records, manifest)
+    print(f"🔍 {len(changed)} / {len(unique_records)} matchs modifiés depuis la dernière synchro.")
+    if not changed:
+        print("✅ Rien à envoyer.")
+        return
+
+    # 2. Get Existing IDs (paginated)
+    id_map = get_existing_map()
+    if id_map is None:
+        # Sans les IDs existants, les mises à jour partiraient en insertions (doublons): rien n'est envoyé
+        # ni acquitté, la synchro est retentée au prochain lancement
+        print("❌ Synchronisation annulée: IDs existants indisponibles.")
+        import sys
+        sys.exit(1)
+
     # Now split into Insert/Update
-    for key, record in unique_records.items():
+    for key, (record, _) in changed.items():
         if key in id_map:
             record['id'] = id_map[key]
             records_to_update.append(record)
@@ -135,19 +140,25 @@ def sync_csv_to_supabase():
             records_to_insert.append(record)
 
     # 3. Execution
+    # Manifest = previous acknowledged hashes + hashes of the batches the server accepted in this run
+    # (a failed record keeps its old hash, so it is detected as changed and retried next time)
     success = True
+    acknowledged = dict(manifest)
+
+    def acknowledge(batch):
+        # Batch accepted: remember its hashes
+        for record in batch:
+            key = f"{record['game_date']}|{record['home_team']}"
+            acknowledged[key] = changed[key][1]
+
     for batch, name in [(records_to_update, "Mises à jour"), (records_to_insert, "Nouveaux")]:
         if not batch: continue
         print(f"🚀 {name} : Envoi de {len(batch)} matchs...")
-        try:
-            r = requests.post(ENDPOINT, headers=Headers, data=json.dumps(batch))
-            if r.status_code not in [200, 201, 204]:
-                 print(f"⚠️ Erreur {name}: {r.status_code} - {r.text[:200]}")
-                 success = False
-        except Exception as e:
-            print(f"❌ Erreur réseau {name}: {e}")
+        if not client.upsert(TABLE, batch, on_batch=acknowledge, label=name):
             success = False
 
+    sync_manifest.save_manifest(MANIFEST_NAME, acknowledged)
+
     if success:
         print("✅ Synchronisation terminée avec succès.")
     else:
@@ -155,4 +166,5 @@ def sync_csv_to_supabase():
         sys.exit(1)
 
 if __name__ == "__main__":
-    sync_csv_to_supabase()
+    import sys
+    sync_csv_to_supabase(full="--full" in sys.argv)
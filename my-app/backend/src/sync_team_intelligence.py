@@ -1,11 +1,12 @@
 import pandas as pd
 import numpy as np
 import os
-import requests
-import json
+import sys
 from datetime import datetime
 from dotenv import load_dotenv
 from nba_api.stats.static import teams
+import game_store
+import supabase_rest
 
 # Forces le dossier de travail sur celui du script (backend/)
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -29,113 +30,106 @@ if not URL or not KEY:
     print("❌ ERREUR: Variables d'environnement manquantes.")
     exit(1)
 
-Headers = {
-    "apikey": KEY,
-    "Authorization": f"Bearer {KEY}",
-    "Content-Type": "application/json",
-    "Prefer": "resolution=merge-duplicates"
-}
+client = supabase_rest.SupabaseClient(URL, KEY)
 
-ENDPOINT = f"{URL}/rest/v1/team_intelligence"
+TABLE = "team_intelligence"
 
 DATA_GAMES = "data/nba_games_ready.csv"
 DATA_BETS = "data/bets_history.csv"
+GAMES_COLUMNS = ['TEAM_ID', 'GAME_DATE', 'MATCHUP', 'WL', 'PTS', 'PLUS_MINUS']
+
+def ai_accuracy_by_team(df_bets):
+    """% de réussite de l'IA quand elle parie SUR ou CONTRE chaque équipe (Series indexée par nom d'équipe).
+    Une seule passe: les paris finis sont dépliés (Home / Away -> une ligne par équipe) puis groupés."""
+    if df_bets.empty or 'Result' not in df_bets.columns:
+        return pd.Series(dtype=float)
 
-def get_ai_accuracy(team_name, df_bets):
-    """Calcule le % de réussite de l'IA quand elle parie SUR ou CONTRE cette équipe"""
-    if df_bets.empty: return 0.0
-    
-    # Matchs impliquant l'équipe
-    mask = (df_bets['Home'] == team_name) | (df_bets['Away'] == team_name)
-    team_bets = df_bets[mask]
-    
-    if len(team_bets) == 0: return 0.0
-    
     # On ne garde que les paris finis
-    finished = team_bets[team_bets['Result'].isin(['GAGNE', 'PERDU'])]
-    if len(finished) == 0: return 0.0
-    
+    finished = df_bets[df_bets['Result'].isin(['GAGNE', 'PERDU'])]
+    by_team = finished.melt(id_vars=['Result'], value_vars=['Home', 'Away'], value_name='TEAM')
+
     # Calcul winrate
-    wins = len(finished[finished['Result'] == 'GAGNE'])
-    return round((wins / len(finished)) * 100, 1)
+    winrate = by_team['Result'].eq('GAGNE').groupby(by_team['TEAM']).mean()
+    return (winrate * 100).round(1)
 
-def get_volatility(team_id, df_games):
-    """Calcule la volatilité (Ecart-type du Plus/Minus sur 10 matchs)"""
-    team_games = df_games[df_games['TEAM_ID'] == team_id].sort_values('GAME_DATE')
-    if len(team_games) < 5: return 50.0 # Default
-    
-    last_10 = team_games.tail(10)
-    if 'PLUS_MINUS' not in last_10.columns: return 50.0
-    
-    std_dev = last_10['PLUS_MINUS'].std()
+def recent_games(df_games, n=10):
+    """Les `n` derniers matchs de chaque équipe (tri unique par équipe puis date)."""
+    df = df_games.sort_values(['TEAM_ID', 'GAME_DATE'], kind='stable')
+    return df.groupby('TEAM_ID').tail(n)
+
+def volatility_by_team(recent):
+    """Volatilité (Ecart-type du Plus/Minus sur 10 matchs) de chaque équipe, 50 par défaut (< 5 matchs)."""
+    counts = recent.groupby('TEAM_ID').size()
+    if 'PLUS_MINUS' not in recent.columns:
+        return pd.Series(50.0, index=counts.index)
+
+    std_dev = recent.groupby('TEAM_ID')['PLUS_MINUS'].std()
     # Normalize: NBA std dev usually between 5 (stable) and 15 (unstable)
     # Map 5->0, 20->100
-    score = (std_dev - 5) * (100 / 15)
-    return float(np.clip(score, 0, 100))
+    score = ((std_dev - 5) * (100 / 15)).clip(0, 100)
+    return score.where(counts >= 5, 50.0)
+
+def last_5_by_team(recent):
+    """5 derniers matchs de chaque équipe pour l'UI: {TEAM_ID: [match, ...]} (plus récent en premier)."""
+    last_5 = recent.groupby('TEAM_ID').tail(5)
+    matchup = last_5['MATCHUP'].astype(str)
+    # MATCHUP ex: "HOU vs. MEM" or "HOU @ MEM"
+    # We want our abb and opp abb: usually [MY_ABB, OPP_ABB]
+    parts = matchup.str.replace(" vs. ", " ", regex=False).str.replace(" @ ", " ", regex=False).str.split(" ")
+
+    diff = last_5['PLUS_MINUS']
+    pts = last_5['PTS']
+    opp_pts = pts - diff
+    sign = pd.Series(np.where(diff > 0, "+", ""), index=last_5.index)
+
+    history = pd.DataFrame({
+        "date": pd.to_datetime(last_5['GAME_DATE']).dt.strftime('%Y-%m-%d'),
+        "opponent": parts.str[1].fillna("OPP"),
+        "result": np.where(last_5['WL'] == 'W', "W", "L"),
+        "score_diff": sign + diff.astype(int).astype(str),
+        "score": pts.astype(int).astype(str) + "-" + opp_pts.astype(int).astype(str),
+        "my_team_abb": parts.str[0],
+        "is_home": matchup.str.contains("vs.", regex=False),
+    }, index=last_5.index)
 
-def get_last_5(team_id, df_games, id_to_name):
-    """Récupère les 5 derniers matchs pour l'UI"""
-    team_games = df_games[df_games['TEAM_ID'] == team_id].sort_values('GAME_DATE').tail(5)
-    history = []
-    
-    for _, row in team_games.iterrows():
-        is_home = "vs." in row['MATCHUP']
-        # MATCHUP ex: "HOU vs. MEM" or "HOU @ MEM"
-        # We want our abb and opp abb
-        parts = row['MATCHUP'].replace(" vs. ", " ").replace(" @ ", " ").split(" ")
-        # usually [MY_ABB, OPP_ABB]
-        my_abb = parts[0]
-        opp_code = parts[1] if len(parts) > 1 else "OPP"
-        
-        res = "W" if row['WL'] == 'W' else "L"
-        diff = row['PLUS_MINUS']
-        pts = row['PTS']
-        opp_pts = pts - diff
-        
-        sign = "+" if diff > 0 else ""
-        
-        history.append({
-            "date": pd.to_datetime(row['GAME_DATE']).strftime('%Y-%m-%d'),
-            "opponent": opp_code,
-            "result": res,
-            "score_diff": f"{sign}{int(diff)}",
-            "score": f"{int(pts)}-{int(opp_pts)}",
-            "my_team_abb": my_abb,
-            "is_home": is_home
-        })
     # Reverse to show newest first
-    return history[::-1]
+    return {tid: rows.iloc[::-1].to_dict('records') for tid, rows in history.groupby(last_5['TEAM_ID'])}
 
-def sync_team_intelligence():
+def sync_team_intelligence(df_games=None, df_bets=None):
     print("🧠 Synchronisation du module 'Team Intelligence'...")
     
     # Load Data
-    if not os.path.exists(DATA_GAMES):
-        print(f"⚠️ {DATA_GAMES} introuvable.")
-        return
-    
-    df_games = pd.read_csv(DATA_GAMES)
+    if df_games is None:
+        if not game_store.exists(game_store.READY):
+            print(f"⚠️ {DATA_GAMES} introuvable.")
+            return
+        df_games = game_store.read_games(game_store.READY, columns=GAMES_COLUMNS)
     
-    df_bets = pd.DataFrame()
-    if os.path.exists(DATA_BETS):
-        try:
-            df_bets = pd.read_csv(DATA_BETS)
-        except: pass
+    if df_bets is None:
+        df_bets = pd.DataFrame()
+        if os.path.exists(DATA_BETS):
+            try:
+                df_bets = pd.read_csv(DATA_BETS)
+            except: pass
 
     # Get Teams
     nba_teams = teams.get_teams()
     records = []
-    id_to_name = {t['id']: t['full_name'] for t in nba_teams}
+
+    # 1. Metrics (toutes les équipes en une passe)
+    accuracy = ai_accuracy_by_team(df_bets)
+    recent = recent_games(df_games)
+    volatility = volatility_by_team(recent)
+    last_5 = last_5_by_team(recent)
 
     for t in nba_teams:
         tid = t['id']
         tname = t['full_name']
-        
-        # 1. Metrics
-        acc = get_ai_accuracy(tname, df_bets)
-        vol = get_volatility(tid, df_games)
-        l5 = get_last_5(tid, df_games, id_to_name)
-        
+
+        acc = float(accuracy.get(tname, 0.0))
+        vol = float(volatility.get(tid, 50.0))
+        l5 = last_5.get(tid, [])
+
         # 2. Badge Logic
         rating = "NEUTRAL"
         badges = []
@@ -176,14 +170,10 @@ def sync_team_intelligence():
         
     # Upsert
     print(f"🚀 Envoi de {len(records)} analyses vers Supabase...")
-    try:
-        r = requests.post(ENDPOINT, headers=Headers, data=json.dumps(records))
-        if r.status_code in [200, 201, 204]:
-            print("✅ Succès Team Intelligence !")
-        else:
-            print(f"⚠️ Erreur: {r.status_code} - {r.text}")
-    except Exception as e:
-        print(f"❌ Erreur réseau: {e}")
+    if not client.upsert(TABLE, records, label="Team Intelligence"):
+        print("❌ Sync Team Intelligence incomplète: au moins un batch a échoué.")
+        sys.exit(1)
+    print("✅ Succès Team Intelligence !")
 
 if __name__ == "__main__":
     sync_team_intelligence()
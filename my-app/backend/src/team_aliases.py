@@ -0,0 +1,51 @@
+import re
+from functools import lru_cache
+
+import pandas as pd
+from nba_api.stats.static import teams
+
+# Table canonique nom d'équipe -> TEAM_ID.
+# bets_history contient surtout des noms complets ("Los Angeles Clippers") mais aussi des formes
+# courtes ("LAC Clippers", "OKC Thunder"); les stats NBA utilisent parfois "LA Clippers".
+# Chaque équipe est accessible par: nom complet, abréviation, surnom, "ABR Surnom", "Ville Surnom".
+
+EXTRA_ALIASES = {
+    'LA Clippers': 'LAC',
+    'L.A. Clippers': 'LAC',
+    'Los Angeles Clippers': 'LAC',
+    'LA Lakers': 'LAL',
+    'L.A. Lakers': 'LAL',
+}
+
+def normalize(name):
+    """Forme de comparaison: minuscules, sans points, espaces simples."""
+    return re.sub(r'\s+', ' ', str(name).replace('.', '')).strip().lower()
+
+@lru_cache(maxsize=1)
+def static_aliases():
+    table = {}
+    by_abbr = {}
+    for t in teams.get_teams():
+        by_abbr[t['abbreviation']] = t['id']
+        for alias in (t['full_name'], t['abbreviation'], t['nickname'],
+                      f"{t['abbreviation']} {t['nickname']}", f"{t['city']} {t['nickname']}"):
+            table[normalize(alias)] = t['id']
+    for alias, abbr in EXTRA_ALIASES.items():
+        table[normalize(alias)] = by_abbr[abbr]
+    return table
+
+def build_alias_table(df_games=None):
+    """Alias statiques (nba_api) + TEAM_NAME -> TEAM_ID tels qu'ils apparaissent dans l'historique des matchs."""
+    table = dict(static_aliases())
+    if df_games is not None and {'TEAM_NAME', 'TEAM_ID'} <= set(df_games.columns):
+        for name, tid in df_games[['TEAM_NAME', 'TEAM_ID']].drop_duplicates().itertuples(index=False):
+            table.setdefault(normalize(name), int(tid))
+    return table
+
+def resolve(names, table=None):
+    """Series de noms -> Series de TEAM_ID (Int64, <NA> si inconnu), même index.
+    Chaque nom distinct n'est normalisé qu'une fois."""
+    table = static_aliases() if table is None else table
+    names = pd.Series(names)
+    mapping = {n: table.get(normalize(n)) for n in names.dropna().unique()}
+    return names.map(mapping).astype('Int64')
@@ -0,0 +1,95 @@
+import pandas as pd
+import numpy as np
+# MARGIN_CRASH: mêmes poids que l'entraînement (du plus ancien au plus récent des 3 derniers matchs)
+from features_nba import MARGIN_WEIGHTS
+
+# État de forme de chaque équipe APRÈS un match donné: tout ce dont le vecteur V13
+# a besoin côté équipe (moyennes glissantes, repos, série, taux dom/ext, proxies blessures).
+# compute_team_states: une ligne par match (pour les recalculs historiques)
+# build_team_snapshot: dernier état de chaque équipe, indexé par TEAM_ID (pour l'inférence)
+#
+# Mêmes règles que l'ancien calcul à la volée de predict_today (tail(n) sur l'historique):
+# fenêtres incomplètes acceptées (min_periods=1), 0.5 si aucun match dom/ext.
+
+STATE_COLUMNS = [
+    'LAST_GAME_DATE',
+    'EFG_PCT_LAST_5', 'TOV_PCT_LAST_5', 'ORB_RAW_LAST_5', 'WIN_LAST_5',
+    'LAST10_WINS', 'STREAK_CURRENT', 'HOME_WIN_RATE', 'AWAY_WIN_RATE',
+    'EFF_SHOCK', 'VOLATILITY', 'MARGIN_CRASH',
+]
+
+def team_rolling(df, col, window, how='mean'):
+    """Fenêtre glissante par équipe incluant le match courant (df trié par TEAM_ID, GAME_DATE)."""
+    rolled = df.groupby('TEAM_ID')[col].rolling(window, min_periods=1)
+    return getattr(rolled, how)().reset_index(level=0, drop=True)
+
+def margin_crash(df):
+    """Moyenne pondérée (1, 2, 3) des derniers PLUS_MINUS; poids 1..n si moins de 3 matchs."""
+    g = df.groupby('TEAM_ID')['PLUS_MINUS']
+    n_games = df.groupby('TEAM_ID').cumcount() + 1
+    out = pd.Series(np.nan, index=df.index)
+    for n in range(1, len(MARGIN_WEIGHTS) + 1):
+        weights = MARGIN_WEIGHTS[:n]
+        total = sum(w * g.shift(n - 1 - i) for i, w in enumerate(weights)) / sum(weights)
+        mask = n_games == n if n < len(MARGIN_WEIGHTS) else n_games >= n
+        out[mask] = total[mask]
+    return out
+
+def compute_team_states(df):
+    """État de chaque équipe après chacun de ses matchs. Retourne un DataFrame trié par (TEAM_ID, GAME_DATE)
+    avec TEAM_ID, GAME_DATE et STATE_COLUMNS."""
+    df = df.copy()
+    df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
+    df = df.sort_values(['TEAM_ID', 'GAME_DATE'], kind='mergesort').reset_index(drop=True)
+
+    out = df[['TEAM_ID', 'GAME_DATE']].copy()
+    out['LAST_GAME_DATE'] = df['GAME_DATE']
+    for col in ['EFG_PCT', 'TOV_PCT', 'ORB_RAW', 'WIN']:
+        out[f'{col}_LAST_5'] = team_rolling(df, col, 5)
+    out['LAST10_WINS'] = team_rolling(df, 'WIN', 10, 'sum')
+
+    # Série en cours: longueur de la suite de résultats identiques se terminant sur ce match
+    run_id = (df['WIN'] != df.groupby('TEAM_ID')['WIN'].shift(1)).cumsum()
+    run_len = df.groupby(run_id).cumcount() + 1
+    out['STREAK_CURRENT'] = np.where(df['WIN'] == 1, run_len, -run_len)
+
+    # Taux de victoire à domicile / à l'extérieur (un seul scan de MATCHUP)
+    is_home = df['MATCHUP'].str.contains('vs.')
+    for side, mask in [('HOME', is_home), ('AWAY', ~is_home)]:
+        wins = (df['WIN'] * mask).groupby(df['TEAM_ID']).cumsum()
+        games = mask.astype(int).groupby(df['TEAM_ID']).cumsum()
+        out[f'{side}_WIN_RATE'] = np.where(games > 0, wins / games.where(games > 0, 1), 0.5)
+
+    out['EFF_SHOCK'] = (team_rolling(df, 'EFG_PCT', 3) - team_rolling(df, 'EFG_PCT', 10)) * 100
+    if 'PLUS_MINUS' in df.columns:
+        out['VOLATILITY'] = team_rolling(df, 'PLUS_MINUS', 10, 'std')
+        out['MARGIN_CRASH'] = margin_crash(df)
+    else:
+        # Fallback si PLUS_MINUS absent (ne devrait pas arriver avec la synchro habituelle)
+        out['VOLATILITY'] = 0
+        out['MARGIN_CRASH'] = 0
+    return out
+
+def build_team_snapshot(df):
+    """Dernier état connu de chaque équipe, indexé par TEAM_ID."""
+    states = compute_team_states(df)
+    return states.groupby('TEAM_ID').tail(1).set_index('TEAM_ID')[STATE_COLUMNS]
+
+def states_asof(states, team_ids, dates):
+    """État de chaque équipe juste AVANT chaque date (matchs strictement antérieurs), via une jointure as-of.
+    `states`: sortie de compute_team_states. Retourne STATE_COLUMNS aligné sur l'index de `team_ids`
+    (NaN si l'équipe n'avait encore joué aucun match)."""
+    left = pd.DataFrame({'TEAM_ID': pd.Series(team_ids).astype('int64'),
+                         'GAME_DATE': pd.to_datetime(pd.Series(dates, index=team_ids.index))})
+    left = left.sort_values('GAME_DATE', kind='mergesort')
+    merged = pd.merge_asof(left.reset_index(drop=True), states.sort_values('GAME_DATE', kind='mergesort'),
+                           on='GAME_DATE', by='TEAM_ID', allow_exact_matches=False)
+    merged.index = left.index
+    return merged.reindex(team_ids.index)[STATE_COLUMNS]
+
+def rest_days(last_game_date, target_date):
+    """Jours de repos avant `target_date` (bornés à 0..7), scalaires ou Series."""
+    diff = (pd.to_datetime(target_date) - pd.to_datetime(last_game_date))
+    if isinstance(diff, pd.Series):
+        return (diff.dt.days - 1).clip(0, 7)
+    return min(7, max(0, diff.days - 1))
@@ -3,6 +3,11 @@ import xgboost as xgb
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
 import os
+import json
+import game_store
+import features_v13
+import model_registry
+import build_cache
 
 # Forces le dossier de travail sur celui du script (backend/src) -> Remonte à backend/
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -10,85 +15,64 @@ os.chdir("..")
 
 # --- CHEMINS ---
 DATA_FILE = "data/nba_games_ready.csv"
-MODEL_FILE = "models/nba_predictor_v13.json" # V13 Model File
 
-def train_model():
+# Model Parameters (partagés avec backtest_v13)
+# Keeping close to V1 but slightly deeper maybe? V1 was depth=4.
+MODEL_PARAMS = dict(
+    n_estimators=200,
+    learning_rate=0.03,
+    max_depth=5,
+    eval_metric='logloss',
+    objective='binary:logistic',
+)
+# Meilleure configuration trouvée par tune_model_v13 (prioritaire sur MODEL_PARAMS si présente)
+PARAMS_FILE = "models/nba_predictor_v13.params.json"
+
+def load_model_params():
+    """MODEL_PARAMS, surchargés par la configuration de PARAMS_FILE si elle existe."""
+    params = dict(MODEL_PARAMS)
+    try:
+        with open(PARAMS_FILE, 'r', encoding='utf-8') as f:
+            params.update(json.load(f)['params'])
+    except (OSError, ValueError, KeyError):
+        pass
+    return params
+
+def train_model(force=False):
+    """Entraîne et enregistre le modèle V13. Sauté (build_cache) si les données ready, le code
+    et les paramètres n'ont pas changé depuis le dernier entraînement, sauf `force`."""
     print("--- Demarrage Entrainement Engine V13 (Injury Proxies) ---")
-    if not os.path.exists(DATA_FILE): 
+    if not game_store.exists(game_store.READY):
         print(f"❌ Erreur: {DATA_FILE} introuvable.")
         return False, "Fichier data introuvable", 0
 
+    params = load_model_params()
+    inputs = [game_store.parquet_path(game_store.READY), game_store.csv_path(game_store.READY)]
+    code = build_cache.module_paths('train_model_v13', 'features_v13')
+    fresh, fingerprint, meta = build_cache.check('train_model_v13', inputs, code, params)
+    model_id = meta.get('model_id')
+    if fresh and model_id not in model_registry.load_index()['models']:
+        # Modèle du dernier build retiré du registre: rien à réutiliser
+        print(f"[CACHE] Modèle {model_id} absent du registre: réentraînement.")
+        fresh = False
+    if fresh and not (force or build_cache.forced()):
+        current = model_registry.current_id()
+        if current != model_id:
+            # Pointeur déplacé volontairement (rollback / use): on ne le rebascule pas
+            print(f"[CACHE] Données et paramètres inchangés: modèle {model_id} déjà entraîné, "
+                  f"modèle courant {current} conservé (python src/model_registry.py use {model_id} pour le servir).")
+        else:
+            print(f"[CACHE] Données et paramètres inchangés: modèle courant {model_id} réutilisé.")
+        return True, "Modele V12 Ready (cache)", meta.get('accuracy', 0)
+
     try:
-        df = pd.read_csv(DATA_FILE)
-        
-        # Identification Home/Away Rows
-        # The file contains 2 rows per game. 
-        # MATCHUP contains "vs." for Home and "@" for Away.
-        df['IS_HOME'] = df['MATCHUP'].str.contains('vs.')
-        
-        # Split into Home and Away sub-dataframes
-        df_home = df[df['IS_HOME'] == True].copy().add_suffix('_HOME').rename(columns={'GAME_ID_HOME': 'GAME_ID'})
-        df_away = df[df['IS_HOME'] == False].copy().add_suffix('_AWAY').rename(columns={'GAME_ID_AWAY': 'GAME_ID'})
-        
-        # Merge to get one row per game with both team stats
-        df_final = pd.merge(df_home, df_away, on='GAME_ID')
-        
-        # --- FEATURE ENGINEERING (V12 & V13) ---
-        
-        # 1. Base Stats Diffs (Legacy)
-        for col in ['EFG_PCT', 'TOV_PCT', 'ORB_RAW', 'WIN']:
-            df_final[f'DIFF_{col[:3]}'] = df_final[f'{col}_LAST_5_HOME'] - df_final[f'{col}_LAST_5_AWAY']
-            
-        # 2. Context Features (New)
-        
-        # Rest Days & Fatigue
-        # Note: REST_DAYS is already calculated per team in features_nba.py
-        df_final['DIFF_REST'] = df_final['REST_DAYS_HOME'] - df_final['REST_DAYS_AWAY']
-        
-        # B2B (Booleans to Int)
-        df_final['IS_B2B_HOME_INT'] = df_final['IS_B2B_HOME'].astype(int)
-        df_final['IS_B2B_AWAY_INT'] = df_final['IS_B2B_AWAY'].astype(int)
+        df = game_store.read_games(game_store.READY)
         
-        # Streaks
-        df_final['DIFF_STREAK'] = df_final['STREAK_CURRENT_HOME'] - df_final['STREAK_CURRENT_AWAY']
+        # 1 ligne par match (Home / Away) + DIFF_* : assemblage partagé avec l'inférence
+        df_final = features_v13.build_game_features(df)
+        features = features_v13.FEATURE_ORDER
         
-        # Last 10 Form
-        df_final['DIFF_LAST10'] = df_final['LAST10_WINS_HOME'] - df_final['LAST10_WINS_AWAY']
-        
-        # Specific Win Rate (Home Team at Home vs Away Team at Away)
-        # This is powerful: How good is PHX at Home vs NYK on Road?
-        df_final['DIFF_SPECIFIC_WIN_RATE'] = df_final['WIN_RATE_SPECIFIC_HOME'] - df_final['WIN_RATE_SPECIFIC_AWAY']
-
-        # V13: INJURY PROXIES
-        df_final['DIFF_EFF_SHOCK'] = df_final['EFF_SHOCK_HOME'] - df_final['EFF_SHOCK_AWAY']
-        df_final['DIFF_VOLATILITY'] = df_final['VOLATILITY_HOME'] - df_final['VOLATILITY_AWAY']
-        df_final['DIFF_MARGIN_CRASH'] = df_final['MARGIN_CRASH_HOME'] - df_final['MARGIN_CRASH_AWAY']
-
-        # Select Features for Model
-        features = [
-            # Legacy
-            'EFG_PCT_LAST_5_HOME', 'EFG_PCT_LAST_5_AWAY', 
-            'TOV_PCT_LAST_5_HOME', 'TOV_PCT_LAST_5_AWAY',
-            'ORB_RAW_LAST_5_HOME', 'ORB_RAW_LAST_5_AWAY', 
-            'DIFF_EFG', 'DIFF_TOV', 'DIFF_ORB', 
-            
-            # Legacy but important
-            'DIFF_WIN', 
-            
-            # V12 NEW FEATURES
-            'REST_DAYS_HOME', 'REST_DAYS_AWAY', 'DIFF_REST',
-            'IS_B2B_HOME_INT', 'IS_B2B_AWAY_INT',
-            'STREAK_CURRENT_HOME', 'STREAK_CURRENT_AWAY', 'DIFF_STREAK',
-            'LAST10_WINS_HOME', 'LAST10_WINS_AWAY', 'DIFF_LAST10',
-            'WIN_RATE_SPECIFIC_HOME', 'WIN_RATE_SPECIFIC_AWAY', 'DIFF_SPECIFIC_WIN_RATE',
-
-            # V13 NEW FEATURES
-            'EFF_SHOCK_HOME', 'EFF_SHOCK_AWAY', 'DIFF_EFF_SHOCK',
-            'VOLATILITY_HOME', 'VOLATILITY_AWAY', 'DIFF_VOLATILITY',
-            'MARGIN_CRASH_HOME', 'MARGIN_CRASH_AWAY', 'DIFF_MARGIN_CRASH'
-        ]
-        
-        target = 'WIN_HOME'
+        target = features_v13.TARGET
         
         print(f"Features ({len(features)}): {features}")
         
@@ -99,29 +83,26 @@ def train_model():
         
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.15, shuffle=False)
         
-        # Model Parameters
-        # Slightly update params for more features? 
-        # Keeping close to V1 but slightly deeper maybe? V1 was depth=4.
-        model = xgb.XGBClassifier(
-            n_estimators=200, 
-            learning_rate=0.03, 
-            max_depth=5, 
-            eval_metric='logloss', 
-            objective='binary:logistic',
-            early_stopping_rounds=10
-        )
+        model = xgb.XGBClassifier(**params, early_stopping_rounds=10)
         
         model.fit(X_train, y_train, eval_set=[(X_test, y_test)], verbose=False)
-        
-        # Save
-        if not os.path.exists("models"): os.makedirs("models")
-        model.save_model(MODEL_FILE)
+        features_v13.tag_model(model)
         
         # Evaluation
         preds = model.predict(X_test)
         acc = accuracy_score(y_test, preds)
-        
-        print(f"✅ Modèle V12 entraîné et sauvegardé: {MODEL_FILE}")
+
+        # Save: nouvelle version du registre, qui devient le modèle courant
+        model_id = model_registry.register(
+            model,
+            metrics={'accuracy': float(acc), 'n_test': int(len(y_test)), 'n_train': int(len(y_train))},
+            params=params,
+            data_fingerprint=model_registry.dataset_fingerprint(),
+        )
+        build_cache.record('train_model_v13', fingerprint, [model_registry.model_path(model_id)],
+                           meta={'model_id': model_id, 'accuracy': float(acc)})
+
+        print(f"✅ Modèle V12 entraîné et enregistré: {model_id} (courant)")
         print(f"🎯 Précision sur le Test Set (Recent Games): {acc:.1%}")
         
         return True, "Modele V12 Ready", acc
@@ -133,4 +114,5 @@ def train_model():
         return False, str(e), 0
 
 if __name__ == "__main__":
-    s, m, a = train_model()
+    import sys
+    s, m, a = train_model(force="--force" in sys.argv)
@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import math
+import time
+from datetime import datetime
+import numpy as np
+import xgboost as xgb
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sklearn.metrics import accuracy_score, log_loss
+import game_store
+import features_v13
+from train_model_v13 import MODEL_PARAMS, PARAMS_FILE
+from backtest_v13 import load_matrix
+
+# Forces le dossier de travail sur celui du script (backend/)
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+os.chdir("..")
+
+# Recherche d'hyperparamètres XGBoost pour le moteur V13.
+# - Validation temporelle: entraînement sur les matchs anciens, validation sur les VALID_FRACTION plus récents
+#   (même découpe chronologique que train_model_v13 / analyze_model_v13, cf. features_v13.build_game_features). Le nombre d'arbres (early stopping) est choisi sur les STOP_FRACTION
+#   derniers matchs de la partie entraînement: la validation qui classe les configurations reste hors échantillon.
+# - Modes: "random" (chaque configuration au budget complet) ou "halving" (successive halving:
+#   toutes les configurations sur un petit budget d'arbres, on garde le meilleur 1/ETA, budget x ETA...).
+# - Les DMatrix sont construites une fois par worker (initializer) et réutilisées par tous ses essais.
+# - Chaque essai terminé est ajouté au journal TRIALS_FILE: une recherche interrompue reprend là où elle s'était arrêtée.
+# - La meilleure configuration est écrite dans PARAMS_FILE (à côté du modèle), relue par train_model_v13.
+# Usage: python src/tune_model_v13.py [--mode halving|random] [--trials 60] [--workers 4] [--seed 42]
+
+TRIALS_FILE = "data/tune_v13_trials.jsonl"
+
+VALID_FRACTION = 0.15
+STOP_FRACTION = 0.15  # part de l'entraînement réservée à l'early stopping
+MAX_ROUNDS = 1000
+MIN_ROUNDS = 50  # budget du premier palier (halving)
+ETA = 3
+EARLY_STOPPING = 20
+SEED = 42
+
+# Paramètres fixés par run_trial (objectif, métrique, nombre d'arbres via early stopping)
+TRIAL_KEYS = ('n_estimators', 'objective', 'eval_metric')
+
+# DMatrix partagées par les essais d'un même worker (remplies par init_worker)
+_dtrain = None
+_dstop = None
+_dvalid = None
+_y_valid = None
+_NTHREAD = 1
+
+
+def sample_params(rng):
+    """Configuration aléatoire (noms acceptés par xgb.train comme par XGBClassifier)."""
+    return {
+        'max_depth': int(rng.integers(3, 9)),
+        'learning_rate': float(math.exp(rng.uniform(math.log(0.01), math.log(0.2)))),
+        'subsample': float(rng.uniform(0.6, 1.0)),
+        'colsample_bytree': float(rng.uniform(0.5, 1.0)),
+        'min_child_weight': float(rng.uniform(1, 10)),
+        'gamma': float(rng.uniform(0, 5)),
+        'reg_lambda': float(math.exp(rng.uniform(math.log(0.5), math.log(10)))),
+    }
+
+def candidate_params(n_trials, seed=SEED):
+    """Liste déterministe (seed) des configurations: l'essai 0 est la configuration actuelle faite main."""
+    rng = np.random.default_rng(seed)
+    baseline = {k: v for k, v in MODEL_PARAMS.items() if k not in TRIAL_KEYS}
+    return [baseline] + [sample_params(rng) for _ in range(n_trials - 1)]
+
+def halving_budgets(max_rounds=MAX_ROUNDS, min_rounds=MIN_ROUNDS, eta=ETA):
+    """Budgets (nb d'arbres max) de chaque palier: min_rounds, x eta, ..., max_rounds."""
+    budgets = [min_rounds]
+    while budgets[-1] * eta < max_rounds:
+        budgets.append(budgets[-1] * eta)
+    return budgets + [max_rounds] if budgets[-1] < max_rounds else budgets
+
+def split_points(n, valid_fraction=VALID_FRACTION, stop_fraction=STOP_FRACTION):
+    """(fin de l'entraînement, fin de l'early stopping): [0, stop) train, [stop, split) arrêt, [split, n) validation."""
+    split = int(n * (1 - valid_fraction))
+    return int(split * (1 - stop_fraction)), split
+
+def init_worker(X, y, stop, split, nthread):
+    """Initializer du pool: DMatrix train / arrêt / validation construites une fois par process."""
+    global _dtrain, _dstop, _dvalid, _y_valid, _NTHREAD
+    names = features_v13.FEATURE_ORDER
+    _dtrain = xgb.DMatrix(X[:stop], label=y[:stop], feature_names=names, nthread=nthread)
+    _dstop = xgb.DMatrix(X[stop:split], label=y[stop:split], feature_names=names, nthread=nthread)
+    _dvalid = xgb.DMatrix(X[split:], label=y[split:], feature_names=names, nthread=nthread)
+    _y_valid = y[split:]
+    _NTHREAD = nthread
+
+def run_trial(task):
+    """Entraîne une configuration sur `budget` arbres max (early stopping sur la tranche d'arrêt,
+    score sur la validation, jamais vue pendant l'entraînement)."""
+    t0 = time.time()
+    params = dict(task['params'], objective='binary:logistic', eval_metric='logloss', nthread=_NTHREAD, seed=SEED)
+    booster = xgb.train(params, _dtrain, num_boost_round=task['budget'], evals=[(_dstop, 'stop')],
+                        early_stopping_rounds=EARLY_STOPPING, verbose_eval=False)
+    best = booster.best_iteration
+    proba = booster.predict(_dvalid, iteration_range=(0, best + 1))
+    return dict(task,
+                n_estimators=best + 1,
+                logloss=float(log_loss(_y_valid, proba, labels=[0, 1])),
+                accuracy=float(accuracy_score(_y_valid, proba >= 0.5)),
+                seconds=round(time.time() - t0, 1))
+
+def load_trials(search):
+    """Essais déjà journalisés pour cette recherche: {(essai, palier): résultat}."""
+    done = {}
+    try:
+        with open(TRIALS_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    r = json.loads(line)
+                except ValueError:
+                    continue  # ligne tronquée par une interruption
+                if r.get('search') == search:
+                    done[(r['trial'], r['rung'])] = r
+    except OSError:
+        pass
+    return done
+
+def save_best(best, search):
+    """Meilleure configuration -> PARAMS_FILE (params au format XGBClassifier, n_estimators inclus)."""
+    os.makedirs(os.path.dirname(PARAMS_FILE), exist_ok=True)
+    payload = {
+        'params': dict(best['params'], n_estimators=best['n_estimators']),
+        'validation': {'logloss': best['logloss'], 'accuracy': best['accuracy']},
+        'search': search,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    tmp = PARAMS_FILE + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp, PARAMS_FILE)
+
+def tune(mode='halving', n_trials=60, workers=None, seed=SEED):
+    print(f"--- RECHERCHE HYPERPARAMÈTRES V13 ({mode}, {n_trials} configurations) ---")
+    if mode not in ('halving', 'random'):
+        print(f"❌ Mode inconnu: {mode}")
+        return None
+    if not game_store.exists(game_store.READY):
+        print("❌ Data introuvable.")
+        return None
+
+    _, X, y = load_matrix()
+    stop, split = split_points(len(y))
+    # Découpe incluse dans l'identifiant: un journal de l'ancienne découpe n'est pas repris
+    search = f"{mode}-{n_trials}-{seed}-{len(y)}-stop{STOP_FRACTION}"
+    candidates = candidate_params(n_trials, seed)
+    budgets = halving_budgets() if mode == 'halving' else [MAX_ROUNDS]
+
+    done = load_trials(search)
+    if done:
+        print(f"♻️ Reprise: {len(done)} essais déjà journalisés ({TRIALS_FILE}).")
+
+    workers = workers or os.cpu_count() or 1
+    # Threads XGBoost répartis entre essais parallèles
+    nthread = max(1, (os.cpu_count() or 1) // workers)
+    print(f"⚙️ {stop} matchs d'entraînement / {split - stop} d'early stopping / {len(y) - split} de validation, "
+          f"{workers} workers x {nthread} threads")
+
+    alive = list(range(len(candidates)))
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(X, y, stop, split, nthread)) as pool, \
+            open(TRIALS_FILE, 'a', encoding='utf-8') as log:
+        for rung, budget in enumerate(budgets):
+            tasks = [{'search': search, 'trial': t, 'rung': rung, 'budget': budget, 'params': candidates[t]}
+                     for t in alive if (t, rung) not in done]
+            results = [done[(t, rung)] for t in alive if (t, rung) in done]
+
+            futures = [pool.submit(run_trial, task) for task in tasks]
+            for future in as_completed(futures):
+                r = future.result()
+                log.write(json.dumps(r) + "\n")
+                log.flush()
+                results.append(r)
+
+            results.sort(key=lambda r: r['logloss'])
+            print(f"   Palier {rung + 1}/{len(budgets)} ({budget} arbres max, {len(results)} configs): "
+                  f"meilleure logloss {results[0]['logloss']:.4f} / acc {results[0]['accuracy']:.1%}")
+            # Successive halving: seul le meilleur 1/ETA passe au palier suivant
+            alive = [r['trial'] for r in results[:max(1, len(results) // ETA)]]
+
+    best = results[0]
+    baseline = next((r for r in results if r['trial'] == 0), None)
+    print(f"\n🏆 Meilleure configuration (essai {best['trial']}, {best['n_estimators']} arbres):")
+    for k, v in best['params'].items():
+        print(f"   {k}: {v}")
+    print(f"   Validation (hors échantillon): logloss {best['logloss']:.4f} / accuracy {best['accuracy']:.1%}")
+    if baseline is not None and baseline is not best:
+        print(f"   (configuration actuelle: logloss {baseline['logloss']:.4f} / accuracy {baseline['accuracy']:.1%})")
+
+    save_best(best, search)
+    print(f"💾 {PARAMS_FILE} (utilisé par train_model_v13 au prochain entraînement)")
+    return best
+
+def arg_value(name, default=None):
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else default
+
+if __name__ == "__main__":
+    workers = arg_value("--workers")
+    tune(
+        mode=arg_value("--mode", "halving"),
+        n_trials=int(arg_value("--trials", 60)),
+        workers=int(workers) if workers else None,
+        seed=int(arg_value("--seed", SEED)),
+    )
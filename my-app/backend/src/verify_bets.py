@@ -5,6 +5,7 @@ import sys
 from datetime import datetime
 from nba_api.stats.endpoints import leaguegamefinder
 from nba_api.stats.static import teams
+import nba_cache
 
 # Forces le dossier de travail sur celui du script (backend/)
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -26,14 +27,17 @@ def clean_id(val):
     try: return str(int(float(val))).lstrip('0')
     except: return str(val).lstrip('0')
 
-def verify():
+def verify(df=None):
+    """Complète Real_Winner / Result des matchs passés. Retourne le DataFrame à jour."""
     print("\n--- VÉRIFICATION DES RÉSULTATS (LIVE API) ---")
     
-    if not os.path.exists(HISTORY_FILE):
-        print("[ERREUR] Pas d'historique.")
-        return
-
-    df = pd.read_csv(HISTORY_FILE)
+    if df is None:
+        if not os.path.exists(HISTORY_FILE):
+            print("[ERREUR] Pas d'historique.")
+            return
+        df = pd.read_csv(HISTORY_FILE)
+    else:
+        df = df.copy()
     updates = 0
 
     # --- ÉTAPE 0 : RÉPARATION OFFLINE ---
@@ -69,7 +73,7 @@ def verify():
             print(f"[SUCCES] Recalcul terminé ({updates} lignes).")
         else:
             print("[INFO] Aucun match passé en attente de résultat.")
-        return
+        return df
 
     print(f"[INFO] {len(pending_indices)} matchs à vérifier via API...")
     dates_to_check = df.loc[pending_indices, 'Date'].unique()
@@ -78,7 +82,7 @@ def verify():
         print(f"   -> Scan API pour le {d_str}...")
         try:
             d_us = datetime.strptime(d_str, '%Y-%m-%d').strftime('%m/%d/%Y')
-            finder = leaguegamefinder.LeagueGameFinder(date_from_nullable=d_us, date_to_nullable=d_us, league_id_nullable='00')
+            finder = nba_cache.fetch(leaguegamefinder.LeagueGameFinder, date_from_nullable=d_us, date_to_nullable=d_us, league_id_nullable='00')
             results = finder.get_data_frames()[0]
             
             if results.empty:
@@ -112,7 +116,8 @@ def verify():
                         updates += 1
                         print(f"      [MAJ] {home} vs {away} -> Vainqueur: {real_winner}")
 
-            time.sleep(0.6) # Anti-ban
+            if not finder.from_cache:
+                time.sleep(0.6) # Anti-ban (inutile si la réponse vient du cache)
 
         except Exception as e:
             print(f"      [ERREUR] {e}")
@@ -125,5 +130,7 @@ def verify():
     else:
         print("\n[INFO] Rien à mettre à jour.")
 
+    return df
+
 if __name__ == "__main__":
     verify()
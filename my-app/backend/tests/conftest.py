@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Les modules du backend s'importent par leur nom (scripts de src/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
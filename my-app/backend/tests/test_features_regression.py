@@ -0,0 +1,101 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+np = pytest.importorskip("numpy")
+
+import features_nba
+from check_features_regression import FEATURE_COLUMNS, legacy_compute_features
+
+# Moteur vectorisé de features_nba vs implémentation de référence (boucle Python / lambdas par groupe),
+# sur un historique synthétique multi-équipes: longues séries, back-to-backs et longs repos (REST_DAYS borné à 7).
+
+GAPS = [1, 1, 2, 3, 5, 12]  # jours entre deux matchs d'une équipe
+
+
+def synthetic_games(n_teams=4, n_games=40, seed=7):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for team in range(n_teams):
+        team_id = 1610612700 + team
+        date = pd.Timestamp('2024-10-20') + pd.Timedelta(days=team)
+        # Blocs de résultats identiques: séries de victoires / défaites de 1 à 6 matchs
+        results = np.repeat(rng.integers(0, 2, n_games), rng.integers(1, 7, n_games))[:n_games]
+        for i in range(n_games):
+            date += pd.Timedelta(days=int(rng.choice(GAPS)))
+            win = bool(results[i])
+            fga = int(rng.integers(75, 95))
+            rows.append({
+                'TEAM_ID': team_id,
+                'GAME_ID': f"00224{team:02d}{i:03d}",
+                'GAME_DATE': date.strftime('%Y-%m-%d'),
+                'MATCHUP': f"T{team} vs. OPP" if rng.random() < 0.5 else f"T{team} @ OPP",
+                'WL': 'W' if win else 'L',
+                'FGM': int(rng.integers(30, 50)), 'FGA': fga, 'FG3M': int(rng.integers(8, 20)),
+                'FTM': int(rng.integers(10, 25)), 'FTA': int(rng.integers(15, 30)),
+                'OREB': int(rng.integers(5, 15)), 'TOV': int(rng.integers(8, 20)),
+                'PLUS_MINUS': int(rng.integers(1, 25)) * (1 if win else -1),
+            })
+    # Ordre d'entrée quelconque: les deux moteurs trient eux-mêmes
+    return pd.DataFrame(rows).sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def assert_same_features(expected, actual, rtol=1e-12):
+    for col in FEATURE_COLUMNS:
+        exp, act = expected[col], actual[col]
+        if exp.dtype == bool or act.dtype == bool:
+            assert exp.astype(bool).tolist() == act.astype(bool).tolist(), col
+        else:
+            np.testing.assert_allclose(act.to_numpy(dtype=float), exp.to_numpy(dtype=float),
+                                       rtol=rtol, atol=rtol, equal_nan=True, err_msg=col)
+
+
+@pytest.fixture(scope="module")
+def games():
+    return synthetic_games()
+
+
+def test_vectorized_matches_legacy(games):
+    expected = legacy_compute_features(games)
+    actual = features_nba.compute_features(games)
+    assert list(actual.index) == list(expected.index)
+    assert_same_features(expected, actual)
+
+
+def test_synthetic_history_covers_edge_cases(games):
+    df = features_nba.compute_features(games)
+    assert df['STREAK_CURRENT'].max() >= 3 and df['STREAK_CURRENT'].min() <= -3
+    assert (df['REST_DAYS'] == 0).any() and (df['REST_DAYS'] == 7).any()
+    assert df['MARGIN_CRASH'].notna().sum() > 0
+
+
+def test_streak_rest_and_margin_by_hand():
+    games = pd.DataFrame({
+        'TEAM_ID': 1, 'GAME_ID': [f"{i:010d}" for i in range(5)],
+        'GAME_DATE': ['2024-11-01', '2024-11-02', '2024-11-04', '2024-11-20', '2024-11-21'],
+        'MATCHUP': ['A vs. B', 'A @ C', 'A vs. D', 'A @ E', 'A vs. F'],
+        'WL': ['W', 'W', 'L', 'L', 'W'],
+        'FGM': 40, 'FGA': 85, 'FG3M': 12, 'FTM': 15, 'FTA': 20, 'OREB': 10, 'TOV': 12,
+        'PLUS_MINUS': [6, 3, -9, -12, 4],
+    })
+    df = features_nba.compute_features(games)
+    assert df['STREAK_CURRENT'].tolist() == [0, 1, 2, -1, -2]
+    assert df['REST_DAYS'].tolist() == [3, 0, 1, 7, 0]
+    # (1 * 6 + 2 * 3 + 3 * -9) / 6, puis (1 * 3 + 2 * -9 + 3 * -12) / 6
+    assert df['MARGIN_CRASH'].iloc[3] == pytest.approx(-2.5)
+    assert df['MARGIN_CRASH'].iloc[4] == pytest.approx(-8.5)
+
+
+@pytest.mark.parametrize("last_days", [1, 5, 15])
+def test_incremental_matches_full(games, last_days):
+    df = games.copy()
+    df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
+    cutoff = sorted(df['GAME_DATE'].unique())[-last_days - 1]
+
+    state = features_nba.build_state(features_nba.compute_features(df[df['GAME_DATE'] <= cutoff]))
+    incremental = features_nba.compute_incremental(df, state)
+    full = features_nba.compute_features(df)
+    assert len(incremental) == int((df['GAME_DATE'] > cutoff).sum())
+    # Sommes glissantes faites dans un autre ordre: tolérance flottante
+    assert_same_features(full.loc[incremental.index], incremental, rtol=1e-9)
+    # L'état mis à jour retombe sur celui du calcul complet
+    assert state == features_nba.build_state(full)
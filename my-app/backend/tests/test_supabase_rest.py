@@ -0,0 +1,150 @@
+import gzip
+import json
+import threading
+import time
+import pytest
+
+pytest.importorskip("requests")
+
+import supabase_rest
+
+# Upsert par batchs de SupabaseClient contre une session HTTP factice (aucun appel réseau).
+
+
+class FakeResponse:
+    def __init__(self, status_code, text=""):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {}
+
+
+class FakeServer:
+    """Remplace session.request: enregistre les lignes acceptées, refuse selon `max_rows` (413) ou `reject` (400)."""
+
+    def __init__(self, max_rows=None, reject=(), refuse_gzip=None):
+        self.max_rows = max_rows
+        self.refuse_gzip = refuse_gzip
+        self.reject = set(reject)
+        self.accepted = []
+        self.calls = 0
+        self.timeouts = []
+        self.lock = threading.Lock()
+
+    def request(self, method, url, params=None, data=None, headers=None, timeout=None):
+        if (headers or {}).get("Content-Encoding") == "gzip":
+            if self.refuse_gzip is not None:
+                with self.lock:
+                    self.calls += 1
+                return self.refuse_gzip
+            data = gzip.decompress(data)
+        rows = json.loads(data)
+        with self.lock:
+            self.calls += 1
+            self.timeouts.append(timeout)
+            if self.max_rows is not None and len(rows) > self.max_rows:
+                return FakeResponse(413, "Payload Too Large")
+            if any(r['id'] in self.reject for r in rows):
+                return FakeResponse(400, "bad row")
+            self.accepted.extend(r['id'] for r in rows)
+        return FakeResponse(201)
+
+
+@pytest.fixture
+def records():
+    return [{'id': i, 'name': f"row-{i}", 'payload': "x" * 50} for i in range(250)]
+
+
+def make_client(monkeypatch, server, **kwargs):
+    client = supabase_rest.SupabaseClient("http://127.0.0.1:9", "test-key", **kwargs)
+    monkeypatch.setattr(client.session, "request", server.request)
+    monkeypatch.setattr(supabase_rest.time, "sleep", lambda s: None)
+    return client
+
+
+@pytest.mark.parametrize("gzip_bodies", [True, False])
+def test_every_row_sent_exactly_once(monkeypatch, records, gzip_bodies):
+    server = FakeServer()
+    client = make_client(monkeypatch, server, gzip_bodies=gzip_bodies)
+    batches = []
+    assert client.upsert("t", records, max_rows=40, concurrency=3, on_batch=batches.append)
+    assert sorted(server.accepted) == [r['id'] for r in records]
+    # on_batch dans l'ordre des batchs
+    assert [r['id'] for batch in batches for r in batch] == [r['id'] for r in records]
+
+
+def test_413_split_recurses(monkeypatch, records):
+    server = FakeServer(max_rows=7)
+    client = make_client(monkeypatch, server)
+    assert client.upsert("t", records, max_rows=100, concurrency=2)
+    assert sorted(server.accepted) == [r['id'] for r in records]
+    # 100 lignes -> 50 -> 25 -> 12 -> 6: plusieurs niveaux de découpe
+    assert server.calls > len(records) // 7
+
+
+def test_413_on_single_row_fails(monkeypatch, records):
+    server = FakeServer(max_rows=0)
+    client = make_client(monkeypatch, server)
+    parts = supabase_rest.encode_records(records[:4])
+    ok, error = client.post_batch("t", parts)
+    assert not ok and error.startswith("413")
+    assert server.calls == 1 + 2 + 4
+
+
+def test_failed_batch_returns_false(monkeypatch, records):
+    server = FakeServer(reject={123})
+    client = make_client(monkeypatch, server)
+    batches = []
+    assert not client.upsert("t", records, max_rows=50, on_batch=batches.append)
+    # Seul le batch 100-150 est refusé, les autres passent et sont acquittés
+    assert sorted(server.accepted) == [i for i in range(250) if not 100 <= i < 150]
+    assert [batch[0]['id'] for batch in batches] == [0, 50, 150, 200]
+
+
+def test_split_batches_respects_limits():
+    parts = supabase_rest.encode_records([{'id': i, 'v': "y" * (i % 30)} for i in range(500)])
+    batches = supabase_rest.split_batches(parts, max_bytes=2000, max_rows=60)
+    assert batches[0][0] == 0 and batches[-1][1] == len(parts)
+    assert all(a[1] == b[0] for a, b in zip(batches, batches[1:]))
+    for start, end in batches:
+        assert end - start <= 60
+        assert len(supabase_rest.join_encoded(parts[start:end])) <= 2000
+
+
+def test_deadline_bounds_request_timeout(monkeypatch, records):
+    server = FakeServer()
+    client = make_client(monkeypatch, server, timeout=60)
+    parts = supabase_rest.encode_records(records[:3])
+    assert client.post_batch("t", parts, deadline=time.monotonic() + 2) == (True, None)
+    assert server.timeouts[-1] <= 2
+    # Échéance passée: plus aucune requête envoyée
+    with pytest.raises(supabase_rest.SupabaseError):
+        client.post_batch("t", parts, deadline=time.monotonic() - 1)
+    assert server.calls == 1
+
+
+def test_no_batch_sent_after_deadline(monkeypatch, records):
+    server = FakeServer()
+    client = make_client(monkeypatch, server)
+    monkeypatch.setattr(supabase_rest, "past_deadline", lambda deadline, delay=0: True)
+    assert not client.upsert("t", records, max_rows=50)
+    assert server.calls == 0
+
+
+@pytest.mark.parametrize("refusal", [FakeResponse(415), FakeResponse(400, "unsupported Content-Encoding: gzip")])
+def test_gzip_refused_falls_back_to_plain(monkeypatch, records, refusal):
+    server = FakeServer(refuse_gzip=refusal)
+    client = make_client(monkeypatch, server)
+    assert client.upsert("t", records, max_rows=250)
+    assert sorted(server.accepted) == [r['id'] for r in records]
+    assert not client.gzip_bodies
+
+
+def test_bad_row_not_resent_in_plain(monkeypatch, records):
+    server = FakeServer(reject={3})
+    client = make_client(monkeypatch, server)
+    parts = supabase_rest.encode_records(records)
+    assert len(supabase_rest.join_encoded(parts)) >= supabase_rest.GZIP_MIN_BYTES
+    ok, error = client.post_batch("t", parts)
+    assert not ok and error.startswith("400")
+    assert server.calls == 1
+    assert client.gzip_bodies
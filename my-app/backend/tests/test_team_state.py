@@ -0,0 +1,22 @@
+import pytest
+
+pd = pytest.importorskip("pandas")
+np = pytest.importorskip("numpy")
+
+import features_nba
+import team_state
+from test_features_regression import synthetic_games
+
+# L'état d'une équipe APRÈS un match (inférence) doit donner les features d'AVANT son match suivant (entraînement).
+
+
+def test_margin_crash_matches_next_game_features():
+    ready = features_nba.compute_features(synthetic_games())
+    states = team_state.compute_team_states(ready)
+    ready = ready.reset_index(drop=True)
+    next_feature = ready.groupby('TEAM_ID')['MARGIN_CRASH'].shift(-1)
+    # Fenêtre complète (3 matchs joués) et match suivant connu
+    n_games = states.groupby('TEAM_ID').cumcount() + 1
+    mask = (n_games >= len(features_nba.MARGIN_WEIGHTS)) & next_feature.notna()
+    assert mask.any()
+    np.testing.assert_allclose(states.loc[mask, 'MARGIN_CRASH'], next_feature[mask], rtol=1e-12)